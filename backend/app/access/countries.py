@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+
+def normalize_country_code(value: object) -> str | None:
+    if not isinstance(value, str):
+        return None
+    code = value.strip().upper()
+    if len(code) != 2 or not code.isascii() or not code.isalpha():
+        return None
+    return code
+
+
+def compile_country_allowlist(codes: Iterable[object]) -> frozenset[str]:
+    compiled = set()
+    for value in codes:
+        code = normalize_country_code(value)
+        if code is not None:
+            compiled.add(code)
+    return frozenset(compiled)
+
+
+def country_allowed(allowlist: frozenset[str], country_code: object) -> bool:
+    if not isinstance(country_code, str):
+        return False
+    return country_code.upper() in allowlist
@@ -1,22 +1,51 @@
 from __future__ import annotations
 
+from dataclasses import asdict, dataclass
+
 from app.db.models.audit import AccessDecision
 from app.db.models.site import SiteFilterMode
 
 
+@dataclass
+class DecisionStageCounters:
+    ip_stage_final: int = 0
+    geo_stage: int = 0
+    geo_lookups_avoided: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
 def decide_access(
     *,
     filter_mode: SiteFilterMode,
     ip_action: object | None,
     geo_allowed: bool | None,
 ) -> AccessDecision:
+    decision = decide_ip_stage(filter_mode=filter_mode, ip_action=ip_action)
+    if decision is not None:
+        return decision
+    return decide_geo_stage(geo_allowed=geo_allowed)
+
+
+def decide_ip_stage(
+    *,
+    filter_mode: SiteFilterMode,
+    ip_action: object | None,
+) -> AccessDecision | None:
     if filter_mode == SiteFilterMode.DISABLED:
         return AccessDecision.ALLOWED
     if filter_mode == SiteFilterMode.IP:
         return _decision_from_ip(ip_action)
     if filter_mode == SiteFilterMode.GEO:
-        return AccessDecision.ALLOWED if geo_allowed else AccessDecision.BLOCKED
-    return _decision_from_ip_and_geo(ip_action, geo_allowed)
+        return None
+    if _decision_from_ip(ip_action) == AccessDecision.BLOCKED:
+        return AccessDecision.BLOCKED
+    return None
+
+
+def decide_geo_stage(*, geo_allowed: bool | None) -> AccessDecision:
+    return AccessDecision.ALLOWED if geo_allowed else AccessDecision.BLOCKED
 
 
 def _decision_from_ip(ip_action: object | None) -> AccessDecision:
@@ -28,17 +57,3 @@ def _decision_from_ip(ip_action: object | None) -> AccessDecision:
     if str(action_value).lower() == "allow":
         return AccessDecision.ALLOWED
     return AccessDecision.BLOCKED
-
-
-def _decision_from_ip_and_geo(
-    ip_action: object | None,
-    geo_allowed: bool | None,
-) -> AccessDecision:
-    action_value = getattr(ip_action, "value", None)
-    if action_value is None:
-        action_value = str(ip_action)
-    if str(action_value).lower() != "allow":
-        return AccessDecision.BLOCKED
-    if geo_allowed:
-        return AccessDecision.ALLOWED
-    return AccessDecision.BLOCKED
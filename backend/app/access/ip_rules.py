@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from ipaddress import ip_address, ip_network
+from ipaddress import IPv4Address, ip_address, ip_network
 from typing import Iterable, Mapping
 
 from app.db.models.ip_rule import IPRuleAction
@@ -36,3 +36,78 @@ def evaluate_ip_rules(
                 matched_prefix = network.prefixlen
 
     return matched_action
+
+
+class _TrieNode:
+    __slots__ = ("children", "action")
+
+    def __init__(self) -> None:
+        self.children: list[_TrieNode | None] = [None, None]
+        self.action: IPRuleAction | None = None
+
+
+class _PrefixTrie:
+    def __init__(self, bits: int) -> None:
+        self._bits = bits
+        self._root = _TrieNode()
+        self._max_depth = 0
+
+    def insert(self, address: int, prefixlen: int, action: IPRuleAction) -> None:
+        node = self._root
+        shift = self._bits - 1
+        for _ in range(prefixlen):
+            bit = (address >> shift) & 1
+            child = node.children[bit]
+            if child is None:
+                child = _TrieNode()
+                node.children[bit] = child
+            node = child
+            shift -= 1
+        # The first rule wins on equal prefixes, mirroring evaluate_ip_rules.
+        if node.action is None:
+            node.action = action
+        self._max_depth = max(self._max_depth, prefixlen)
+
+    def longest_match(self, address: int) -> IPRuleAction | None:
+        node: _TrieNode | None = self._root
+        matched = None
+        shift = self._bits - 1
+        for _ in range(self._max_depth + 1):
+            if node is None:
+                break
+            if node.action is not None:
+                matched = node.action
+            node = node.children[(address >> shift) & 1] if shift >= 0 else None
+            shift -= 1
+        return matched
+
+
+class CompiledIPRules:
+    def __init__(self, rules: Iterable[Mapping[str, object]]) -> None:
+        self._v4 = _PrefixTrie(32)
+        self._v6 = _PrefixTrie(128)
+        self.rule_count = 0
+        for rule in rules:
+            try:
+                cidr = str(rule["cidr"])
+                action = rule["action"]
+                network = ip_network(cidr, strict=False)
+                if not isinstance(action, IPRuleAction):
+                    action = IPRuleAction(str(action).lower())
+            except Exception:
+                continue
+            trie = self._v4 if network.version == 4 else self._v6
+            trie.insert(int(network.network_address), network.prefixlen, action)
+            self.rule_count += 1
+
+    def lookup(self, client_ip: str) -> IPRuleAction | None:
+        try:
+            ip = ip_address(client_ip)
+        except ValueError:
+            return None
+        trie = self._v4 if isinstance(ip, IPv4Address) else self._v6
+        return trie.longest_match(int(ip))
+
+
+def compile_ip_rules(rules: Iterable[Mapping[str, object]]) -> CompiledIPRules:
+    return CompiledIPRules(rules)
@@ -10,6 +10,7 @@ from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.admin.repositories.serialization import json_to_list, point_to_wkt, polygon_to_wkt
+from app.db.models.geo_country_rule import GeoCountryRule
 from app.db.models.geofence import Geofence
 
 
@@ -58,3 +59,22 @@ class GeofenceRepository:
                 }
             )
         return results
+
+    def list_countries(self, site_id: str) -> list[str]:
+        rows = (
+            self._db.query(GeoCountryRule.country_code)
+            .filter(GeoCountryRule.site_id == _coerce_uuid(site_id))
+            .order_by(GeoCountryRule.country_code)
+            .all()
+        )
+        return [row[0] for row in rows]
+
+    def replace_countries(self, site_id: str, countries: list[str]) -> list[str]:
+        site_uuid = _coerce_uuid(site_id)
+        self._db.query(GeoCountryRule).filter(GeoCountryRule.site_id == site_uuid).delete(
+            synchronize_session=False
+        )
+        for code in sorted(set(countries)):
+            self._db.add(GeoCountryRule(site_id=site_uuid, country_code=code))
+        self._db.flush()
+        return sorted(set(countries))
@@ -29,13 +29,30 @@ def geofence_to_dict(geofence: Any) -> dict[str, Any]:
     }
 
 
-def polygon_to_wkt(polygon: list[list[float]] | None) -> WKTElement | None:
+PolygonCoordinates = (
+    list[list[float]] | list[list[list[float]]] | list[list[list[list[float]]]]
+)
+
+
+def polygon_to_wkt(polygon: PolygonCoordinates | None) -> WKTElement | None:
     if not polygon:
         return None
-    if polygon[0] != polygon[-1]:
-        polygon = [*polygon, polygon[0]]
-    points = ", ".join(f"{lng} {lat}" for lng, lat in polygon)
-    return WKTElement(f"POLYGON(({points}))", srid=4326)
+    # A bare ring, GeoJSON Polygon rings (outer first, then holes) or MultiPolygon coordinates.
+    if not isinstance(polygon[0][0], list):
+        return WKTElement(f"POLYGON({_rings_wkt([polygon])})", srid=4326)
+    if not isinstance(polygon[0][0][0], list):
+        return WKTElement(f"POLYGON({_rings_wkt(polygon)})", srid=4326)
+    parts = ", ".join(f"({_rings_wkt(rings)})" for rings in polygon)
+    return WKTElement(f"MULTIPOLYGON({parts})", srid=4326)
+
+
+def _rings_wkt(rings: list[list[list[float]]]) -> str:
+    closed = []
+    for ring in rings:
+        if ring[0] != ring[-1]:
+            ring = [*ring, ring[0]]
+        closed.append("(" + ", ".join(f"{lng} {lat}" for lng, lat in ring) + ")")
+    return ", ".join(closed)
 
 
 def point_to_wkt(point: list[float] | None) -> WKTElement | None:
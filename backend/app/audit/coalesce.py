@@ -0,0 +1,137 @@
+"""Merge repeated block events per (site, client IP, reason) into one counted record."""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+# (site_id, client_ip, reason)
+CoalesceKey = tuple[str, str | None, str | None]
+
+
+def coalesce_key(event: Any) -> CoalesceKey:
+    return (str(event.site_id), event.client_ip, event.reason)
+
+
+class AuditCoalescer:
+    def __init__(
+        self,
+        *,
+        window_seconds: float = 10.0,
+        max_open: int = 10_000,
+        flush_interval_seconds: float = 1.0,
+        on_close: Callable[[Any], None] | None = None,
+    ) -> None:
+        if window_seconds <= 0:
+            raise ValueError("window_seconds must be > 0")
+        if max_open < 1:
+            raise ValueError("max_open must be >= 1")
+        self._window = timedelta(seconds=window_seconds)
+        self._max_open = max_open
+        self._flush_interval_seconds = flush_interval_seconds
+        self._on_close = on_close
+        # key -> (store token, merged record), oldest window first.
+        self._open: OrderedDict[CoalesceKey, tuple[Any, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        self._logger = logging.getLogger(__name__)
+        self.merged = 0
+        self.closed = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._open)
+
+    def add(self, event: Any, store: Any) -> Any | None:
+        key = coalesce_key(event)
+        with self._lock:
+            if self._closed:
+                # Closing already handed every window off; the caller records this hit alone.
+                return None
+            closed = self._pop_expired(event.timestamp)
+            entry = self._open.get(key)
+            if entry is not None:
+                token, current = entry
+                record = replace(
+                    current,
+                    last_seen=event.timestamp,
+                    count=current.count + 1,
+                    ip_geo_country=event.ip_geo_country or current.ip_geo_country,
+                    artifact_path=event.artifact_path or current.artifact_path,
+                )
+                self._open[key] = (token, record)
+                self.merged += 1
+                store.update(token, record)
+            else:
+                if len(self._open) >= self._max_open:
+                    closed.append(self._open.popitem(last=False)[1][1])
+                    self.closed += 1
+                record = event
+                self._open[key] = (store.append(event), event)
+        self._emit(closed)
+        return record
+
+    def flush_expired(self, now: datetime | None = None) -> int:
+        with self._lock:
+            closed = self._pop_expired(now or datetime.now(timezone.utc))
+        self._emit(closed)
+        return len(closed)
+
+    def flush_all(self) -> int:
+        with self._lock:
+            closed = [record for _, record in self._open.values()]
+            self._open.clear()
+            self.closed += len(closed)
+        self._emit(closed)
+        return len(closed)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-coalescer", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float | None = None) -> None:
+        with self._lock:
+            self._closed = True
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush_all()
+
+    def _pop_expired(self, now: datetime) -> list[Any]:
+        # Windows are fixed from the first hit, so insertion order is also expiry order.
+        closed = []
+        while self._open:
+            key, (_, record) = next(iter(self._open.items()))
+            if now - record.timestamp < self._window:
+                break
+            del self._open[key]
+            closed.append(record)
+        self.closed += len(closed)
+        return closed
+
+    def _emit(self, records: list[Any]) -> None:
+        if self._on_close is None:
+            return
+        for record in records:
+            if record.count == 1:
+                # A window that saw a single hit has nothing to add to what was already stored.
+                continue
+            try:
+                self._on_close(record)
+            except Exception as exc:
+                self._logger.exception("Coalesced audit record hand-off failed", exc_info=exc)
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self._flush_interval_seconds):
+            self.flush_expired()
@@ -0,0 +1,295 @@
+"""Streaming audit exports from the in-memory buffer or the access_audit table."""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import uuid
+import zlib
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from ipaddress import IPv4Address, ip_address
+from typing import Any
+
+from sqlalchemy import select, tuple_
+
+from app.audit.service import CSV_HEADER, AuditEvent, csv_row, snapshot
+from app.db.models.audit import AccessAudit, AccessDecision
+
+_CSV_ROWS_PER_CHUNK = 500
+_NDJSON_ROWS_PER_CHUNK = 1000
+_ARROW_ROWS_PER_BATCH = 10_000
+# gzip framing for zlib, so the stream is a plain .gz file.
+_GZIP_WBITS = 31
+_DECISIONS = [decision.value for decision in AccessDecision]
+
+
+@dataclass(frozen=True)
+class AuditExportFilter:
+    site_id: str | None = None
+    start: datetime | None = None
+    end: datetime | None = None
+    decision: AccessDecision | None = None
+
+    def matches(self, event: AuditEvent) -> bool:
+        if self.site_id is not None and event.site_id != self.site_id:
+            return False
+        if self.decision is not None and event.decision != self.decision:
+            return False
+        timestamp = _as_utc(event.timestamp)
+        if self.start is not None and timestamp < _as_utc(self.start):
+            return False
+        if self.end is not None and timestamp >= _as_utc(self.end):
+            return False
+        return True
+
+
+def iter_memory_events(filters: AuditExportFilter) -> Iterator[AuditEvent]:
+    for event in snapshot():
+        if filters.matches(event):
+            yield event
+
+
+def iter_db_events(
+    session_factory: Callable[[], Any],
+    filters: AuditExportFilter,
+    *,
+    page_size: int = 1000,
+) -> Iterator[AuditEvent]:
+    if filters.site_id is not None:
+        try:
+            site_id = uuid.UUID(filters.site_id)
+        except ValueError:
+            return
+    else:
+        site_id = None
+    base = select(
+        AccessAudit.id,
+        AccessAudit.timestamp,
+        AccessAudit.site_id,
+        AccessAudit.client_ip,
+        AccessAudit.ip_geo_country,
+        AccessAudit.decision,
+        AccessAudit.reason,
+        AccessAudit.artifact_path,
+        AccessAudit.last_seen,
+        AccessAudit.count,
+    )
+    if site_id is not None:
+        base = base.where(AccessAudit.site_id == site_id)
+    if filters.decision is not None:
+        base = base.where(AccessAudit.decision == filters.decision)
+    if filters.start is not None:
+        base = base.where(AccessAudit.timestamp >= _as_naive_utc(filters.start))
+    if filters.end is not None:
+        base = base.where(AccessAudit.timestamp < _as_naive_utc(filters.end))
+    base = base.order_by(AccessAudit.timestamp, AccessAudit.id).limit(page_size)
+    session = session_factory()
+    try:
+        last: tuple[datetime, uuid.UUID] | None = None
+        while True:
+            # Keyset pages keep each query an index range scan and the process memory flat,
+            # whatever the export size.
+            stmt = base
+            if last is not None:
+                stmt = stmt.where(tuple_(AccessAudit.timestamp, AccessAudit.id) > last)
+            rows = session.execute(stmt).all()
+            for row in rows:
+                yield _row_event(row)
+            if len(rows) < page_size:
+                return
+            last = (rows[-1].timestamp, rows[-1].id)
+    finally:
+        session.close()
+
+
+def iter_csv(events: Iterable[AuditEvent]) -> Iterator[str]:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    pending = 0
+    for event in events:
+        writer.writerow(csv_row(event))
+        pending += 1
+        if pending >= _CSV_ROWS_PER_CHUNK:
+            yield _drain(output)
+            pending = 0
+    yield _drain(output)
+
+
+def iter_ndjson_gzip(events: Iterable[AuditEvent]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=_GZIP_WBITS)
+    lines: list[str] = []
+    for event in events:
+        lines.append(json.dumps(_event_record(event), separators=(",", ":")))
+        if len(lines) >= _NDJSON_ROWS_PER_CHUNK:
+            chunk = compressor.compress(("\n".join(lines) + "\n").encode("utf-8"))
+            lines.clear()
+            if chunk:
+                yield chunk
+    if lines:
+        yield compressor.compress(("\n".join(lines) + "\n").encode("utf-8"))
+    yield compressor.flush()
+
+
+def require_pyarrow() -> Any:
+    try:
+        import pyarrow
+    except ImportError as exc:
+        raise RuntimeError("pyarrow is required for Arrow and Parquet audit exports") from exc
+    return pyarrow
+
+
+def audit_arrow_schema() -> Any:
+    pa = require_pyarrow()
+    return pa.schema(
+        [
+            pa.field("timestamp", pa.timestamp("us", tz="UTC"), nullable=False),
+            pa.field("site_id", pa.string(), nullable=False),
+            # IPv4 addresses are stored IPv4-mapped so both families share one column type.
+            pa.field("client_ip", pa.binary(16)),
+            pa.field("ip_geo_country", pa.string()),
+            pa.field("decision", pa.dictionary(pa.int8(), pa.string()), nullable=False),
+            pa.field("reason", pa.string()),
+            pa.field("artifact_path", pa.string()),
+            pa.field("last_seen", pa.timestamp("us", tz="UTC"), nullable=False),
+            pa.field("count", pa.int32(), nullable=False),
+        ]
+    )
+
+
+def iter_arrow(events: Iterable[AuditEvent], *, parquet: bool = False) -> Iterator[bytes]:
+    pa = require_pyarrow()
+    schema = audit_arrow_schema()
+    sink = _ChunkSink()
+    if parquet:
+        import pyarrow.parquet as pq
+
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    batch: list[AuditEvent] = []
+    for event in events:
+        batch.append(event)
+        if len(batch) >= _ARROW_ROWS_PER_BATCH:
+            writer.write_batch(_record_batch(pa, schema, batch))
+            batch = []
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    if batch:
+        writer.write_batch(_record_batch(pa, schema, batch))
+    writer.close()
+    yield sink.drain()
+
+
+class _ChunkSink:
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data: Any) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        return None
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _record_batch(pa: Any, schema: Any, events: list[AuditEvent]) -> Any:
+    decisions = pa.DictionaryArray.from_arrays(
+        pa.array([_DECISIONS.index(event.decision.value) for event in events], pa.int8()),
+        pa.array(_DECISIONS, pa.string()),
+    )
+    timestamps = [_as_utc(event.timestamp) for event in events]
+    return pa.record_batch(
+        [
+            pa.array(timestamps, schema.field("timestamp").type),
+            pa.array([event.site_id for event in events], pa.string()),
+            pa.array([_packed_ip(event.client_ip) for event in events], pa.binary(16)),
+            pa.array([event.ip_geo_country for event in events], pa.string()),
+            decisions,
+            pa.array([event.reason for event in events], pa.string()),
+            pa.array([event.artifact_path for event in events], pa.string()),
+            pa.array(
+                [_as_utc(event.last_seen or event.timestamp) for event in events],
+                schema.field("last_seen").type,
+            ),
+            pa.array([event.count for event in events], pa.int32()),
+        ],
+        schema=schema,
+    )
+
+
+def _packed_ip(value: str | None) -> bytes | None:
+    if not value:
+        return None
+    try:
+        address = ip_address(value)
+    except ValueError:
+        return None
+    if isinstance(address, IPv4Address):
+        return b"\x00" * 10 + b"\xff\xff" + address.packed
+    return address.packed
+
+
+def _event_record(event: AuditEvent) -> dict[str, Any]:
+    return {
+        "timestamp": _as_utc(event.timestamp).isoformat(),
+        "site_id": event.site_id,
+        "client_ip": event.client_ip,
+        "ip_geo_country": event.ip_geo_country,
+        "decision": event.decision.value,
+        "reason": event.reason,
+        "artifact_path": event.artifact_path,
+        "last_seen": _as_utc(event.last_seen or event.timestamp).isoformat(),
+        "count": event.count,
+    }
+
+
+def _drain(output: io.StringIO) -> str:
+    chunk = output.getvalue()
+    output.seek(0)
+    output.truncate()
+    return chunk
+
+
+def _row_event(row: Any) -> AuditEvent:
+    decision = row.decision
+    return AuditEvent(
+        timestamp=row.timestamp.replace(tzinfo=timezone.utc),
+        site_id=str(row.site_id),
+        client_ip=row.client_ip,
+        ip_geo_country=row.ip_geo_country,
+        decision=AccessDecision(decision) if decision is not None else AccessDecision.BLOCKED,
+        reason=row.reason,
+        artifact_path=row.artifact_path,
+        last_seen=row.last_seen.replace(tzinfo=timezone.utc) if row.last_seen else None,
+        count=row.count or 1,
+    )
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _as_naive_utc(value: datetime) -> datetime:
+    return _as_utc(value).replace(tzinfo=None)
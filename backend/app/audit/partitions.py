@@ -0,0 +1,182 @@
+"""Daily range partitions for access_audit: premake upcoming days, drop expired ones."""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import text
+
+AUDIT_TABLE = "access_audit"
+_PARTITION_PATTERN = re.compile(rf"^{AUDIT_TABLE}_p(\d{{8}})$")
+# pg_try_advisory_lock key, so only one worker per database runs partition DDL.
+MAINTENANCE_LOCK_KEY = 0x67656F33_61756474
+
+
+def partition_name(day: date) -> str:
+    return f"{AUDIT_TABLE}_p{day:%Y%m%d}"
+
+
+def partition_day(name: str) -> date | None:
+    match = _PARTITION_PATTERN.match(name)
+    if match is None:
+        return None
+    try:
+        return datetime.strptime(match.group(1), "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def create_partition_sql(day: date) -> str:
+    upper = day + timedelta(days=1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF {AUDIT_TABLE} "
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{upper.isoformat()}')"
+    )
+
+
+_LIST_PARTITIONS_SQL = (
+    "SELECT child.relname FROM pg_inherits "
+    "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+    "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+    "WHERE parent.relname = :table"
+)
+
+
+def list_partitions(connection: Any) -> list[str]:
+    rows = connection.execute(text(_LIST_PARTITIONS_SQL), {"table": AUDIT_TABLE})
+    return [row[0] for row in rows]
+
+
+def _pending_detaches(connection: Any) -> set[str]:
+    rows = connection.execute(
+        text(f"{_LIST_PARTITIONS_SQL} AND pg_inherits.inhdetachpending"), {"table": AUDIT_TABLE}
+    )
+    return {row[0] for row in rows}
+
+
+def ensure_partitions(connection: Any, *, start: date, days: int) -> list[str]:
+    existing = set(list_partitions(connection))
+    created = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        name = partition_name(day)
+        if name in existing:
+            continue
+        connection.execute(text(create_partition_sql(day)))
+        created.append(name)
+    return created
+
+
+def drop_expired_partitions(connection: Any, *, before: date) -> list[str]:
+    pending = _pending_detaches(connection)
+    dropped = []
+    for name in sorted(list_partitions(connection)):
+        day = partition_day(name)
+        if day is None or day >= before:
+            continue
+        # CONCURRENTLY only holds SHARE UPDATE EXCLUSIVE on access_audit, so inserts keep
+        # flowing; it must run outside a transaction, and one interrupted part-way is
+        # completed with FINALIZE.
+        mode = "FINALIZE" if name in pending else "CONCURRENTLY"
+        connection.execute(text(f"ALTER TABLE {AUDIT_TABLE} DETACH PARTITION {name} {mode}"))
+        connection.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
+
+
+@dataclass
+class PartitionMaintenanceResult:
+    created: list[str] = field(default_factory=list)
+    dropped: list[str] = field(default_factory=list)
+    skipped: bool = False
+
+
+def run_partition_maintenance(
+    session_factory: Callable[[], Any],
+    *,
+    retention_days: int,
+    premake_days: int,
+    today: date | None = None,
+) -> PartitionMaintenanceResult:
+    today = today or datetime.now(timezone.utc).date()
+    session = session_factory()
+    try:
+        # Autocommit: every DDL statement is its own short transaction, and DETACH
+        # PARTITION CONCURRENTLY refuses to run inside a transaction block at all.
+        connection = session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+        lock = {"key": MAINTENANCE_LOCK_KEY}
+        if not connection.execute(text("SELECT pg_try_advisory_lock(:key)"), lock).scalar():
+            return PartitionMaintenanceResult(skipped=True)
+        try:
+            return PartitionMaintenanceResult(
+                created=ensure_partitions(connection, start=today, days=premake_days + 1),
+                dropped=drop_expired_partitions(
+                    connection, before=today - timedelta(days=retention_days)
+                ),
+            )
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), lock)
+    finally:
+        session.close()
+
+
+class AuditPartitionMaintainer:
+    def __init__(
+        self,
+        session_factory: Callable[[], Any],
+        *,
+        retention_days: int,
+        premake_days: int,
+        interval_seconds: float = 3600.0,
+    ) -> None:
+        self._session_factory = session_factory
+        self._retention_days = retention_days
+        self._premake_days = premake_days
+        self._interval_seconds = interval_seconds
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._logger = logging.getLogger(__name__)
+        self.last_result: PartitionMaintenanceResult | None = None
+
+    def run_once(self) -> PartitionMaintenanceResult:
+        result = run_partition_maintenance(
+            self._session_factory,
+            retention_days=self._retention_days,
+            premake_days=self._premake_days,
+        )
+        if result.created or result.dropped:
+            self._logger.info(
+                "Audit partitions created=%s dropped=%s", result.created, result.dropped
+            )
+        self.last_result = result
+        return result
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="audit-partition-maintenance", daemon=True
+        )
+        self._thread.start()
+
+    def close(self, timeout: float | None = None) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception as exc:
+                self._logger.exception("Audit partition maintenance failed", exc_info=exc)
+            if self._stopping.wait(self._interval_seconds):
+                return
@@ -0,0 +1,248 @@
+"""Memory-mapped audit ring buffer shared by every worker process on a host."""
+
+from __future__ import annotations
+
+import logging
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime, timezone
+from ipaddress import IPv4Address, IPv6Address, ip_address
+
+from app.audit.service import AuditEvent
+from app.db.models.audit import AccessDecision
+
+MAGIC = b"GEO3AUD1"
+VERSION = 2
+# magic, version, slot size, capacity, reserved, next sequence, first visible sequence
+_HEADER = struct.Struct("<8sIIIIQQ")
+_HEADER_SIZE = 64
+_CURSOR_OFFSET = 24
+_BASE_OFFSET = 32
+# seqlock counter (odd while a writer owns the slot), record sequence
+_SLOT_HEADER = struct.Struct("<QQ")
+# timestamp (us), last seen (us, 0 if unset), count, decision, ip version, packed ip,
+# site id, country, reason, artifact path
+_RECORD = struct.Struct("<qqIBB16s64s10s96s288s")
+SLOT_SIZE = _SLOT_HEADER.size + _RECORD.size
+_DECISIONS = list(AccessDecision)
+_READ_RETRIES = 8
+
+
+def _require_fcntl():
+    try:
+        import fcntl
+    except ImportError as exc:
+        raise RuntimeError("The shared audit ring requires POSIX file locking") from exc
+    return fcntl
+
+
+class SharedAuditRing:
+    def __init__(self, path: str, *, capacity: int = 100_000) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self._fcntl = _require_fcntl()
+        self.path = path
+        # POSIX record locks are per process, so threads of one worker also need this.
+        self._reserve_lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self.capacity = self._initialize(capacity)
+            self._map = mmap.mmap(self._fd, _HEADER_SIZE + self.capacity * SLOT_SIZE)
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def __len__(self) -> int:
+        cursor, base = self._cursor_and_base()
+        return cursor - max(base, cursor - self.capacity)
+
+    def append(self, event: AuditEvent) -> int:
+        record = _pack_record(event)
+        sequence = self._reserve()
+        self._write(sequence, record)
+        return sequence
+
+    def update(self, token: int, event: AuditEvent) -> bool:
+        cursor, base = self._cursor_and_base()
+        if token < max(base, cursor - self.capacity) or token >= cursor:
+            return False
+        if _SLOT_HEADER.unpack_from(self._map, self._slot_offset(token))[1] != token:
+            return False
+        self._write(token, _pack_record(event))
+        return True
+
+    def snapshot(self) -> list[AuditEvent]:
+        cursor, base = self._cursor_and_base()
+        events = []
+        for sequence in range(max(base, cursor - self.capacity), cursor):
+            event = self._read(sequence)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def clear(self) -> None:
+        with self._locked(_BASE_OFFSET, 16):
+            cursor = struct.unpack_from("<Q", self._map, _CURSOR_OFFSET)[0]
+            struct.pack_into("<Q", self._map, _BASE_OFFSET, cursor)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+    def _initialize(self, capacity: int) -> int:
+        with self._locked(0, _HEADER_SIZE):
+            if os.fstat(self._fd).st_size >= _HEADER.size:
+                magic, version, slot_size, existing, _, _, _ = _HEADER.unpack(
+                    os.pread(self._fd, _HEADER.size, 0)
+                )
+                if magic == MAGIC and version == VERSION and slot_size == SLOT_SIZE:
+                    # Workers started later adopt the ring the first worker created.
+                    return existing
+                # The ring is only a cache of recent events, so an older layout is replaced.
+                logging.getLogger(__name__).warning(
+                    "Reinitializing incompatible audit ring file %s", self.path
+                )
+            os.ftruncate(self._fd, 0)
+            os.ftruncate(self._fd, _HEADER_SIZE + capacity * SLOT_SIZE)
+            header = _HEADER.pack(MAGIC, VERSION, SLOT_SIZE, capacity, 0, 0, 0)
+            os.pwrite(self._fd, header, 0)
+            return capacity
+
+    def _reserve(self) -> int:
+        with self._reserve_lock, self._locked(_CURSOR_OFFSET, 8):
+            sequence = struct.unpack_from("<Q", self._map, _CURSOR_OFFSET)[0]
+            struct.pack_into("<Q", self._map, _CURSOR_OFFSET, sequence + 1)
+        return sequence
+
+    def _write(self, sequence: int, record: bytes) -> None:
+        offset = self._slot_offset(sequence)
+        counter = _SLOT_HEADER.unpack_from(self._map, offset)[0]
+        # Seqlock: readers retry while the counter is odd or changes under them.
+        _SLOT_HEADER.pack_into(self._map, offset, counter | 1, sequence)
+        self._map[offset + _SLOT_HEADER.size : offset + SLOT_SIZE] = record
+        _SLOT_HEADER.pack_into(self._map, offset, (counter | 1) + 1, sequence)
+
+    def _read(self, sequence: int) -> AuditEvent | None:
+        offset = self._slot_offset(sequence)
+        for _ in range(_READ_RETRIES):
+            before, stored = _SLOT_HEADER.unpack_from(self._map, offset)
+            if before & 1:
+                continue
+            payload = self._map[offset + _SLOT_HEADER.size : offset + SLOT_SIZE]
+            after = _SLOT_HEADER.unpack_from(self._map, offset)[0]
+            if before != after:
+                continue
+            if stored != sequence:
+                # Already overwritten by a newer lap of the ring (or never written).
+                return None
+            return _unpack_record(payload)
+        return None
+
+    def _cursor_and_base(self) -> tuple[int, int]:
+        cursor = struct.unpack_from("<Q", self._map, _CURSOR_OFFSET)[0]
+        base = struct.unpack_from("<Q", self._map, _BASE_OFFSET)[0]
+        return cursor, base
+
+    def _slot_offset(self, sequence: int) -> int:
+        return _HEADER_SIZE + (sequence % self.capacity) * SLOT_SIZE
+
+    def _locked(self, start: int, length: int) -> _RangeLock:
+        return _RangeLock(self._fcntl, self._fd, start, length)
+
+
+class _RangeLock:
+    __slots__ = ("_fcntl", "_fd", "_start", "_length")
+
+    def __init__(self, fcntl, fd: int, start: int, length: int) -> None:
+        self._fcntl = fcntl
+        self._fd = fd
+        self._start = start
+        self._length = length
+
+    def __enter__(self) -> None:
+        self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX, self._length, self._start, os.SEEK_SET)
+
+    def __exit__(self, *exc_info) -> None:
+        self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN, self._length, self._start, os.SEEK_SET)
+
+
+def _pack_record(event: AuditEvent) -> bytes:
+    ip_version, packed_ip = _pack_ip(event.client_ip)
+    last_seen = event.last_seen
+    return _RECORD.pack(
+        _micros(event.timestamp),
+        _micros(last_seen) if last_seen is not None else 0,
+        min(event.count, 0xFFFFFFFF),
+        _DECISIONS.index(event.decision),
+        ip_version,
+        packed_ip,
+        _fit(event.site_id, 64),
+        _fit(event.ip_geo_country, 10),
+        _fit(event.reason, 96),
+        _fit(event.artifact_path, 288),
+    )
+
+
+def _unpack_record(payload: bytes) -> AuditEvent:
+    (
+        micros,
+        last_seen,
+        count,
+        decision,
+        ip_version,
+        packed_ip,
+        site_id,
+        country,
+        reason,
+        artifact,
+    ) = _RECORD.unpack(payload)
+    return AuditEvent(
+        timestamp=_datetime(micros),
+        site_id=_text(site_id) or "",
+        client_ip=_unpack_ip(ip_version, packed_ip),
+        ip_geo_country=_text(country),
+        decision=_DECISIONS[decision],
+        reason=_text(reason),
+        artifact_path=_text(artifact),
+        last_seen=_datetime(last_seen) if last_seen else None,
+        count=count,
+    )
+
+
+def _micros(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1_000_000)
+
+
+def _datetime(micros: int) -> datetime:
+    return datetime.fromtimestamp(micros / 1_000_000, tz=timezone.utc)
+
+
+def _pack_ip(value: str | None) -> tuple[int, bytes]:
+    if not value:
+        return 0, b""
+    try:
+        address = ip_address(value)
+    except ValueError:
+        return 0, b""
+    return address.version, address.packed
+
+
+def _unpack_ip(version: int, packed: bytes) -> str | None:
+    if version == 4:
+        return str(IPv4Address(packed[:4]))
+    if version == 6:
+        return str(IPv6Address(packed))
+    return None
+
+
+def _fit(value: str | None, size: int) -> bytes:
+    # Fixed-width fields: longer values are cut on a UTF-8 character boundary.
+    return (value or "").encode("utf-8")[:size].decode("utf-8", "ignore").encode("utf-8")
+
+
+def _text(value: bytes) -> str | None:
+    return value.rstrip(b"\0").decode("utf-8") or None
@@ -0,0 +1,231 @@
+"""Per-site traffic rollups by (site, minute, decision, country), flushed to a compact table."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import uuid
+from collections import Counter
+from collections.abc import Callable, Iterable
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import BigInteger, DateTime, String, column, exists, func, select, values
+from sqlalchemy.dialects.postgresql import UUID, insert
+
+from app.db.models.audit_rollup import AccessAuditRollup
+from app.db.models.site import Site
+
+# (site_id, minute as naive UTC, decision, country code or "")
+RollupKey = tuple[str, datetime, str, str]
+
+
+def rollup_key(event: Any) -> RollupKey:
+    timestamp = event.timestamp
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    decision = getattr(event.decision, "value", event.decision)
+    return (
+        str(event.site_id),
+        timestamp.replace(second=0, microsecond=0),
+        str(decision),
+        (event.ip_geo_country or "").upper(),
+    )
+
+
+_ROLLUP_COLUMNS = ("site_id", "minute", "decision", "country_code", "count")
+
+
+def build_rollup_upsert(rows: list[dict[str, Any]]):
+    incoming = values(
+        column("site_id", UUID(as_uuid=True)),
+        column("minute", DateTime()),
+        column("decision", String()),
+        column("country_code", String()),
+        column("count", BigInteger()),
+        name="incoming",
+    ).data([tuple(row[name] for name in _ROLLUP_COLUMNS) for row in rows])
+    # Counts for a site deleted since they were recorded are dropped in the database rather
+    # than failing the foreign key and taking every other site's counts down with them.
+    live = select(incoming).where(exists().where(Site.id == incoming.c.site_id))
+    stmt = insert(AccessAuditRollup).from_select(list(_ROLLUP_COLUMNS), live)
+    return stmt.on_conflict_do_update(
+        index_elements=[
+            AccessAuditRollup.site_id,
+            AccessAuditRollup.minute,
+            AccessAuditRollup.decision,
+            AccessAuditRollup.country_code,
+        ],
+        set_={"count": AccessAuditRollup.count + stmt.excluded.count},
+    )
+
+
+def load_rollup_counts(db: Any, site_id: str, since: datetime) -> Counter[RollupKey]:
+    rows = db.execute(
+        select(
+            AccessAuditRollup.minute,
+            AccessAuditRollup.decision,
+            AccessAuditRollup.country_code,
+            func.sum(AccessAuditRollup.count),
+        )
+        .where(AccessAuditRollup.site_id == uuid.UUID(site_id))
+        .where(AccessAuditRollup.minute >= since)
+        .group_by(
+            AccessAuditRollup.minute,
+            AccessAuditRollup.decision,
+            AccessAuditRollup.country_code,
+        )
+    )
+    counts: Counter[RollupKey] = Counter()
+    for minute, decision, country, count in rows:
+        counts[(site_id, minute, decision, country)] += int(count)
+    return counts
+
+
+def summarize_rollups(counts: Counter[RollupKey], *, top_countries: int = 10) -> dict[str, Any]:
+    per_minute: dict[datetime, Counter[str]] = {}
+    totals: Counter[str] = Counter()
+    countries: Counter[str] = Counter()
+    for (_, minute, decision, country), count in counts.items():
+        per_minute.setdefault(minute, Counter())[decision] += count
+        totals[decision] += count
+        if country:
+            countries[country] += count
+    return {
+        "totals": dict(totals),
+        "per_minute": [
+            {"minute": minute.replace(tzinfo=timezone.utc).isoformat(), **dict(decisions)}
+            for minute, decisions in sorted(per_minute.items())
+        ],
+        "top_countries": [
+            {"country": country, "count": count}
+            for country, count in countries.most_common(top_countries)
+        ],
+    }
+
+
+class AuditRollups:
+    def __init__(
+        self,
+        session_factory: Callable[[], Any] | None = None,
+        *,
+        flush_interval_seconds: float = 10.0,
+        max_keys: int = 100_000,
+    ) -> None:
+        if max_keys < 1:
+            raise ValueError("max_keys must be >= 1")
+        self._session_factory = session_factory
+        self._flush_interval_seconds = flush_interval_seconds
+        self._max_keys = max_keys
+        self._pending: Counter[RollupKey] = Counter()
+        # Counts taken by a flush stay visible here until its commit succeeds.
+        self._inflight: Counter[RollupKey] = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._logger = logging.getLogger(__name__)
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.skipped = 0
+
+    def record(self, event: Any) -> None:
+        key = rollup_key(event)
+        with self._lock:
+            self._pending[key] += 1
+            if len(self._pending) > self._max_keys:
+                self._evict_oldest_minute()
+
+    def pending_counts(self, site_id: str, since: datetime) -> Counter[RollupKey]:
+        with self._lock:
+            counts: Counter[RollupKey] = Counter()
+            for source in (self._pending, self._inflight):
+                for key, count in source.items():
+                    if key[0] == site_id and key[1] >= since:
+                        counts[key] += count
+            return counts
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._inflight.clear()
+
+    def flush(self) -> int:
+        if self._session_factory is None:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = Counter()
+                self._inflight = pending
+            rows = self._rows(pending.items())
+            if not rows:
+                with self._lock:
+                    self._inflight = Counter()
+                return 0
+            session = self._session_factory()
+            try:
+                session.execute(build_rollup_upsert(rows))
+                session.commit()
+            except Exception as exc:
+                self._logger.exception("Audit rollup flush failed", exc_info=exc)
+                try:
+                    session.rollback()
+                except Exception:
+                    pass
+                # Counts are additive, so a failed batch simply folds back into the next one.
+                with self._lock:
+                    self._pending.update(pending)
+                    self._inflight = Counter()
+                    self.failed_flushes += 1
+                return 0
+            finally:
+                session.close()
+            with self._lock:
+                self._inflight = Counter()
+                self.flushes += 1
+            return len(rows)
+
+    def start(self) -> None:
+        if self._thread is not None or self._session_factory is None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-rollups", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float | None = None) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _evict_oldest_minute(self) -> None:
+        # Only reachable when flushes stop keeping up (or there is no database at all).
+        oldest = min(key[1] for key in self._pending)
+        for key in [key for key in self._pending if key[1] == oldest]:
+            self.skipped += self._pending.pop(key)
+
+    def _rows(self, items: Iterable[tuple[RollupKey, int]]) -> list[dict[str, Any]]:
+        rows = []
+        for (site_id, minute, decision, country), count in items:
+            try:
+                site_uuid = uuid.UUID(site_id)
+            except ValueError:
+                with self._lock:
+                    self.skipped += count
+                continue
+            rows.append(
+                {
+                    "site_id": site_uuid,
+                    "minute": minute,
+                    "decision": decision,
+                    "country_code": country,
+                    "count": count,
+                }
+            )
+        return rows
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self._flush_interval_seconds):
+            self.flush()
@@ -1,10 +1,13 @@
 import csv
 import io
+import uuid
 from collections import deque
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from threading import Lock
+from typing import Any
 
+from app.audit.rollups import AuditRollups
 from app.db.models.audit import AccessDecision
 
 
@@ -17,16 +20,97 @@ class AuditEvent:
     decision: AccessDecision
     reason: str | None
     artifact_path: str | None
+    # Coalesced records: timestamp is the first hit, last_seen the latest of `count` hits.
+    last_seen: datetime | None = None
+    count: int = 1
+    # access_audit row id, so a coalesced record can update the row its first hit created.
+    event_id: uuid.UUID = field(default_factory=uuid.uuid4, compare=False)
 
 
 MAX_EVENTS = 1000
-_EVENTS: deque[AuditEvent] = deque(maxlen=MAX_EVENTS)
-_LOCK = Lock()
+
+
+class MemoryAuditStore:
+    def __init__(self, max_events: int = MAX_EVENTS) -> None:
+        self._events: deque[AuditEvent] = deque(maxlen=max_events)
+        self._next_token = 0
+        self._lock = Lock()
+
+    def append(self, event: AuditEvent) -> int:
+        with self._lock:
+            self._events.append(event)
+            token = self._next_token
+            self._next_token += 1
+            return token
+
+    def update(self, token: int, event: AuditEvent) -> bool:
+        with self._lock:
+            index = token - (self._next_token - len(self._events))
+            if not 0 <= index < len(self._events):
+                return False
+            self._events[index] = event
+            return True
+
+    def snapshot(self) -> list[AuditEvent]:
+        with self._lock:
+            return list(self._events)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._events.clear()
+
+
+_STORE: Any = MemoryAuditStore()
+_WRITER: Any | None = None
+_ROLLUPS = AuditRollups()
+_COALESCER: Any | None = None
+
+
+def set_store(store: Any) -> None:
+    global _STORE
+    _STORE = store
+
+
+def get_store() -> Any:
+    return _STORE
+
+
+def set_writer(writer: Any | None) -> None:
+    global _WRITER
+    _WRITER = writer
+
+
+def get_writer() -> Any | None:
+    return _WRITER
+
+
+def set_rollups(rollups: AuditRollups) -> None:
+    global _ROLLUPS
+    _ROLLUPS = rollups
+
+
+def get_rollups() -> AuditRollups:
+    return _ROLLUPS
+
+
+def set_coalescer(coalescer: Any | None) -> None:
+    global _COALESCER
+    _COALESCER = coalescer
+
+
+def get_coalescer() -> Any | None:
+    return _COALESCER
+
+
+def submit(event: AuditEvent) -> None:
+    writer = _WRITER
+    if writer is not None:
+        writer.submit(event)
 
 
 def clear() -> None:
-    with _LOCK:
-        _EVENTS.clear()
+    _STORE.clear()
+    _ROLLUPS.clear()
 
 
 def log_block(
@@ -46,37 +130,58 @@ def log_block(
         reason=reason,
         artifact_path=artifact_path,
     )
-    with _LOCK:
-        _EVENTS.append(event)
+    # Rollups count every hit; only the stored and persisted records are coalesced.
+    _ROLLUPS.record(event)
+    coalescer = _COALESCER
+    if coalescer is not None:
+        record = coalescer.add(event, _STORE)
+        if record is not None:
+            # The first hit of a window is persisted right away; the coalescer upserts
+            # last_seen and count onto the same row when the window closes.
+            if record.count == 1:
+                submit(record)
+            return record
+    _STORE.append(event)
+    submit(event)
     return event
 
 
+CSV_HEADER = (
+    "timestamp",
+    "site_id",
+    "client_ip",
+    "ip_geo_country",
+    "decision",
+    "reason",
+    "artifact_path",
+    "last_seen",
+    "count",
+)
+
+
+def csv_row(event: AuditEvent) -> list[str]:
+    return [
+        event.timestamp.isoformat(),
+        event.site_id,
+        event.client_ip or "",
+        event.ip_geo_country or "",
+        event.decision.value,
+        event.reason or "",
+        event.artifact_path or "",
+        (event.last_seen or event.timestamp).isoformat(),
+        str(event.count),
+    ]
+
+
+def snapshot() -> list[AuditEvent]:
+    return _STORE.snapshot()
+
+
 def export_csv() -> str:
-    with _LOCK:
-        events = list(_EVENTS)
+    events = snapshot()
     output = io.StringIO()
     writer = csv.writer(output)
-    writer.writerow(
-        [
-            "timestamp",
-            "site_id",
-            "client_ip",
-            "ip_geo_country",
-            "decision",
-            "reason",
-            "artifact_path",
-        ]
-    )
+    writer.writerow(CSV_HEADER)
     for event in events:
-        writer.writerow(
-            [
-                event.timestamp.isoformat(),
-                event.site_id,
-                event.client_ip or "",
-                event.ip_geo_country or "",
-                event.decision.value,
-                event.reason or "",
-                event.artifact_path or "",
-            ]
-        )
+        writer.writerow(csv_row(event))
     return output.getvalue()
@@ -0,0 +1,296 @@
+"""Bounded-memory per-site sketches of blocked clients: Space-Saving top-N and HyperLogLog."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import heapq
+import math
+import threading
+import time
+from typing import Any
+
+
+def _hash64(item: str) -> int:
+    return int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class SpaceSaving:
+    def __init__(self, capacity: int = 256) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity = capacity
+        # item -> (count, overestimation error)
+        self._counters: dict[str, tuple[int, int]] = {}
+        # Stream-summary buckets: count -> items holding it, oldest first; the heap of
+        # counts (with lazily dropped stale entries) finds the smallest bucket without a scan.
+        self._buckets: dict[int, dict[str, None]] = {}
+        self._count_heap: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def add(self, item: str, count: int = 1) -> None:
+        entry = self._counters.get(item)
+        if entry is not None:
+            self._unbucket(item, entry[0])
+            self._set(item, entry[0] + count, entry[1])
+            return
+        if len(self._counters) < self.capacity:
+            self._set(item, count, 0)
+            return
+        # The newcomer inherits the smallest counter; that count becomes its error bound.
+        floor = self._min_count()
+        victim = next(iter(self._buckets[floor]))
+        self._unbucket(victim, floor)
+        del self._counters[victim]
+        self._set(item, floor + count, floor)
+
+    def copy(self) -> SpaceSaving:
+        clone = SpaceSaving(self.capacity)
+        clone._counters = dict(self._counters)
+        clone._buckets = {count: dict(items) for count, items in self._buckets.items()}
+        clone._count_heap = list(self._count_heap)
+        return clone
+
+    def top(self, n: int) -> list[tuple[str, int, int]]:
+        ranked = sorted(self._counters.items(), key=lambda entry: entry[1][0], reverse=True)
+        return [(item, count, error) for item, (count, error) in ranked[:n]]
+
+    def merge(self, other: SpaceSaving) -> SpaceSaving:
+        merged = SpaceSaving(max(self.capacity, other.capacity))
+        # Items a full sketch does not track may still have reached its smallest counter.
+        self_floor = self._floor()
+        other_floor = other._floor()
+        combined: dict[str, tuple[int, int]] = {}
+        for item in self._counters.keys() | other._counters.keys():
+            count_a, error_a = self._counters.get(item, (self_floor, self_floor))
+            count_b, error_b = other._counters.get(item, (other_floor, other_floor))
+            combined[item] = (count_a + count_b, error_a + error_b)
+        ranked = sorted(combined.items(), key=lambda entry: entry[1][0], reverse=True)
+        for item, (count, error) in ranked[: merged.capacity]:
+            merged._set(item, count, error)
+        return merged
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "counters": [[item, count, error] for item, (count, error) in self._counters.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> SpaceSaving:
+        sketch = cls(int(data["capacity"]))
+        for item, count, error in data["counters"]:
+            sketch._set(str(item), int(count), int(error))
+        return sketch
+
+    def _floor(self) -> int:
+        if len(self._counters) < self.capacity:
+            return 0
+        return self._min_count()
+
+    def _set(self, item: str, count: int, error: int) -> None:
+        self._counters[item] = (count, error)
+        bucket = self._buckets.get(count)
+        if bucket is None:
+            bucket = self._buckets[count] = {}
+            heapq.heappush(self._count_heap, count)
+            if len(self._count_heap) > 2 * len(self._buckets) + 64:
+                # Counts that climbed past a bucket leave stale heap entries; compact them.
+                self._count_heap = list(self._buckets)
+                heapq.heapify(self._count_heap)
+        bucket[item] = None
+
+    def _unbucket(self, item: str, count: int) -> None:
+        bucket = self._buckets[count]
+        del bucket[item]
+        if not bucket:
+            del self._buckets[count]
+
+    def _min_count(self) -> int:
+        heap = self._count_heap
+        while heap[0] not in self._buckets:
+            heapq.heappop(heap)
+        return heap[0]
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = 12) -> None:
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self._registers = bytearray(1 << precision)
+
+    def add(self, item: str) -> None:
+        value = _hash64(item)
+        index = value >> (64 - self.precision)
+        remainder = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def count(self) -> int:
+        m = len(self._registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self._registers)
+        zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is far more accurate while most registers are still empty.
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def copy(self) -> HyperLogLog:
+        clone = HyperLogLog(self.precision)
+        clone._registers = bytearray(self._registers)
+        return clone
+
+    def merge(self, other: HyperLogLog) -> HyperLogLog:
+        if other.precision != self.precision:
+            raise ValueError("cannot merge HyperLogLog sketches with different precision")
+        merged = HyperLogLog(self.precision)
+        merged._registers = bytearray(map(max, self._registers, other._registers))
+        return merged
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "precision": self.precision,
+            "registers": base64.b64encode(bytes(self._registers)).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> HyperLogLog:
+        sketch = cls(int(data["precision"]))
+        registers = base64.b64decode(data["registers"])
+        if len(registers) != len(sketch._registers):
+            raise ValueError("register count does not match precision")
+        sketch._registers = bytearray(registers)
+        return sketch
+
+
+class SiteSketch:
+    __slots__ = ("top", "unique")
+
+    def __init__(self, top: SpaceSaving, unique: HyperLogLog) -> None:
+        self.top = top
+        self.unique = unique
+
+    def merge(self, other: SiteSketch) -> SiteSketch:
+        return SiteSketch(self.top.merge(other.top), self.unique.merge(other.unique))
+
+    def copy(self) -> SiteSketch:
+        return SiteSketch(self.top.copy(), self.unique.copy())
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"top": self.top.to_dict(), "unique": self.unique.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> SiteSketch:
+        return cls(SpaceSaving.from_dict(data["top"]), HyperLogLog.from_dict(data["unique"]))
+
+
+class BlockSketches:
+    def __init__(
+        self,
+        *,
+        window_seconds: float = 60.0,
+        windows: int = 60,
+        top_capacity: int = 256,
+        hll_precision: int = 12,
+    ) -> None:
+        if window_seconds <= 0:
+            raise ValueError("window_seconds must be > 0")
+        if windows < 1:
+            raise ValueError("windows must be >= 1")
+        self.window_seconds = window_seconds
+        self.windows = windows
+        self._top_capacity = top_capacity
+        self._hll_precision = hll_precision
+        # window index -> site_id -> sketch; only the last `windows` indexes are kept.
+        self._buckets: dict[int, dict[str, SiteSketch]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, site_id: str, client_ip: str | None, *, now: float | None = None) -> None:
+        if not client_ip:
+            return
+        bucket = self._bucket(now)
+        with self._lock:
+            sites = self._buckets.get(bucket)
+            if sites is None:
+                sites = self._buckets[bucket] = {}
+                self._expire(bucket)
+            sketch = sites.get(site_id)
+            if sketch is None:
+                sketch = sites[site_id] = self._new_sketch()
+            sketch.top.add(client_ip)
+            sketch.unique.add(client_ip)
+
+    def site_sketch(
+        self,
+        site_id: str,
+        *,
+        span_seconds: float | None = None,
+        now: float | None = None,
+    ) -> SiteSketch:
+        current = self._bucket(now)
+        span = self.windows
+        if span_seconds is not None:
+            span = math.ceil(span_seconds / self.window_seconds)
+        oldest = current - min(max(span, 1), self.windows) + 1
+        merged = self._new_sketch()
+        for bucket, sites in self._snapshot(current, site_id).items():
+            if oldest <= bucket <= current:
+                merged = merged.merge(sites[site_id])
+        return merged
+
+    def to_dict(self, site_id: str | None = None, *, now: float | None = None) -> dict[str, Any]:
+        snapshot = self._snapshot(self._bucket(now), site_id)
+        return {
+            "window_seconds": self.window_seconds,
+            "buckets": {
+                str(bucket): {key: sketch.to_dict() for key, sketch in sites.items()}
+                for bucket, sites in snapshot.items()
+            },
+        }
+
+    def merge_dict(self, data: dict[str, Any]) -> None:
+        if float(data["window_seconds"]) != self.window_seconds:
+            raise ValueError("cannot merge sketches with a different window size")
+        with self._lock:
+            for bucket_key, sites in data["buckets"].items():
+                bucket = int(bucket_key)
+                target = self._buckets.setdefault(bucket, {})
+                for site_id, payload in sites.items():
+                    incoming = SiteSketch.from_dict(payload)
+                    existing = target.get(site_id)
+                    target[site_id] = incoming if existing is None else existing.merge(incoming)
+            if self._buckets:
+                self._expire(max(self._buckets))
+
+    def _snapshot(self, current: int, site_id: str | None) -> dict[int, dict[str, SiteSketch]]:
+        # record() runs on the event loop under this lock, so only references are taken
+        # here and merging or serializing happens after it is released. Sketches in the
+        # open window (or the one that just closed) are still being added to, so those are
+        # copied; older ones are never mutated, merge_dict replaces them instead.
+        snapshot: dict[int, dict[str, SiteSketch]] = {}
+        with self._lock:
+            for bucket, sites in self._buckets.items():
+                if site_id is not None:
+                    if site_id not in sites:
+                        continue
+                    sites = {site_id: sites[site_id]}
+                if bucket >= current - 1:
+                    snapshot[bucket] = {key: sketch.copy() for key, sketch in sites.items()}
+                else:
+                    snapshot[bucket] = dict(sites)
+        return snapshot
+
+    def _new_sketch(self) -> SiteSketch:
+        return SiteSketch(SpaceSaving(self._top_capacity), HyperLogLog(self._hll_precision))
+
+    def _bucket(self, now: float | None) -> int:
+        return int((time.time() if now is None else now) // self.window_seconds)
+
+    def _expire(self, current: int) -> None:
+        for bucket in [bucket for bucket in self._buckets if bucket <= current - self.windows]:
+            del self._buckets[bucket]
@@ -0,0 +1,400 @@
+"""Batched background persistence for the access_audit table."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.db.models.audit import AccessAudit
+
+
+def audit_row(event: Any) -> dict[str, Any] | None:
+    site_id = event.site_id
+    if not isinstance(site_id, uuid.UUID):
+        try:
+            site_id = uuid.UUID(str(site_id))
+        except ValueError:
+            # Only rows that reference a real site can land in access_audit.
+            return None
+    decision = event.decision
+    last_seen = getattr(event, "last_seen", None)
+    return {
+        "id": getattr(event, "event_id", None) or uuid.uuid4(),
+        "site_id": site_id,
+        "timestamp": _naive_utc(event.timestamp),
+        "client_ip": event.client_ip,
+        "ip_geo_country": event.ip_geo_country,
+        "decision": getattr(decision, "value", decision),
+        "reason": event.reason,
+        "artifact_path": event.artifact_path,
+        "last_seen": _naive_utc(last_seen) if last_seen is not None else None,
+        "count": getattr(event, "count", 1),
+    }
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def build_audit_insert(rows: list[dict[str, Any]]):
+    # A coalesced record is submitted once for its first hit and again when its window
+    # closes; the later row wins, and one that meets the stored row updates its counters.
+    latest = {(row["id"], row["timestamp"]): row for row in rows}
+    stmt = insert(AccessAudit).values(list(latest.values()))
+    return stmt.on_conflict_do_update(
+        index_elements=[AccessAudit.id, AccessAudit.timestamp],
+        set_={"last_seen": stmt.excluded.last_seen, "count": stmt.excluded.count},
+    )
+
+
+@dataclass(frozen=True)
+class AuditWriterStats:
+    queue_depth: int
+    submitted: int
+    dropped: int
+    spilled: int
+    replayed: int
+    invalid: int
+    dead_lettered: int
+    flushes: int
+    failed_flushes: int
+    flushed_rows: int
+    last_flush_seconds: float
+    max_flush_seconds: float
+
+
+class AuditWriter:
+    def __init__(
+        self,
+        session_factory: Callable[[], Any],
+        *,
+        batch_size: int = 500,
+        flush_interval_seconds: float = 1.0,
+        max_pending: int = 10_000,
+        spill_path: str | None = None,
+        dead_letter_path: str | None = None,
+        max_batch_attempts: int = 3,
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        if max_pending < batch_size:
+            raise ValueError("max_pending must be >= batch_size")
+        if max_batch_attempts < 1:
+            raise ValueError("max_batch_attempts must be >= 1")
+        self._session_factory = session_factory
+        self._batch_size = batch_size
+        self._flush_interval_seconds = flush_interval_seconds
+        self._max_pending = max_pending
+        # Without a spill file a full queue drops events; with one they wait on disk.
+        self._spill_path = spill_path
+        self._dead_letter_path = dead_letter_path
+        self._max_batch_attempts = max_batch_attempts
+        self._pending: deque[dict[str, Any]] = deque()
+        # The batch that last failed; retried ahead of _pending, only touched under _flush_lock.
+        self._retry: list[dict[str, Any]] = []
+        self._retry_attempts = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._logger = logging.getLogger(__name__)
+        self._submitted = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._replayed = 0
+        self._invalid = 0
+        self._dead_lettered = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._flushed_rows = 0
+        self._last_flush_seconds = 0.0
+        self._max_flush_seconds = 0.0
+
+    def submit(self, event: Any) -> bool:
+        row = audit_row(event)
+        with self._lock:
+            if row is None:
+                self._invalid += 1
+                return False
+            overflow = len(self._pending) >= self._max_pending
+            if not overflow:
+                self._pending.append(row)
+                self._submitted += 1
+                full = len(self._pending) >= self._batch_size
+        if overflow:
+            return self._overflow([row])
+        if full:
+            self._wakeup.set()
+        return True
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float | None = None) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            flushed = 0
+            if self._retry:
+                written, healthy = self._flush_retry()
+                flushed += written
+                if not healthy:
+                    return flushed
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    count = min(self._batch_size, len(self._pending))
+                    batch = [self._pending.popleft() for _ in range(count)]
+                if self._write(batch) is not None:
+                    self._retry = batch
+                    self._retry_attempts = 1
+                    return flushed
+                flushed += len(batch)
+            return flushed + self._replay_spill()
+
+    def stats(self) -> AuditWriterStats:
+        with self._lock:
+            return AuditWriterStats(
+                queue_depth=len(self._pending) + len(self._retry),
+                submitted=self._submitted,
+                dropped=self._dropped,
+                spilled=self._spilled,
+                replayed=self._replayed,
+                invalid=self._invalid,
+                dead_lettered=self._dead_lettered,
+                flushes=self._flushes,
+                failed_flushes=self._failed_flushes,
+                flushed_rows=self._flushed_rows,
+                last_flush_seconds=self._last_flush_seconds,
+                max_flush_seconds=self._max_flush_seconds,
+            )
+
+    def _flush_retry(self) -> tuple[int, bool]:
+        batch = self._retry
+        error = self._write(batch)
+        if error is None:
+            self._retry = []
+            self._retry_attempts = 0
+            return len(batch), True
+        self._retry_attempts += 1
+        if self._retry_attempts < self._max_batch_attempts:
+            return 0, False
+        # A batch that keeps failing may hold a row that can never be inserted (for example
+        # a site deleted since the block); bisect it so the good rows are not held hostage.
+        written, remaining = self._isolate(batch, error)
+        self._retry = remaining
+        self._retry_attempts = 0
+        return written, not remaining
+
+    def _isolate(
+        self, rows: list[dict[str, Any]], error: Exception
+    ) -> tuple[int, list[dict[str, Any]]]:
+        if len(rows) == 1:
+            if _is_row_error(error):
+                self._dead_letter(rows, error)
+                return 0, []
+            return 0, rows
+        written = 0
+        middle = len(rows) // 2
+        halves = [rows[:middle], rows[middle:]]
+        for index, half in enumerate(halves):
+            half_error = self._write(half)
+            if half_error is None:
+                written += len(half)
+                continue
+            half_written, remaining = self._isolate(half, half_error)
+            written += half_written
+            if remaining:
+                # The database itself is failing; keep the rest for a later flush.
+                return written, remaining + [row for later in halves[index + 1 :] for row in later]
+        return written, []
+
+    def _write(self, batch: list[dict[str, Any]]) -> Exception | None:
+        started = time.perf_counter()
+        session = self._session_factory()
+        try:
+            session.execute(build_audit_insert(batch))
+            session.commit()
+        except Exception as exc:
+            self._logger.exception("Audit batch write failed", exc_info=exc)
+            try:
+                session.rollback()
+            except Exception:
+                pass
+            with self._lock:
+                self._failed_flushes += 1
+            return exc
+        finally:
+            session.close()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._flushes += 1
+            self._flushed_rows += len(batch)
+            self._last_flush_seconds = elapsed
+            self._max_flush_seconds = max(self._max_flush_seconds, elapsed)
+        return None
+
+    def _overflow(self, rows: list[dict[str, Any]]) -> bool:
+        if self._spill_path is None or not self._append_rows(self._spill_path, rows):
+            with self._lock:
+                self._dropped += len(rows)
+            return False
+        with self._lock:
+            self._spilled += len(rows)
+        return True
+
+    def _dead_letter(self, rows: list[dict[str, Any]], error: Exception) -> None:
+        self._logger.error("Dead-lettering %d audit row(s): %s", len(rows), error)
+        with self._lock:
+            self._dead_lettered += len(rows)
+        if self._dead_letter_path is not None:
+            self._append_rows(self._dead_letter_path, rows)
+
+    def _dead_letter_line(self, line: str, error: Exception) -> None:
+        self._logger.error("Dead-lettering unreadable spilled audit row: %s", error)
+        with self._lock:
+            self._dead_lettered += 1
+        if self._dead_letter_path is not None:
+            self._append_lines(self._dead_letter_path, line.rstrip("\n") + "\n")
+
+    def _append_rows(self, path: str, rows: list[dict[str, Any]]) -> bool:
+        return self._append_lines(
+            path, "".join(json.dumps(row, default=str) + "\n" for row in rows)
+        )
+
+    def _append_lines(self, path: str, lines: str) -> bool:
+        data = lines.encode("utf-8")
+        try:
+            with self._file_lock, open(path, "ab+") as handle:
+                handle.seek(0, os.SEEK_END)
+                if handle.tell():
+                    handle.seek(-1, os.SEEK_END)
+                    # A crash mid-append leaves a torn last line; never glue new rows onto it.
+                    if handle.read(1) != b"\n":
+                        data = b"\n" + data
+                handle.write(data)
+        except OSError as exc:
+            self._logger.warning("Could not write audit rows to %s: %s", path, exc)
+            return False
+        return True
+
+    def _replay_spill(self) -> int:
+        if self._spill_path is None:
+            return 0
+        replay_path = f"{self._spill_path}.replay"
+        replayed = 0
+        # A .replay file still on disk was left by a crash mid-replay; it goes first.
+        if os.path.exists(replay_path):
+            replayed, healthy = self._replay_file(replay_path)
+            if not healthy:
+                return replayed
+        if os.path.exists(self._spill_path):
+            with self._file_lock:
+                try:
+                    os.replace(self._spill_path, replay_path)
+                except OSError:
+                    return replayed
+            replayed += self._replay_file(replay_path)[0]
+        return replayed
+
+    def _replay_file(self, path: str) -> tuple[int, bool]:
+        replayed = 0
+        healthy = True
+        with open(path, encoding="utf-8") as handle:
+            # Streamed in batch_size chunks so a large spill never sits in memory at once.
+            for batch in _spilled_batches(handle, self._batch_size, self._dead_letter_line):
+                error = self._write(batch)
+                if error is None:
+                    replayed += len(batch)
+                    continue
+                written, remaining = self._isolate(batch, error)
+                replayed += written
+                if remaining:
+                    # The database is still unhealthy; put the rest back on disk.
+                    healthy = False
+                    self._respill(remaining, handle)
+                    break
+        os.remove(path)
+        with self._lock:
+            self._replayed += replayed
+        return replayed, healthy
+
+    def _respill(self, rows: list[dict[str, Any]], handle: Any) -> None:
+        self._append_rows(self._spill_path, rows)
+        with self._file_lock, open(self._spill_path, "a", encoding="utf-8") as spill:
+            for line in handle:
+                spill.write(line)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(self._flush_interval_seconds)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                return
+            try:
+                self.flush()
+            except Exception as exc:
+                self._logger.exception("Audit writer flush failed", exc_info=exc)
+
+
+def _is_row_error(error: Exception) -> bool:
+    # Constraint and data errors are specific to the rows; anything else means the
+    # database is unavailable and every row would fail the same way.
+    return isinstance(error, (IntegrityError, DataError))
+
+
+def _spilled_batches(
+    handle: Any, size: int, on_invalid: Callable[[str, Exception], None]
+) -> Iterator[list[dict[str, Any]]]:
+    batch: list[dict[str, Any]] = []
+    for line in handle:
+        if not line.strip():
+            continue
+        try:
+            row = _spilled_row(line)
+        except (ValueError, KeyError, TypeError) as exc:
+            # Unparseable lines are as hopeless as poison rows; set them aside the same way.
+            on_invalid(line, exc)
+            continue
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _spilled_row(line: str) -> dict[str, Any]:
+    row = json.loads(line)
+    row["id"] = uuid.UUID(row["id"])
+    row["site_id"] = uuid.UUID(row["site_id"])
+    row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    if row.get("last_seen"):
+        row["last_seen"] = datetime.fromisoformat(row["last_seen"])
+    return row
@@ -1,5 +1,7 @@
 from app.db.models.audit import AccessAudit, AccessDecision
+from app.db.models.audit_rollup import AccessAuditRollup
 from app.db.models.artifact import Artifact
+from app.db.models.geo_country_rule import GeoCountryRule
 from app.db.models.geofence import Geofence
 from app.db.models.ip_geo_cache import IpGeoCache
 from app.db.models.ip_rule import IPRule, IPRuleAction
@@ -9,8 +11,10 @@ from app.db.models.user import User
 
 __all__ = [
     "AccessAudit",
+    "AccessAuditRollup",
     "AccessDecision",
     "Artifact",
+    "GeoCountryRule",
     "Geofence",
     "IpGeoCache",
     "IPRule",
@@ -3,7 +3,7 @@ import uuid
 from datetime import datetime
 
 from geoalchemy2 import Geometry
-from sqlalchemy import DateTime, Enum, ForeignKey, String, Text
+from sqlalchemy import DateTime, Enum, ForeignKey, Integer, String, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -17,12 +17,16 @@ class AccessDecision(str, enum.Enum):
 
 class AccessAudit(Base):
     __tablename__ = "access_audit"
+    # Daily range partitions; the partition key has to be part of the primary key.
+    __table_args__ = {"postgresql_partition_by": "RANGE (timestamp)"}
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     site_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("sites.id"), nullable=False
     )
-    timestamp: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    timestamp: Mapped[datetime] = mapped_column(
+        DateTime, primary_key=True, default=datetime.utcnow, nullable=False
+    )
     client_ip: Mapped[str | None] = mapped_column(String(50))
     ip_geo_lat: Mapped[float | None] = mapped_column(nullable=True)
     ip_geo_lng: Mapped[float | None] = mapped_column(nullable=True)
@@ -33,5 +37,7 @@ class AccessAudit(Base):
     )
     reason: Mapped[str | None] = mapped_column(Text)
     artifact_path: Mapped[str | None] = mapped_column(String(500))
+    last_seen: Mapped[datetime | None] = mapped_column(DateTime)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
 
     site: Mapped["Site"] = relationship(back_populates="audits")
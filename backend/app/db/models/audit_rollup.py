@@ -0,0 +1,21 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class AccessAuditRollup(Base):
+    __tablename__ = "access_audit_rollups"
+
+    site_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("sites.id"), primary_key=True
+    )
+    minute: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    decision: Mapped[str] = mapped_column(String(20), primary_key=True)
+    # Empty string rather than NULL so unknown countries still fit the primary key.
+    country_code: Mapped[str] = mapped_column(String(10), primary_key=True, default="")
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
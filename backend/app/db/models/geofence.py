@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 
 from geoalchemy2 import Geometry
-from sqlalchemy import DateTime, ForeignKey, Integer, String
+from sqlalchemy import CheckConstraint, DateTime, ForeignKey, Integer, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -11,13 +11,19 @@ from app.db.base import Base
 
 class Geofence(Base):
     __tablename__ = "geofences"
+    __table_args__ = (
+        CheckConstraint(
+            "polygon IS NULL OR GeometryType(polygon) IN ('POLYGON', 'MULTIPOLYGON')",
+            name="ck_geofences_polygon_type",
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     site_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("sites.id"), nullable=False
     )
     name: Mapped[str | None] = mapped_column(String(255))
-    polygon: Mapped[object | None] = mapped_column(Geometry("POLYGON", srid=4326))
+    polygon: Mapped[object | None] = mapped_column(Geometry("GEOMETRY", srid=4326))
     center: Mapped[object | None] = mapped_column(Geometry("POINT", srid=4326))
     radius_meters: Mapped[int | None] = mapped_column(Integer)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
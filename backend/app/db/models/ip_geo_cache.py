@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 
 from geoalchemy2 import Geometry
-from sqlalchemy import DateTime, String
+from sqlalchemy import BigInteger, DateTime, Index, String
 from sqlalchemy.dialects.postgresql import INET, JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -11,10 +11,19 @@ from app.db.base import Base
 
 class IpGeoCache(Base):
     __tablename__ = "ip_geo_cache"
+    __table_args__ = (
+        Index(
+            "ix_ip_geo_cache_ip_address_network",
+            "ip_address",
+            postgresql_using="gist",
+            postgresql_ops={"ip_address": "inet_ops"},
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     ip_address: Mapped[str] = mapped_column(INET, unique=True, index=True, nullable=False)
     country_code: Mapped[str | None] = mapped_column(String(10))
     location: Mapped[object | None] = mapped_column(Geometry("POINT", srid=4326))
     raw: Mapped[dict | None] = mapped_column(JSONB)
+    build_epoch: Mapped[int | None] = mapped_column(BigInteger)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
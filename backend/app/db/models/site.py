@@ -35,6 +35,7 @@ class Site(Base):
     owner: Mapped["User"] = relationship(back_populates="owned_sites")
     users: Mapped[list["SiteUser"]] = relationship(back_populates="site")
     geofences: Mapped[list["Geofence"]] = relationship(back_populates="site")
+    country_rules: Mapped[list["GeoCountryRule"]] = relationship(back_populates="site")
     ip_rules: Mapped[list["IPRule"]] = relationship(back_populates="site")
     audits: Mapped[list["AccessAudit"]] = relationship(back_populates="site")
     artifacts: Mapped[list["Artifact"]] = relationship(back_populates="site")
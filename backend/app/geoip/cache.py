@@ -2,28 +2,222 @@ from __future__ import annotations
 
 import threading
 import time
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass
+from ipaddress import IPv4Network, IPv6Address, IPv6Network, ip_address, ip_network
+
+_ADDRESS_BITS = {4: 32, 6: 128}
+
+# (version, prefixlen, address >> host bits); unparseable inputs fall back to the raw string.
+CacheKey = tuple[int, int, int] | str
+
+
+@dataclass(frozen=True)
+class GeoIPCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    size: int
+    max_entries: int
 
 
 class GeoIPCache:
-    def __init__(self, ttl_seconds: int) -> None:
+    def __init__(
+        self,
+        ttl_seconds: int,
+        *,
+        max_entries: int = 100_000,
+        sweep_interval_seconds: float = 60.0,
+        sweep_batch_size: int = 1000,
+    ) -> None:
         if ttl_seconds < 1:
             raise ValueError("ttl_seconds must be >= 1")
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        if sweep_batch_size < 1:
+            raise ValueError("sweep_batch_size must be >= 1")
         self._ttl_seconds = ttl_seconds
-        self._items: dict[str, tuple[float, dict[str, object]]] = {}
+        self._max_entries = max_entries
+        self._sweep_interval_seconds = sweep_interval_seconds
+        self._sweep_batch_size = sweep_batch_size
+        # Every stored entry in store order; the periodic sweep walks it a slice per
+        # get()/set() and drops records whose entry was since replaced or evicted.
+        self._expiry: deque[tuple[CacheKey, tuple[float, dict[str, object]]]] = deque()
+        self._sweep_remaining = 0
+        self._items: OrderedDict[CacheKey, tuple[float, dict[str, object]]] = OrderedDict()
+        self._prefix_counts: dict[int, Counter[int]] = {4: Counter(), 6: Counter()}
+        self._prefixes: dict[int, list[int]] = {4: [], 6: []}
         self._lock = threading.Lock()
+        self._next_sweep_at = time.monotonic() + sweep_interval_seconds
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
 
     def get(self, ip: str) -> dict[str, object] | None:
+        now = time.monotonic()
+        address = normalize_address(ip)
         with self._lock:
-            entry = self._items.get(ip)
-            if entry is None:
-                return None
-            expires_at, payload = entry
-            if time.time() >= expires_at:
-                self._items.pop(ip, None)
-                return None
+            self._maybe_sweep(now)
+            if address is None:
+                payload = self._get_live(ip, now)
+            else:
+                payload = self._get_covering(address, now)
+            if payload is None:
+                self._misses += 1
+            else:
+                self._hits += 1
             return payload
 
     def set(self, ip: str, data: dict[str, object]) -> None:
-        expires_at = time.time() + self._ttl_seconds
+        address = normalize_address(ip)
+        if address is None:
+            self._store(ip, data)
+            return
+        version, value = address
+        bits = _ADDRESS_BITS[version]
+        self._store((version, bits, value), data)
+
+    def set_network(
+        self,
+        network: str | IPv4Network | IPv6Network,
+        data: dict[str, object],
+    ) -> None:
+        parsed = normalize_network(network)
+        if parsed is None:
+            return
+        version, prefixlen, value = parsed
+        shift = _ADDRESS_BITS[version] - prefixlen
+        self._store((version, prefixlen, value >> shift), data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._expiry.clear()
+            self._sweep_remaining = 0
+            self._prefix_counts = {4: Counter(), 6: Counter()}
+            self._prefixes = {4: [], 6: []}
+
+    def sweep(self) -> int:
+        now = time.monotonic()
         with self._lock:
-            self._items[ip] = (expires_at, data)
+            return self._sweep(now)
+
+    def stats(self) -> GeoIPCacheStats:
+        with self._lock:
+            return GeoIPCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+                size=len(self._items),
+                max_entries=self._max_entries,
+            )
+
+    def _get_covering(self, address: tuple[int, int], now: float) -> dict[str, object] | None:
+        version, value = address
+        bits = _ADDRESS_BITS[version]
+        for prefixlen in self._prefixes[version]:
+            payload = self._get_live((version, prefixlen, value >> (bits - prefixlen)), now)
+            if payload is not None:
+                return payload
+        return None
+
+    def _get_live(self, key: CacheKey, now: float) -> dict[str, object] | None:
+        entry = self._items.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if now >= expires_at:
+            self._remove(key)
+            self._expirations += 1
+            return None
+        self._items.move_to_end(key)
+        return payload
+
+    def _store(self, key: CacheKey, data: dict[str, object]) -> None:
+        now = time.monotonic()
+        expires_at = now + self._ttl_seconds
+        with self._lock:
+            self._maybe_sweep(now)
+            if key not in self._items and isinstance(key, tuple):
+                self._track_prefix(key[0], key[1], 1)
+            entry = (expires_at, data)
+            self._items[key] = entry
+            self._expiry.append((key, entry))
+            self._items.move_to_end(key)
+            while len(self._items) > self._max_entries:
+                oldest = next(iter(self._items))
+                self._remove(oldest)
+                self._evictions += 1
+
+    def _remove(self, key: CacheKey) -> None:
+        del self._items[key]
+        if isinstance(key, tuple):
+            self._track_prefix(key[0], key[1], -1)
+
+    def _track_prefix(self, version: int, prefixlen: int, delta: int) -> None:
+        counts = self._prefix_counts[version]
+        counts[prefixlen] += delta
+        if counts[prefixlen] <= 0:
+            del counts[prefixlen]
+            self._prefixes[version] = sorted(counts, reverse=True)
+        elif delta > 0 and counts[prefixlen] == 1:
+            self._prefixes[version] = sorted(counts, reverse=True)
+
+    def _maybe_sweep(self, now: float) -> None:
+        # Lookups run on the event loop, so a full walk of the cache under the lock is never
+        # paid by one of them; the interval's sweep is spread over the calls that follow.
+        if not self._sweep_remaining:
+            if now < self._next_sweep_at:
+                return
+            self._sweep_remaining = len(self._expiry)
+            self._next_sweep_at = now + self._sweep_interval_seconds
+        expiry = self._expiry
+        expired = 0
+        for _ in range(min(self._sweep_batch_size, self._sweep_remaining)):
+            key, entry = expiry.popleft()
+            self._sweep_remaining -= 1
+            if self._items.get(key) is not entry:
+                continue
+            if now >= entry[0]:
+                self._remove(key)
+                expired += 1
+            else:
+                expiry.append((key, entry))
+        self._expirations += expired
+
+    def _sweep(self, now: float) -> int:
+        expired = [key for key, (expires_at, _) in self._items.items() if now >= expires_at]
+        for key in expired:
+            self._remove(key)
+        self._expirations += len(expired)
+        self._next_sweep_at = now + self._sweep_interval_seconds
+        return len(expired)
+
+
+def normalize_address(ip: str) -> tuple[int, int] | None:
+    try:
+        address = ip_address(ip.strip())
+    except (AttributeError, ValueError):
+        return None
+    if isinstance(address, IPv6Address) and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.version, int(address)
+
+
+def normalize_network(
+    network: str | IPv4Network | IPv6Network,
+) -> tuple[int, int, int] | None:
+    try:
+        parsed = ip_network(network, strict=False)
+    except (TypeError, ValueError):
+        return None
+    mapped = getattr(parsed.network_address, "ipv4_mapped", None)
+    if mapped is not None and parsed.prefixlen >= 96:
+        parsed = IPv4Network((int(mapped), parsed.prefixlen - 96))
+    return parsed.version, parsed.prefixlen, int(parsed.network_address)
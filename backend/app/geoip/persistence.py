@@ -0,0 +1,212 @@
+"""Write-behind persistence for the ip_geo_cache table."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from geoalchemy2.elements import WKTElement
+from sqlalchemy import cast, func, select
+from sqlalchemy.dialects.postgresql import INET, insert
+
+from app.db.models.ip_geo_cache import IpGeoCache
+
+
+def geo_cache_columns(data: dict[str, object]) -> dict[str, Any]:
+    latitude = data.get("latitude")
+    longitude = data.get("longitude")
+    location = None
+    if latitude is not None and longitude is not None:
+        location = WKTElement(f"POINT({float(longitude)} {float(latitude)})", srid=4326)
+    country_code = data.get("country_code")
+    return {
+        "country_code": str(country_code) if country_code is not None else None,
+        "location": location,
+        "raw": data,
+    }
+
+
+def build_geo_cache_upsert(rows: list[dict[str, Any]]):
+    stmt = insert(IpGeoCache).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[IpGeoCache.ip_address],
+        set_={
+            "country_code": stmt.excluded.country_code,
+            "location": stmt.excluded.location,
+            "raw": stmt.excluded.raw,
+            "build_epoch": stmt.excluded.build_epoch,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+
+
+def build_geo_cache_lookup(ip: str, build_epoch: int | None = None):
+    # Rows are keyed by the MaxMind network that answered, so match by containment and
+    # prefer the most specific network.
+    stmt = select(IpGeoCache.ip_address, IpGeoCache.raw).where(
+        IpGeoCache.ip_address.op(">>=")(cast(ip, INET))
+    )
+    if build_epoch is not None:
+        # Rows written from an older GeoLite2 release are misses, so they get re-resolved.
+        stmt = stmt.where(IpGeoCache.build_epoch >= build_epoch)
+    return stmt.order_by(func.masklen(IpGeoCache.ip_address).desc()).limit(1)
+
+
+@dataclass(frozen=True)
+class WriteBehindStats:
+    queue_depth: int
+    submitted: int
+    dropped: int
+    flushes: int
+    failed_flushes: int
+    flushed_rows: int
+    last_flush_seconds: float
+    max_flush_seconds: float
+
+
+class GeoCacheWriteBehind:
+    def __init__(
+        self,
+        session_factory: Callable[[], Any],
+        *,
+        batch_size: int = 500,
+        flush_interval_seconds: float = 1.0,
+        max_pending: int = 10_000,
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        if max_pending < batch_size:
+            raise ValueError("max_pending must be >= batch_size")
+        self._session_factory = session_factory
+        self._batch_size = batch_size
+        self._flush_interval_seconds = flush_interval_seconds
+        self._max_pending = max_pending
+        # Keyed by address/network so a batch never upserts the same row twice.
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._logger = logging.getLogger(__name__)
+        self._submitted = 0
+        self._dropped = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._flushed_rows = 0
+        self._last_flush_seconds = 0.0
+        self._max_flush_seconds = 0.0
+
+    def submit(
+        self, ip_address: str, data: dict[str, object], build_epoch: int | None = None
+    ) -> bool:
+        row = {
+            "id": uuid.uuid4(),
+            "ip_address": ip_address,
+            "build_epoch": build_epoch,
+            "updated_at": datetime.utcnow(),
+            **geo_cache_columns(data),
+        }
+        with self._lock:
+            if ip_address not in self._pending and len(self._pending) >= self._max_pending:
+                self._dropped += 1
+                return False
+            self._pending[ip_address] = row
+            self._submitted += 1
+            full = len(self._pending) >= self._batch_size
+        if full:
+            self._wakeup.set()
+        return True
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="geoip-write-behind", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float | None = None) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            flushed = 0
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        return flushed
+                    keys = list(self._pending)[: self._batch_size]
+                    batch = {key: self._pending.pop(key) for key in keys}
+                if not self._write(batch):
+                    return flushed
+                flushed += len(batch)
+
+    def stats(self) -> WriteBehindStats:
+        with self._lock:
+            return WriteBehindStats(
+                queue_depth=len(self._pending),
+                submitted=self._submitted,
+                dropped=self._dropped,
+                flushes=self._flushes,
+                failed_flushes=self._failed_flushes,
+                flushed_rows=self._flushed_rows,
+                last_flush_seconds=self._last_flush_seconds,
+                max_flush_seconds=self._max_flush_seconds,
+            )
+
+    def _write(self, batch: dict[str, dict[str, Any]]) -> bool:
+        started = time.perf_counter()
+        session = self._session_factory()
+        try:
+            session.execute(build_geo_cache_upsert(list(batch.values())))
+            session.commit()
+        except Exception as exc:
+            self._logger.exception("GeoIP cache batch write failed", exc_info=exc)
+            try:
+                session.rollback()
+            except Exception:
+                pass
+            self._requeue(batch)
+            with self._lock:
+                self._failed_flushes += 1
+            return False
+        finally:
+            session.close()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._flushes += 1
+            self._flushed_rows += len(batch)
+            self._last_flush_seconds = elapsed
+            self._max_flush_seconds = max(self._max_flush_seconds, elapsed)
+        return True
+
+    def _requeue(self, batch: dict[str, dict[str, Any]]) -> None:
+        with self._lock:
+            for key, row in batch.items():
+                if key in self._pending:
+                    continue
+                if len(self._pending) >= self._max_pending:
+                    self._dropped += 1
+                    continue
+                self._pending[key] = row
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(self._flush_interval_seconds)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                return
+            try:
+                self.flush()
+            except Exception as exc:
+                self._logger.exception("GeoIP cache write-behind flush failed", exc_info=exc)
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+
+def open_mmdb_reader(path: str) -> Any:
+    import geoip2.database
+    import maxminddb
+
+    # MODE_MMAP keeps the database in the OS page cache, shared by every worker process.
+    return geoip2.database.Reader(path, mode=maxminddb.MODE_MMAP)
+
+
+@dataclass(frozen=True)
+class GeoIPDatabaseInfo:
+    path: str
+    database_type: str | None
+    build_epoch: int | None
+    loaded_at: datetime
+
+    def as_dict(self) -> dict[str, object]:
+        data = asdict(self)
+        data["loaded_at"] = self.loaded_at.isoformat()
+        return data
+
+
+class ManagedGeoIPReader:
+    def __init__(
+        self,
+        path: str,
+        *,
+        poll_interval_seconds: float = 60.0,
+        opener: Callable[[str], Any] = open_mmdb_reader,
+    ) -> None:
+        self._path = path
+        self._poll_interval_seconds = poll_interval_seconds
+        self._opener = opener
+        self._reader: Any | None = None
+        self._info: GeoIPDatabaseInfo | None = None
+        self._signature: tuple[int, int, int] | None = None
+        self._retired: list[tuple[float, Any]] = []
+        self._listeners: list[Callable[[GeoIPDatabaseInfo], None]] = []
+        self._reload_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def info(self) -> GeoIPDatabaseInfo | None:
+        return self._info
+
+    def city(self, ip: str) -> Any:
+        reader = self._reader
+        if reader is None:
+            raise RuntimeError("MaxMind reader not available")
+        return reader.city(ip)
+
+    def subscribe(self, listener: Callable[[GeoIPDatabaseInfo], None]) -> None:
+        self._listeners.append(listener)
+
+    def open(self) -> bool:
+        return self.check_for_update()
+
+    def check_for_update(self) -> bool:
+        with self._reload_lock:
+            self._close_retired(time.monotonic())
+            signature = self._file_signature()
+            if signature is None or signature == self._signature:
+                return False
+            try:
+                reader = self._opener(self._path)
+            except Exception as exc:
+                # A release still being written fails to open; the next poll retries it.
+                self._logger.warning("Could not open GeoIP database %s: %s", self._path, exc)
+                return False
+            previous = self._reader
+            self._reader = reader
+            self._info = _database_info(self._path, reader)
+            self._signature = signature
+            if previous is not None:
+                # In-flight lookups may still hold the old reader; close it one poll later.
+                self._retired.append((time.monotonic() + self._poll_interval_seconds, previous))
+            self._logger.info("Loaded GeoIP database %s", self._info.as_dict())
+            for listener in self._listeners:
+                try:
+                    listener(self._info)
+                except Exception as exc:
+                    self._logger.exception("GeoIP database listener failed", exc_info=exc)
+            return True
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="geoip-reader-watch", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(self._poll_interval_seconds)
+            self._thread = None
+        with self._reload_lock:
+            self._close_retired(float("inf"))
+            if self._reader is not None:
+                _close_quietly(self._reader)
+                self._reader = None
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self._poll_interval_seconds):
+            try:
+                self.check_for_update()
+            except Exception as exc:
+                self._logger.exception("GeoIP database watch failed", exc_info=exc)
+
+    def _file_signature(self) -> tuple[int, int, int] | None:
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _close_retired(self, now: float) -> None:
+        keep = []
+        for close_at, reader in self._retired:
+            if now >= close_at:
+                _close_quietly(reader)
+            else:
+                keep.append((close_at, reader))
+        self._retired = keep
+
+
+def _database_info(path: str, reader: Any) -> GeoIPDatabaseInfo:
+    metadata = None
+    metadata_fn = getattr(reader, "metadata", None)
+    if metadata_fn is not None:
+        try:
+            metadata = metadata_fn()
+        except Exception:
+            metadata = None
+    return GeoIPDatabaseInfo(
+        path=path,
+        database_type=getattr(metadata, "database_type", None),
+        build_epoch=getattr(metadata, "build_epoch", None),
+        loaded_at=datetime.now(timezone.utc),
+    )
+
+
+def _close_quietly(reader: Any) -> None:
+    close = getattr(reader, "close", None)
+    if close is None:
+        return
+    try:
+        close()
+    except Exception:
+        pass
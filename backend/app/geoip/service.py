@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+from collections.abc import Callable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from ipaddress import ip_network
 from typing import Any
 
+import asyncio
 import logging
 
-from app.geoip.cache import GeoIPCache
+from app.geoip.cache import GeoIPCache, normalize_address
+from app.geoip.persistence import (
+    GeoCacheWriteBehind,
+    build_geo_cache_lookup,
+    geo_cache_columns,
+)
+from app.geoip.singleflight import AsyncSingleFlight, SingleFlight
 
 
 class GeoIPService:
@@ -14,21 +24,70 @@ class GeoIPService:
         cache: GeoIPCache,
         reader: object | None,
         db_session: object | None = None,
+        session_factory: Callable[[], Any] | None = None,
+        writer: GeoCacheWriteBehind | None = None,
+        executor: Executor | None = None,
+        max_workers: int = 4,
     ) -> None:
         self._cache = cache
         self._reader = reader
         self._db_session = db_session
+        self._session_factory = session_factory
+        self._writer = writer
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="geoip-lookup",
+        )
         self._logger = logging.getLogger(__name__)
+        self._inflight = SingleFlight()
+        self._async_inflight = AsyncSingleFlight()
+        subscribe = getattr(reader, "subscribe", None)
+        if subscribe is not None:
+            subscribe(self._on_database_update)
 
     def lookup(self, ip: str) -> dict[str, object] | None:
+        cached = self._cache.get(ip)
+        if cached is not None:
+            return cached
+        return self._inflight.do(_flight_key(ip), lambda: self._lookup_uncached(ip))
+
+    async def lookup_async(self, ip: str) -> dict[str, object] | None:
+        cached = self._cache.get(ip)
+        if cached is not None:
+            return cached
+        # Reader and DB work is blocking, so it runs on the bounded executor, never the loop.
+        loop = asyncio.get_running_loop()
+        return await self._async_inflight.do(
+            _flight_key(ip),
+            lambda: loop.run_in_executor(self._executor, self.lookup, ip),
+        )
+
+    def close(self) -> None:
+        if self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _on_database_update(self, info: Any) -> None:
+        # Cached answers came from the previous release; the new one must be asked again.
+        self._cache.clear()
+
+    def _build_epoch(self) -> int | None:
+        return getattr(getattr(self._reader, "info", None), "build_epoch", None)
+
+    def _lookup_uncached(self, ip: str) -> dict[str, object] | None:
+        # A previous flight for this key may have filled the cache after our miss.
         cached = self._cache.get(ip)
         if cached is not None:
             return cached
 
         db_cached = self._fetch_from_db(ip)
         if db_cached is not None:
-            self._cache.set(ip, db_cached)
-            return db_cached
+            data, network = db_cached
+            if network is None:
+                self._cache.set(ip, data)
+            else:
+                self._cache.set_network(network, data)
+            return data
 
         if self._reader is None:
             raise RuntimeError("MaxMind reader not available")
@@ -37,12 +96,21 @@ class GeoIPService:
         if lookup is None:
             raise RuntimeError("MaxMind reader not available")
 
-        data = self._normalize(lookup(ip))
-        self._cache.set(ip, data)
-        self._store_in_db(ip, data)
+        response = lookup(ip)
+        data = self._normalize(response)
+        network = self._response_network(response)
+        if network is None:
+            self._cache.set(ip, data)
+            self._store_in_db(ip, data)
+        else:
+            # One entry answers every address in the MaxMind network the record applies to.
+            self._cache.set_network(network, data)
+            self._store_in_db(str(network), data)
         return data
 
-    def _fetch_from_db(self, ip: str) -> dict[str, object] | None:
+    def _fetch_from_db(self, ip: str) -> tuple[dict[str, object], Any] | None:
+        if self._session_factory is not None:
+            return self._fetch_network_from_db(ip)
         if self._db_session is None:
             return None
         query = getattr(self._db_session, "query", None)
@@ -52,13 +120,32 @@ class GeoIPService:
         if result is None:
             return None
         if isinstance(result, dict):
-            return result
+            return result, None
         raw = getattr(result, "raw", None)
         if isinstance(raw, dict):
-            return raw
+            return raw, None
         return None
 
+    def _fetch_network_from_db(self, ip: str) -> tuple[dict[str, object], Any] | None:
+        if normalize_address(ip) is None:
+            return None
+        try:
+            session = self._session_factory()
+            try:
+                row = session.execute(build_geo_cache_lookup(ip, self._build_epoch())).first()
+            finally:
+                session.close()
+        except Exception as exc:
+            self._logger.exception("GeoIP cache DB read failed; using the reader", exc_info=exc)
+            return None
+        if row is None or not isinstance(row.raw, dict):
+            return None
+        return row.raw, ip_network(str(row.ip_address), strict=False)
+
     def _store_in_db(self, ip: str, data: dict[str, object]) -> None:
+        if self._writer is not None:
+            self._writer.submit(ip, data, self._build_epoch())
+            return
         if self._db_session is None:
             return
         add = getattr(self._db_session, "add", None)
@@ -74,7 +161,9 @@ class GeoIPService:
             )
             return
         try:
-            record = IpGeoCache(ip_address=ip, raw=data)
+            record = IpGeoCache(
+                ip_address=ip, build_epoch=self._build_epoch(), **geo_cache_columns(data)
+            )
             add(record)
             commit()
         except Exception as exc:
@@ -84,6 +173,11 @@ class GeoIPService:
             )
             return
 
+    def _response_network(self, response: Any) -> object | None:
+        if isinstance(response, dict):
+            return None
+        return getattr(getattr(response, "traits", None), "network", None)
+
     def _normalize(self, response: Any) -> dict[str, object]:
         if isinstance(response, dict):
             return response
@@ -102,3 +196,7 @@ class GeoIPService:
             payload["latitude"] = lat
             payload["longitude"] = lon
         return payload
+
+
+def _flight_key(ip: str) -> object:
+    return normalize_address(ip) or ip
@@ -1,6 +1,19 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from app.artifacts.storage_factory import build_storage
+from app.audit import service as audit_service
+from app.audit.coalesce import AuditCoalescer
+from app.audit.partitions import AuditPartitionMaintainer
+from app.audit.ring import SharedAuditRing
+from app.audit.rollups import AuditRollups
+from app.audit.writer import AuditWriter
+from app.db.session import SessionLocal
+from app.geoip.cache import GeoIPCache
+from app.geoip.persistence import GeoCacheWriteBehind
+from app.geoip.reader import ManagedGeoIPReader
+from app.geoip.service import GeoIPService
 from app.routers.audit import router as audit_router
 from app.routers.auth import router as auth_router
 from app.routers.geofences import router as geofences_router
@@ -8,9 +21,120 @@ from app.routers.health import router as health_router
 from app.routers.ip_rules import router as ip_rules_router
 from app.routers.site_users import router as site_users_router
 from app.routers.sites import router as sites_router
+from app.routers.stats import router as stats_router
 from app.middleware.access_gate import AccessGateMiddleware
+from app.middleware.site_refresh import SiteConfigRefresher
+from app.settings import settings
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reader = ManagedGeoIPReader(
+        settings.geoip_db_path,
+        poll_interval_seconds=settings.geoip_db_poll_interval_seconds,
+    )
+    reader.open()
+    reader.start()
+    writer = GeoCacheWriteBehind(
+        SessionLocal,
+        batch_size=settings.geoip_write_batch_size,
+        flush_interval_seconds=settings.geoip_write_flush_interval_seconds,
+        max_pending=settings.geoip_write_max_pending,
+    )
+    writer.start()
+    geoip_service = GeoIPService(
+        cache=GeoIPCache(
+            settings.geoip_cache_ttl_seconds,
+            max_entries=settings.geoip_cache_max_entries,
+            sweep_interval_seconds=settings.geoip_cache_sweep_interval_seconds,
+            sweep_batch_size=settings.geoip_cache_sweep_batch_size,
+        ),
+        reader=reader,
+        session_factory=SessionLocal,
+        writer=writer,
+        max_workers=settings.geoip_lookup_workers,
+    )
+    previous_store = audit_service.get_store()
+    shared_ring = None
+    if settings.audit_shared_ring_path:
+        # Every worker maps the same file, so /audit/export?source=recent sees blocks
+        # recorded by any of them, including coalesced records not yet persisted.
+        shared_ring = SharedAuditRing(
+            settings.audit_shared_ring_path,
+            capacity=settings.audit_shared_ring_capacity,
+        )
+        audit_service.set_store(shared_ring)
+    audit_writer = AuditWriter(
+        SessionLocal,
+        batch_size=settings.audit_write_batch_size,
+        flush_interval_seconds=settings.audit_write_flush_interval_seconds,
+        max_pending=settings.audit_write_max_pending,
+        spill_path=settings.audit_spill_path,
+        dead_letter_path=settings.audit_dead_letter_path,
+        max_batch_attempts=settings.audit_write_max_batch_attempts,
+    )
+    audit_writer.start()
+    audit_service.set_writer(audit_writer)
+    app.state.audit_writer = audit_writer
+    coalescer = None
+    if settings.audit_coalesce_window_seconds > 0:
+        coalescer = AuditCoalescer(
+            window_seconds=settings.audit_coalesce_window_seconds,
+            max_open=settings.audit_coalesce_max_open,
+            on_close=audit_service.submit,
+        )
+        coalescer.start()
+        audit_service.set_coalescer(coalescer)
+    app.state.audit_session_factory = SessionLocal
+    rollups = AuditRollups(
+        SessionLocal,
+        flush_interval_seconds=settings.audit_rollup_flush_interval_seconds,
+        max_keys=settings.audit_rollup_max_keys,
+    )
+    rollups.start()
+    previous_rollups = audit_service.get_rollups()
+    audit_service.set_rollups(rollups)
+    partition_maintainer = AuditPartitionMaintainer(
+        SessionLocal,
+        retention_days=settings.audit_retention_days,
+        premake_days=settings.audit_partition_premake_days,
+        interval_seconds=settings.audit_partition_maintenance_interval_seconds,
+    )
+    partition_maintainer.start()
+    app.state.audit_partition_maintainer = partition_maintainer
+    site_refresher = SiteConfigRefresher(
+        app, SessionLocal, interval_seconds=settings.site_config_refresh_interval_seconds
+    )
+    site_refresher.start()
+    app.state.geoip_reader = reader
+    app.state.geoip_writer = writer
+    app.state.geoip_service = geoip_service
+    try:
+        yield
+    finally:
+        site_refresher.close(timeout=5)
+        geoip_service.close()
+        writer.close(timeout=5)
+        reader.close()
+        side_effects = getattr(app.state, "block_side_effects", None)
+        if side_effects is not None:
+            side_effects.close(timeout=5)
+        # Block side effects log audit events, so the audit writer drains after them;
+        # open coalescing windows are handed to the writer before it closes.
+        if coalescer is not None:
+            audit_service.set_coalescer(None)
+            coalescer.close(timeout=5)
+        audit_service.set_writer(None)
+        audit_writer.close(timeout=5)
+        audit_service.set_rollups(previous_rollups)
+        rollups.close(timeout=5)
+        partition_maintainer.close(timeout=5)
+        if shared_ring is not None:
+            audit_service.set_store(previous_store)
+            shared_ring.close()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.state.artifact_storage = build_storage()
 app.add_middleware(AccessGateMiddleware)
 app.include_router(health_router)
@@ -20,3 +144,4 @@ app.include_router(sites_router)
 app.include_router(geofences_router)
 app.include_router(ip_rules_router)
 app.include_router(site_users_router)
+app.include_router(stats_router)
@@ -2,24 +2,41 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from collections.abc import Awaitable
+from functools import partial
 import inspect
+import logging
 from pathlib import Path
-from typing import Iterable, Mapping
+from typing import Any, Mapping
 
 from fastapi import FastAPI, Request
 from fastapi.templating import Jinja2Templates
-from starlette.middleware.base import BaseHTTPMiddleware
-
+from sqlalchemy.orm import Session
+from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.websockets import WebSocketClose
+
+from app.admin.repositories.geofence_repository import GeofenceRepository
+from app.admin.repositories.ip_rule_repository import IPRuleRepository
+from app.admin.repositories.serialization import ip_rule_to_dict
+from app.admin.repositories.site_repository import SiteRepository
 from app.artifacts import worker as artifact_worker
 from app.artifacts.storage import S3CompatibleStorage
-from app.access.decision import decide_access
-from app.access.ip_rules import evaluate_ip_rules
+from app.access.countries import (
+    compile_country_allowlist,
+    country_allowed,
+    normalize_country_code,
+)
+from app.access.decision import DecisionStageCounters, decide_geo_stage, decide_ip_stage
+from app.access.geofence import CompiledGeofences, GeofenceDecisionMemo, compile_geofences
+from app.access.ip_rules import CompiledIPRules, compile_ip_rules, evaluate_ip_rules
 from app.audit import service as audit_service
+from app.audit.sketches import BlockSketches
 from app.db.models.audit import AccessDecision
 from app.db.models.site import SiteFilterMode
+from app.middleware.side_effects import BlockSideEffectQueue
 from app.settings import settings
 
 templates = Jinja2Templates(directory=str(Path(__file__).resolve().parents[1] / "templates"))
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -28,6 +45,16 @@ class SiteAccessConfig:
     site_id: str
     ip_rules: list[Mapping[str, object]] = field(default_factory=list)
     geo_allowed: bool | None = None
+    geofences: list[Mapping[str, object]] = field(default_factory=list)
+    allowed_countries: list[str] = field(default_factory=list)
+    compiled_ip_rules: CompiledIPRules | None = field(default=None, repr=False, compare=False)
+    compiled_geofences: CompiledGeofences | None = field(
+        default=None, repr=False, compare=False
+    )
+    geofence_memo: GeofenceDecisionMemo | None = field(default=None, repr=False, compare=False)
+    compiled_countries: frozenset[str] = field(
+        default_factory=frozenset, repr=False, compare=False
+    )
 
 
 class SiteConfigRegistry:
@@ -38,8 +65,20 @@ class SiteConfigRegistry:
         return self._configs.get(hostname)
 
     def set(self, hostname: str, config: SiteAccessConfig) -> None:
+        config.compiled_ip_rules = compile_ip_rules(config.ip_rules)
+        config.compiled_countries = compile_country_allowlist(config.allowed_countries)
+        config.compiled_geofences = compile_geofences(config.geofences)
+        # Registering again is how geofence edits land, so the memo always starts empty.
+        config.geofence_memo = GeofenceDecisionMemo(
+            config.compiled_geofences,
+            max_entries=settings.geofence_memo_max_entries,
+            precision=settings.geofence_memo_precision,
+        )
         self._configs[hostname.lower()] = config
 
+    def items(self) -> list[tuple[str, SiteAccessConfig]]:
+        return list(self._configs.items())
+
     def clear(self) -> None:
         self._configs.clear()
 
@@ -52,10 +91,98 @@ def _get_site_registry(app: FastAPI) -> SiteConfigRegistry:
     return registry
 
 
+def _get_side_effect_queue(app: FastAPI) -> BlockSideEffectQueue:
+    queue = getattr(app.state, "block_side_effects", None)
+    if queue is None:
+        queue = BlockSideEffectQueue(
+            maxsize=settings.block_side_effect_queue_size,
+            workers=settings.block_side_effect_workers,
+        )
+        app.state.block_side_effects = queue
+    return queue
+
+
+def get_block_sketches(app: FastAPI) -> BlockSketches:
+    sketches = getattr(app.state, "block_sketches", None)
+    if sketches is None:
+        sketches = BlockSketches(
+            window_seconds=settings.block_sketch_window_seconds,
+            windows=settings.block_sketch_windows,
+            top_capacity=settings.block_sketch_top_capacity,
+            hll_precision=settings.block_sketch_hll_precision,
+        )
+        app.state.block_sketches = sketches
+    return sketches
+
+
+def _get_decision_counters(app: FastAPI) -> DecisionStageCounters:
+    counters = getattr(app.state, "access_decision_counters", None)
+    if counters is None:
+        counters = DecisionStageCounters()
+        app.state.access_decision_counters = counters
+    return counters
+
+
 def register_site_config(app: FastAPI, hostname: str, config: SiteAccessConfig) -> None:
     _get_site_registry(app).set(hostname, config)
 
 
+def update_site_countries(app: FastAPI, hostname: str, countries: list[str]) -> bool:
+    registry = _get_site_registry(app)
+    config = registry.get(hostname.lower())
+    if config is None:
+        return False
+    config.allowed_countries = list(countries)
+    registry.set(hostname, config)
+    return True
+
+
+def update_site_geofences(
+    app: FastAPI, hostname: str, geofences: list[Mapping[str, object]]
+) -> bool:
+    registry = _get_site_registry(app)
+    config = registry.get(hostname.lower())
+    if config is None:
+        return False
+    config.geofences = list(geofences)
+    # Registering again recompiles the shapes and starts a fresh decision memo.
+    registry.set(hostname, config)
+    return True
+
+
+def load_site_access_config(db: Session, site: Any) -> SiteAccessConfig:
+    site_id = str(site.id)
+    geofences = GeofenceRepository(db)
+    return SiteAccessConfig(
+        filter_mode=site.filter_mode,
+        site_id=site_id,
+        ip_rules=[ip_rule_to_dict(rule) for rule in IPRuleRepository(db).list_for_site(site_id)],
+        geofences=geofences.list_for_site(site_id),
+        allowed_countries=geofences.list_countries(site_id),
+    )
+
+
+def refresh_site_configs(app: FastAPI, db: Session) -> int:
+    # Admin writes only refresh the worker that served them; re-reading the tables is how
+    # every other worker catches up.
+    registry = _get_site_registry(app)
+    sites = SiteRepository(db)
+    refreshed = 0
+    for hostname, config in registry.items():
+        try:
+            site = sites.get(config.site_id)
+        except ValueError:
+            continue
+        if site is None:
+            continue
+        fresh = load_site_access_config(db, site)
+        fresh.geo_allowed = config.geo_allowed
+        if fresh != config:
+            registry.set(hostname, fresh)
+            refreshed += 1
+    return refreshed
+
+
 def clear_site_configs(app: FastAPI) -> None:
     _get_site_registry(app).clear()
 
@@ -66,94 +193,166 @@ def _normalize_hostname(host: str | None) -> str | None:
     return host.split(":", 1)[0].lower()
 
 
-class AccessGateMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, *, geoip_service: object | None = None) -> None:
-        super().__init__(app)
+def _scope_host(scope: Scope) -> str | None:
+    for name, value in scope.get("headers") or ():
+        if name == b"host":
+            return value.decode("latin-1")
+    return None
+
+
+def _scope_client_ip(scope: Scope) -> str:
+    client = scope.get("client")
+    if not client:
+        return ""
+    return client[0] or ""
+
+
+class AccessGateMiddleware:
+    def __init__(self, app: ASGIApp, *, geoip_service: object | None = None) -> None:
+        self.app = app
         self._geoip_service = geoip_service
 
-    async def dispatch(self, request: Request, call_next):
-        host = _normalize_hostname(request.headers.get("host"))
-        if not host:
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        host = _normalize_hostname(_scope_host(scope))
+        app = scope.get("app")
+        if not host or app is None:
+            await self.app(scope, receive, send)
+            return
 
-        config = _get_site_registry(request.app).get(host)
+        config = _get_site_registry(app).get(host)
         if config is None:
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
 
-        ip_action = _evaluate_ip_action(request, config.ip_rules)
+        client_ip = _scope_client_ip(scope)
+        ip_action = _evaluate_ip_action(client_ip, config)
         geoip_service = self._geoip_service
         if geoip_service is None:
-            geoip_service = getattr(request.app.state, "geoip_service", None)
-        geo_allowed = await _evaluate_geo_allowed(
-            request,
-            config.geo_allowed,
-            geoip_service,
+            geoip_service = getattr(app.state, "geoip_service", None)
+        counters = _get_decision_counters(app)
+        decision = decide_ip_stage(filter_mode=config.filter_mode, ip_action=ip_action)
+        country = None
+        if decision is None:
+            counters.geo_stage += 1
+            geo_allowed, country = await _evaluate_geo_allowed(client_ip, config, geoip_service)
+            decision = decide_geo_stage(geo_allowed=geo_allowed)
+        else:
+            counters.ip_stage_final += 1
+            if config.geo_allowed is None and geoip_service is not None and client_ip:
+                counters.geo_lookups_avoided += 1
+        if decision != AccessDecision.BLOCKED:
+            await self.app(scope, receive, send)
+            return
+
+        # The sketch is O(1) and must count every block, even ones whose side effects the
+        # queue drops under load.
+        _record_block_sketch(app, config, client_ip)
+        # Capture, upload and audit run on the side-effect workers so the 403 is not held up.
+        _get_side_effect_queue(app).submit(
+            partial(_run_block_side_effects, app, config, client_ip, country)
         )
-        decision = decide_access(
-            filter_mode=config.filter_mode,
-            ip_action=ip_action,
-            geo_allowed=geo_allowed,
+        if scope["type"] == "websocket":
+            # Closing before accept makes the server reject the handshake with a 403.
+            await WebSocketClose(code=1008)(scope, receive, send)
+            return
+        response = templates.TemplateResponse(
+            Request(scope, receive),
+            "block.html",
+            {"hostname": host},
+            status_code=403,
         )
-        if decision == AccessDecision.BLOCKED:
-            artifact_path = await _capture_block_artifact(request, config)
-            _log_block_event(request, config, artifact_path)
-            return templates.TemplateResponse(
-                request,
-                "block.html",
-                {"hostname": host},
-                status_code=403,
-            )
-
-        return await call_next(request)
+        await response(scope, receive, send)
 
 
-def _evaluate_ip_action(request: Request, rules: Iterable[Mapping[str, object]]) -> object | None:
-    if not rules:
+def _evaluate_ip_action(client_ip: str, config: SiteAccessConfig) -> object | None:
+    if not config.ip_rules:
         return None
-    client_ip = request.client.host if request.client else ""
     if not client_ip:
         return None
     try:
-        return evaluate_ip_rules(client_ip, rules)
+        if config.compiled_ip_rules is not None:
+            return config.compiled_ip_rules.lookup(client_ip)
+        return evaluate_ip_rules(client_ip, config.ip_rules)
     except Exception:
         return None
 
 
 async def _evaluate_geo_allowed(
-    request: Request,
-    geo_allowed: bool | None,
+    client_ip: str,
+    config: SiteAccessConfig,
     geoip_service: object | None,
-) -> bool | None:
-    if geo_allowed is not None:
-        return geo_allowed
+) -> tuple[bool | None, str | None]:
+    if config.geo_allowed is not None:
+        return config.geo_allowed, None
     if geoip_service is None:
-        return None
-    client_ip = request.client.host if request.client else ""
+        return None, None
     if not client_ip:
-        return None
-    lookup = getattr(geoip_service, "lookup", None)
-    if lookup is None:
-        return None
+        return None, None
     try:
-        result = lookup(client_ip)
-        if isinstance(result, Awaitable) or inspect.isawaitable(result):
-            result = await result
+        lookup_async = getattr(geoip_service, "lookup_async", None)
+        if lookup_async is not None:
+            result = await lookup_async(client_ip)
+        else:
+            lookup = getattr(geoip_service, "lookup", None)
+            if lookup is None:
+                return None, None
+            result = lookup(client_ip)
+            if isinstance(result, Awaitable) or inspect.isawaitable(result):
+                result = await result
     except Exception:
-        return None
+        return None, None
     if result is None:
-        return None
+        return None, None
+    # Returned alongside the decision so block audits and rollups can attribute the country.
+    country = result.get("country_code") if isinstance(result, Mapping) else None
+    if config.compiled_countries:
+        # The set lookup settles most GEO sites before any polygon work happens.
+        if country_allowed(config.compiled_countries, country):
+            return True, country
+        if not config.compiled_geofences:
+            return False, country
+    if config.compiled_geofences:
+        memo = config.geofence_memo or config.compiled_geofences
+        return _within_site_geofences(result, memo), country
     if isinstance(result, bool):
-        return result
+        return result, country
     if isinstance(result, Mapping):
-        return bool(result)
-    return True
+        return bool(result), country
+    return True, country
+
+
+def _within_site_geofences(
+    result: object,
+    geofences: CompiledGeofences | GeofenceDecisionMemo,
+) -> bool:
+    if not isinstance(result, Mapping):
+        return False
+    try:
+        point = (float(result["longitude"]), float(result["latitude"]))
+    except (KeyError, TypeError, ValueError):
+        return False
+    return geofences.contains(point)
+
+
+async def _run_block_side_effects(
+    app: FastAPI,
+    config: SiteAccessConfig,
+    client_ip: str,
+    country: str | None = None,
+) -> None:
+    artifact_path = await _capture_block_artifact(app, config)
+    _log_block_event(app, config, client_ip, artifact_path, country)
 
 
 async def _capture_block_artifact(
-    request: Request,
+    app: FastAPI,
     config: SiteAccessConfig,
 ) -> str | None:
-    capture_service = getattr(request.app.state, "capture_service", None)
+    capture_service = getattr(app.state, "capture_service", None)
     capture_callable = None
     capture_method = getattr(capture_service, "capture", None)
     if capture_method is not None:
@@ -161,7 +360,7 @@ async def _capture_block_artifact(
             return capture_method(config.site_id)
 
         capture_callable = _capture
-    storage = getattr(request.app.state, "artifact_storage", None)
+    storage = getattr(app.state, "artifact_storage", None)
     if storage is None:
         storage = S3CompatibleStorage(
             bucket=settings.artifact_bucket,
@@ -181,17 +380,26 @@ async def _capture_block_artifact(
         return None
 
 
+def _record_block_sketch(app: FastAPI, config: SiteAccessConfig, client_ip: str) -> None:
+    try:
+        get_block_sketches(app).record(str(config.site_id), client_ip or None)
+    except Exception as exc:
+        logger.exception("Recording blocked client sketch failed", exc_info=exc)
+
+
 def _log_block_event(
-    request: Request,
+    app: FastAPI,
     config: SiteAccessConfig,
+    client_ip: str,
     artifact_path: str | None,
+    country: str | None = None,
 ) -> None:
-    service = getattr(request.app.state, "audit_service", audit_service)
+    service = getattr(app.state, "audit_service", audit_service)
     try:
         service.log_block(
             site_id=str(config.site_id),
-            client_ip=request.client.host if request.client else None,
-            ip_geo_country=None,
+            client_ip=client_ip or None,
+            ip_geo_country=normalize_country_code(country),
             reason="blocked",
             artifact_path=artifact_path,
         )
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import threading
+from collections import deque
+from collections.abc import Awaitable, Callable
+
+SideEffectJob = Callable[[], Awaitable[object] | object]
+
+
+class BlockSideEffectQueue:
+    def __init__(self, *, maxsize: int, workers: int) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self._maxsize = maxsize
+        self._worker_count = workers
+        self._jobs: deque[SideEffectJob | None] = deque()
+        self._lock = threading.Lock()
+        self._work_available = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._workers: list[threading.Thread] = []
+        self._pending = 0
+        self._closed = False
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._dropped = 0
+        self._logger = logging.getLogger(__name__)
+
+    def submit(self, job: SideEffectJob) -> bool:
+        with self._lock:
+            if self._closed or self._pending >= self._maxsize:
+                self._dropped += 1
+                return False
+            if not self._workers:
+                self._start_workers()
+            self._jobs.append(job)
+            self._pending += 1
+            self._submitted += 1
+            self._work_available.notify()
+        return True
+
+    def join(self, timeout: float | None = None) -> bool:
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: float | None = None) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._jobs.extend([None] * len(self._workers))
+            self._work_available.notify_all()
+            workers = list(self._workers)
+        for worker in workers:
+            worker.join(timeout)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "dropped": self._dropped,
+                "depth": self._pending,
+            }
+
+    def _start_workers(self) -> None:
+        for index in range(self._worker_count):
+            worker = threading.Thread(
+                target=self._run,
+                name=f"block-side-effects-{index}",
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _run(self) -> None:
+        # Each worker owns a loop so async capture services never touch the request loop.
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                with self._work_available:
+                    self._work_available.wait_for(lambda: bool(self._jobs))
+                    job = self._jobs.popleft()
+                if job is None:
+                    return
+                failed = False
+                try:
+                    result = job()
+                    if inspect.isawaitable(result):
+                        loop.run_until_complete(result)
+                except Exception as exc:
+                    failed = True
+                    self._logger.exception("Block side effect failed", exc_info=exc)
+                with self._lock:
+                    self._pending -= 1
+                    if failed:
+                        self._failed += 1
+                    else:
+                        self._completed += 1
+                    if self._pending == 0:
+                        self._idle.notify_all()
+        finally:
+            loop.close()
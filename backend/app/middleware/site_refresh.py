@@ -0,0 +1,55 @@
+"""Periodic re-read of registered site access configs, so every worker sees admin edits."""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Callable
+from typing import Any
+
+from fastapi import FastAPI
+
+from app.middleware.access_gate import refresh_site_configs
+
+
+class SiteConfigRefresher:
+    def __init__(
+        self,
+        app: FastAPI,
+        session_factory: Callable[[], Any],
+        *,
+        interval_seconds: float = 30.0,
+    ) -> None:
+        self._app = app
+        self._session_factory = session_factory
+        self._interval_seconds = interval_seconds
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._logger = logging.getLogger(__name__)
+
+    def run_once(self) -> int:
+        session = self._session_factory()
+        try:
+            return refresh_site_configs(self._app, session)
+        finally:
+            session.close()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="site-config-refresh", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float | None = None) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self._interval_seconds):
+            try:
+                self.run_once()
+            except Exception as exc:
+                self._logger.exception("Site config refresh failed", exc_info=exc)
@@ -1,11 +1,83 @@
-from fastapi import APIRouter, Response
+import enum
+from datetime import datetime
 
-from app.audit import service as audit_service
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+
+from app.audit.export import (
+    AuditExportFilter,
+    iter_arrow,
+    iter_csv,
+    iter_db_events,
+    iter_memory_events,
+    iter_ndjson_gzip,
+    require_pyarrow,
+)
+from app.db.models.audit import AccessDecision
+from app.settings import settings
 
 router = APIRouter()
 
 
+class AuditExportFormat(str, enum.Enum):
+    CSV = "csv"
+    NDJSON_GZ = "ndjson.gz"
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+
+class AuditExportSource(str, enum.Enum):
+    DATABASE = "database"
+    # The live buffer: this worker's deque, or the ring shared by every worker when configured.
+    RECENT = "recent"
+
+
+_FORMAT_MEDIA = {
+    AuditExportFormat.CSV: ("text/csv", "audit.csv"),
+    AuditExportFormat.NDJSON_GZ: ("application/x-ndjson", "audit.ndjson.gz"),
+    AuditExportFormat.ARROW: ("application/vnd.apache.arrow.stream", "audit.arrow"),
+    AuditExportFormat.PARQUET: ("application/vnd.apache.parquet", "audit.parquet"),
+}
+
+
 @router.get("/audit/export")
-def export_audit_csv() -> Response:
-    csv_data = audit_service.export_csv()
-    return Response(content=csv_data, media_type="text/csv")
+def export_audit(
+    request: Request,
+    site_id: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    decision: AccessDecision | None = None,
+    export_format: AuditExportFormat = Query(default=AuditExportFormat.CSV, alias="format"),
+    source: AuditExportSource | None = None,
+) -> StreamingResponse:
+    if export_format in (AuditExportFormat.ARROW, AuditExportFormat.PARQUET):
+        try:
+            require_pyarrow()
+        except RuntimeError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(exc)
+            ) from exc
+    filters = AuditExportFilter(site_id=site_id, start=start, end=end, decision=decision)
+    session_factory = getattr(request.app.state, "audit_session_factory", None)
+    if source is None:
+        source = AuditExportSource.RECENT if session_factory is None else AuditExportSource.DATABASE
+    if source is AuditExportSource.RECENT:
+        events = iter_memory_events(filters)
+    elif session_factory is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Audit database unavailable"
+        )
+    else:
+        events = iter_db_events(
+            session_factory, filters, page_size=settings.audit_export_page_size
+        )
+    media_type, filename = _FORMAT_MEDIA[export_format]
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if export_format is AuditExportFormat.NDJSON_GZ:
+        # The body is a gzip file, not a transfer encoding, so clients keep the .gz as-is.
+        body = iter_ndjson_gzip(events)
+    elif export_format is AuditExportFormat.CSV:
+        body = iter_csv(events)
+    else:
+        body = iter_arrow(events, parquet=export_format is AuditExportFormat.PARQUET)
+    return StreamingResponse(body, media_type=media_type, headers=headers)
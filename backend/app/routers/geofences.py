@@ -4,22 +4,28 @@ from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
+from app.access.countries import normalize_country_code
 from app.auth.admin_deps import require_admin
 from app.db.session import get_db
 from app.admin.repositories.geofence_repository import GeofenceRepository
-from app.admin.repositories.serialization import geofence_to_dict
+from app.admin.repositories.serialization import PolygonCoordinates, geofence_to_dict
 from app.admin.repositories.site_repository import SiteRepository
+from app.middleware.access_gate import update_site_countries, update_site_geofences
 
 router = APIRouter(prefix="/api/admin/sites/{site_id}/geofences", tags=["admin-geofences"])
 
 
 class GeofenceCreate(BaseModel):
     name: str | None = None
-    polygon: list[list[float]] | None = None
+    polygon: PolygonCoordinates | None = None
     center: list[float] | None = None
     radius_meters: int | None = None
 
 
+class CountryAllowlist(BaseModel):
+    countries: list[str]
+
+
 @router.post("", status_code=status.HTTP_201_CREATED)
 def create_geofence(
     site_id: str,
@@ -29,10 +35,14 @@ def create_geofence(
     user=Depends(require_admin),
 ) -> dict:
     site_repo = SiteRepository(db)
-    if site_repo.get(site_id) is None:
+    site = site_repo.get(site_id)
+    if site is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Site not found")
     repo = GeofenceRepository(db)
     geofence = repo.create(site_id, payload)
+    db.commit()
+    if site.hostname:
+        update_site_geofences(request.app, site.hostname, repo.list_for_site(site_id))
     response = geofence_to_dict(geofence)
     response["polygon"] = payload.polygon
     response["center"] = payload.center
@@ -52,3 +62,46 @@ def list_geofences(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Site not found")
     repo = GeofenceRepository(db)
     return repo.list_for_site(site_id)
+
+
+@router.get("/countries")
+def get_country_allowlist(
+    site_id: str,
+    db: Session = Depends(get_db),
+    user=Depends(require_admin),
+) -> dict:
+    site_repo = SiteRepository(db)
+    if site_repo.get(site_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Site not found")
+    repo = GeofenceRepository(db)
+    return {"site_id": site_id, "countries": repo.list_countries(site_id)}
+
+
+@router.put("/countries")
+def put_country_allowlist(
+    site_id: str,
+    payload: CountryAllowlist,
+    request: Request,
+    db: Session = Depends(get_db),
+    user=Depends(require_admin),
+) -> dict:
+    site_repo = SiteRepository(db)
+    site = site_repo.get(site_id)
+    if site is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Site not found")
+    countries = []
+    for value in payload.countries:
+        code = normalize_country_code(value)
+        if code is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Invalid country code: {value}",
+            )
+        countries.append(code)
+    repo = GeofenceRepository(db)
+    stored = repo.replace_countries(site_id, countries)
+    # Only a committed allowlist may reach the gate; get_db's commit would run too late.
+    db.commit()
+    if site.hostname:
+        update_site_countries(request.app, site.hostname, stored)
+    return {"site_id": site_id, "countries": stored}
@@ -1,4 +1,6 @@
-from fastapi import APIRouter
+from dataclasses import asdict
+
+from fastapi import APIRouter, Request
 
 router = APIRouter()
 
@@ -6,3 +8,20 @@ router = APIRouter()
 @router.get("/health")
 def health() -> dict:
     return {"ok": True}
+
+
+@router.get("/health/geoip")
+def geoip_health(request: Request) -> dict:
+    reader = getattr(request.app.state, "geoip_reader", None)
+    info = getattr(reader, "info", None)
+    if info is None:
+        return {"loaded": False}
+    return {"loaded": True, **info.as_dict()}
+
+
+@router.get("/health/audit")
+def audit_health(request: Request) -> dict:
+    writer = getattr(request.app.state, "audit_writer", None)
+    if writer is None:
+        return {"running": False}
+    return {"running": True, **asdict(writer.stats())}
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.orm import Session
+
+from app.admin.repositories.site_repository import SiteRepository
+from app.audit import service as audit_service
+from app.audit.rollups import load_rollup_counts, summarize_rollups
+from app.auth.admin_deps import require_admin
+from app.db.session import get_db
+from app.middleware.access_gate import get_block_sketches
+
+router = APIRouter(prefix="/api/admin/sites/{site_id}/stats", tags=["admin-stats"])
+
+
+@router.get("")
+def get_site_stats(
+    site_id: str,
+    request: Request,
+    minutes: int = Query(default=60, ge=1, le=7 * 24 * 60),
+    top: int = Query(default=10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    user=Depends(require_admin),
+) -> dict:
+    _require_site(db, site_id)
+    now = datetime.now(timezone.utc).replace(tzinfo=None, second=0, microsecond=0)
+    since = now - timedelta(minutes=minutes - 1)
+    # Flushed minutes come from the rollup table, the not-yet-flushed tail from memory;
+    # raw access_audit rows are never read here.
+    counts = load_rollup_counts(db, site_id, since)
+    counts.update(audit_service.get_rollups().pending_counts(site_id, since))
+    return {
+        "site_id": site_id,
+        "since": since.replace(tzinfo=timezone.utc).isoformat(),
+        **summarize_rollups(counts, top_countries=top),
+    }
+
+
+@router.get("/blocked-clients")
+def get_blocked_clients(
+    site_id: str,
+    request: Request,
+    minutes: int = Query(default=60, ge=1, le=24 * 60),
+    top: int = Query(default=20, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    user=Depends(require_admin),
+) -> dict:
+    _require_site(db, site_id)
+    sketch = get_block_sketches(request.app).site_sketch(site_id, span_seconds=minutes * 60)
+    return {
+        "site_id": site_id,
+        "minutes": minutes,
+        "unique_clients": sketch.unique.count(),
+        "top": [
+            {"client_ip": client_ip, "count": count, "error": error}
+            for client_ip, count, error in sketch.top.top(top)
+        ],
+    }
+
+
+@router.get("/sketches")
+def export_block_sketches(
+    site_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    user=Depends(require_admin),
+) -> dict:
+    _require_site(db, site_id)
+    # Raw windowed sketches so a collector can merge what every worker has seen.
+    return get_block_sketches(request.app).to_dict(site_id)
+
+
+def _require_site(db: Session, site_id: str) -> None:
+    if SiteRepository(db).get(site_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Site not found")
@@ -0,0 +1,175 @@
+"""Per-request overhead of the access gate on allowed traffic.
+
+Compares a bare app, the previous ``BaseHTTPMiddleware`` gate and the pure ASGI
+``AccessGateMiddleware``. Requests are driven straight through the ASGI interface so
+transport cost does not drown the signal.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import os
+import time
+from collections.abc import Awaitable, Mapping
+
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-should-be-at-least-32-chars")
+
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.access.decision import decide_access
+from app.access.ip_rules import evaluate_ip_rules
+from app.db.models.audit import AccessDecision
+from app.db.models.site import SiteFilterMode
+from app.middleware.access_gate import (
+    AccessGateMiddleware,
+    SiteAccessConfig,
+    _get_site_registry,
+    _normalize_hostname,
+    _run_block_side_effects,
+    register_site_config,
+    templates,
+)
+
+HOST = "bench.local"
+CLIENT = ("10.1.2.3", 50000)
+
+
+class BaseHTTPAccessGate(BaseHTTPMiddleware):
+    # The gate as it was before the ASGI rewrite: same lookups, rules walk, GeoIP call and
+    # decision, with capture and audit awaited inline on a block.
+    def __init__(self, app, *, geoip_service: object | None = None) -> None:
+        super().__init__(app)
+        self._geoip_service = geoip_service
+
+    async def dispatch(self, request: Request, call_next):
+        host = _normalize_hostname(request.headers.get("host"))
+        if not host:
+            return await call_next(request)
+
+        config = _get_site_registry(request.app).get(host)
+        if config is None:
+            return await call_next(request)
+
+        client_ip = request.client.host if request.client else ""
+        ip_action = None
+        if config.ip_rules and client_ip:
+            try:
+                ip_action = evaluate_ip_rules(client_ip, config.ip_rules)
+            except Exception:
+                ip_action = None
+        geoip_service = self._geoip_service
+        if geoip_service is None:
+            geoip_service = getattr(request.app.state, "geoip_service", None)
+        geo_allowed = await _baseline_geo_allowed(client_ip, config.geo_allowed, geoip_service)
+        decision = decide_access(
+            filter_mode=config.filter_mode,
+            ip_action=ip_action,
+            geo_allowed=geo_allowed,
+        )
+        if decision == AccessDecision.BLOCKED:
+            await _run_block_side_effects(request.app, config, client_ip)
+            return templates.TemplateResponse(
+                request,
+                "block.html",
+                {"hostname": host},
+                status_code=403,
+            )
+
+        return await call_next(request)
+
+
+async def _baseline_geo_allowed(
+    client_ip: str,
+    geo_allowed: bool | None,
+    geoip_service: object | None,
+) -> bool | None:
+    if geo_allowed is not None:
+        return geo_allowed
+    if geoip_service is None or not client_ip:
+        return None
+    lookup = getattr(geoip_service, "lookup", None)
+    if lookup is None:
+        return None
+    try:
+        result = lookup(client_ip)
+        if isinstance(result, Awaitable) or inspect.isawaitable(result):
+            result = await result
+    except Exception:
+        return None
+    if result is None:
+        return None
+    if isinstance(result, bool):
+        return result
+    if isinstance(result, Mapping):
+        return bool(result)
+    return True
+
+
+def _build_app(middleware: type | None) -> FastAPI:
+    app = FastAPI()
+    if middleware is not None:
+        app.add_middleware(middleware)
+
+    @app.get("/health")
+    def health() -> dict:
+        return {"ok": True}
+
+    register_site_config(
+        app,
+        HOST,
+        SiteAccessConfig(
+            site_id="bench",
+            filter_mode=SiteFilterMode.IP,
+            ip_rules=[{"cidr": "10.0.0.0/8", "action": "allow"}],
+        ),
+    )
+    return app
+
+
+async def _drive(app: FastAPI, requests: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/health",
+        "raw_path": b"/health",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", HOST.encode())],
+        "client": CLIENT,
+        "server": ("testserver", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        return None
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return time.perf_counter() - start
+
+
+def main(requests: int = 20_000) -> None:
+    variants = {
+        "no middleware": _build_app(None),
+        "BaseHTTPMiddleware gate": _build_app(BaseHTTPAccessGate),
+        "pure ASGI gate": _build_app(AccessGateMiddleware),
+    }
+    results = {}
+    for name, app in variants.items():
+        asyncio.run(_drive(app, 500))
+        results[name] = asyncio.run(_drive(app, requests)) / requests * 1e6
+    baseline = results["no middleware"]
+    for name, per_request_us in results.items():
+        print(f"{name:<24} {per_request_us:8.1f} us/request  (+{per_request_us - baseline:.1f})")
+
+
+if __name__ == "__main__":
+    main()
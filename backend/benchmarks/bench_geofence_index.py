@@ -0,0 +1,33 @@
+"""Point queries against 1 to 10,000 geofences, linear scan versus the grid index."""
+
+from __future__ import annotations
+
+import random
+import time
+
+from app.access.geofence import compile_geofences
+from benchmarks.geofence_data import store_fences
+
+
+def _time_queries(compiled, points) -> float:
+    start = time.perf_counter()
+    for point in points:
+        compiled.contains(point)
+    return (time.perf_counter() - start) / len(points) * 1e6
+
+
+def main(queries: int = 2_000) -> None:
+    rng = random.Random(42)
+    points = [(rng.uniform(-10.0, 10.0), rng.uniform(40.0, 55.0)) for _ in range(queries)]
+    print(f"{'geofences':>10} {'linear us/query':>16} {'indexed us/query':>17} {'speedup':>8}")
+    for count in (1, 10, 100, 1_000, 10_000):
+        fences = store_fences(rng, count)
+        linear = compile_geofences(fences, index_threshold=None)
+        indexed = compile_geofences(fences, index_threshold=1)
+        linear_us = _time_queries(linear, points)
+        indexed_us = _time_queries(indexed, points)
+        print(f"{count:>10} {linear_us:>16.2f} {indexed_us:>17.2f} {linear_us / indexed_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import random
+
+
+def store_fences(rng: random.Random, count: int) -> list[dict]:
+    fences = []
+    for idx in range(count):
+        lon = rng.uniform(-10.0, 10.0)
+        lat = rng.uniform(40.0, 55.0)
+        if idx % 2:
+            fences.append({"center": [lon, lat], "radius_meters": rng.uniform(200, 5000)})
+        else:
+            size = rng.uniform(0.005, 0.05)
+            fences.append(
+                {
+                    "polygon": [
+                        [lon, lat],
+                        [lon + size, lat],
+                        [lon + size, lat + size],
+                        [lon, lat + size],
+                    ]
+                }
+            )
+    return fences
@@ -0,0 +1,25 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0003_geo_country_rules"
+down_revision = "0002_enable_postgis"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "geo_country_rules",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True, nullable=False),
+        sa.Column("site_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("country_code", sa.String(length=2), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.text("now()")),
+        sa.ForeignKeyConstraint(["site_id"], ["sites.id"]),
+        sa.UniqueConstraint("site_id", "country_code", name="uq_geo_country_rules_site"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("geo_country_rules")
@@ -0,0 +1,33 @@
+from alembic import op
+from geoalchemy2 import Geometry
+
+
+revision = "0004_geofence_multipolygons"
+down_revision = "0003_geo_country_rules"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.alter_column(
+        "geofences",
+        "polygon",
+        type_=Geometry("GEOMETRY", srid=4326),
+        postgresql_using="polygon::geometry(Geometry, 4326)",
+    )
+    op.create_check_constraint(
+        "ck_geofences_polygon_type",
+        "geofences",
+        "polygon IS NULL OR GeometryType(polygon) IN ('POLYGON', 'MULTIPOLYGON')",
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("ck_geofences_polygon_type", "geofences", type_="check")
+    # Multipolygons keep only their first part; holes survive since POLYGON supports them.
+    op.alter_column(
+        "geofences",
+        "polygon",
+        type_=Geometry("POLYGON", srid=4326),
+        postgresql_using="ST_GeometryN(polygon, 1)::geometry(Polygon, 4326)",
+    )
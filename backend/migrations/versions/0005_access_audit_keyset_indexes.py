@@ -0,0 +1,25 @@
+from alembic import op
+
+
+revision = "0005_access_audit_keyset_indexes"
+down_revision = "0004_geofence_multipolygons"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Audit exports page on (timestamp, id), optionally within one site.
+    op.create_index(
+        "ix_access_audit_timestamp_id", "access_audit", ["timestamp", "id"], unique=False
+    )
+    op.create_index(
+        "ix_access_audit_site_timestamp_id",
+        "access_audit",
+        ["site_id", "timestamp", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_access_audit_site_timestamp_id", table_name="access_audit")
+    op.drop_index("ix_access_audit_timestamp_id", table_name="access_audit")
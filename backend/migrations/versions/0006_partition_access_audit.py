@@ -0,0 +1,139 @@
+from datetime import date, datetime, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+from geoalchemy2 import Geometry
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0006_partition_access_audit"
+down_revision = "0005_access_audit_keyset_indexes"
+branch_labels = None
+depends_on = None
+
+_PREMAKE_DAYS = 7
+
+_COLUMNS = (
+    "id, site_id, timestamp, client_ip, ip_geo_lat, ip_geo_lng, ip_geo_country, "
+    "client_gps, decision, reason, artifact_path"
+)
+
+
+def _audit_columns() -> list[sa.Column]:
+    return [
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("site_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), nullable=False, server_default=sa.text("now()")),
+        sa.Column("client_ip", sa.String(length=50)),
+        sa.Column("ip_geo_lat", sa.Float()),
+        sa.Column("ip_geo_lng", sa.Float()),
+        sa.Column("ip_geo_country", sa.String(length=10)),
+        sa.Column("client_gps", Geometry("POINT", srid=4326, spatial_index=False)),
+        sa.Column("decision", sa.String(length=20)),
+        sa.Column("reason", sa.Text()),
+        sa.Column("artifact_path", sa.String(length=500)),
+        sa.ForeignKeyConstraint(["site_id"], ["sites.id"]),
+    ]
+
+
+def _create_indexes() -> None:
+    op.create_index("ix_access_audit_site_id", "access_audit", ["site_id"], unique=False)
+    op.create_index("ix_access_audit_timestamp", "access_audit", ["timestamp"], unique=False)
+    op.create_index(
+        "ix_access_audit_timestamp_id", "access_audit", ["timestamp", "id"], unique=False
+    )
+    op.create_index(
+        "ix_access_audit_site_timestamp_id",
+        "access_audit",
+        ["site_id", "timestamp", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_access_audit_client_gps",
+        "access_audit",
+        ["client_gps"],
+        postgresql_using="gist",
+    )
+
+
+def _drop_indexes() -> None:
+    for name in (
+        "ix_access_audit_client_gps",
+        "ix_access_audit_site_timestamp_id",
+        "ix_access_audit_timestamp_id",
+        "ix_access_audit_timestamp",
+        "ix_access_audit_site_id",
+    ):
+        op.drop_index(name, table_name="access_audit")
+
+
+def _create_day_partition(day: date) -> None:
+    upper = day + timedelta(days=1)
+    op.execute(
+        f"CREATE TABLE IF NOT EXISTS access_audit_p{day:%Y%m%d} PARTITION OF access_audit "
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{upper.isoformat()}')"
+    )
+
+
+def upgrade() -> None:
+    _drop_indexes()
+    op.rename_table("access_audit", "access_audit_legacy")
+    op.execute(
+        "ALTER TABLE access_audit_legacy RENAME CONSTRAINT access_audit_pkey "
+        "TO access_audit_legacy_pkey"
+    )
+
+    op.create_table(
+        "access_audit",
+        *_audit_columns(),
+        sa.PrimaryKeyConstraint("id", "timestamp", name="access_audit_pkey"),
+        postgresql_partition_by="RANGE (timestamp)",
+    )
+    _create_indexes()
+    # No DEFAULT partition: it would block DETACH PARTITION CONCURRENTLY during retention,
+    # so the day partitions below cover every legacy row and the maintenance job keeps
+    # creating them ahead.
+
+    bind = op.get_bind()
+    first, last = bind.execute(
+        sa.text("SELECT min(timestamp)::date, max(timestamp)::date FROM access_audit_legacy")
+    ).one()
+    today = datetime.now(timezone.utc).date()
+    day = first or today
+    end = max(last or today, today) + timedelta(days=_PREMAKE_DAYS)
+    while day <= end:
+        _create_day_partition(day)
+        day += timedelta(days=1)
+
+    op.execute(
+        f"INSERT INTO access_audit ({_COLUMNS}) SELECT {_COLUMNS} FROM access_audit_legacy"
+    )
+    op.drop_table("access_audit_legacy")
+
+
+def downgrade() -> None:
+    op.rename_table("access_audit", "access_audit_partitioned")
+    op.execute(
+        "ALTER TABLE access_audit_partitioned RENAME CONSTRAINT access_audit_pkey "
+        "TO access_audit_partitioned_pkey"
+    )
+    for name in (
+        "ix_access_audit_client_gps",
+        "ix_access_audit_site_timestamp_id",
+        "ix_access_audit_timestamp_id",
+        "ix_access_audit_timestamp",
+        "ix_access_audit_site_id",
+    ):
+        op.execute(f"ALTER INDEX {name} RENAME TO {name}_partitioned")
+
+    op.create_table(
+        "access_audit",
+        *_audit_columns(),
+        sa.PrimaryKeyConstraint("id", name="access_audit_pkey"),
+    )
+    _create_indexes()
+    op.execute(
+        f"INSERT INTO access_audit ({_COLUMNS}) SELECT {_COLUMNS} FROM access_audit_partitioned"
+    )
+    # Dropping the parent drops every partition with it.
+    op.drop_table("access_audit_partitioned")
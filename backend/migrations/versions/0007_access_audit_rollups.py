@@ -0,0 +1,26 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0007_access_audit_rollups"
+down_revision = "0006_partition_access_audit"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "access_audit_rollups",
+        sa.Column("site_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("minute", sa.DateTime(), nullable=False),
+        sa.Column("decision", sa.String(length=20), nullable=False),
+        sa.Column("country_code", sa.String(length=10), nullable=False, server_default=""),
+        sa.Column("count", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.ForeignKeyConstraint(["site_id"], ["sites.id"]),
+        sa.PrimaryKeyConstraint("site_id", "minute", "decision", "country_code"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("access_audit_rollups")
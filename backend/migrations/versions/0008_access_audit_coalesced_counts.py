@@ -0,0 +1,22 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008_access_audit_coalesced_counts"
+down_revision = "0007_access_audit_rollups"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Columns added to the partitioned parent propagate to every day partition.
+    op.add_column("access_audit", sa.Column("last_seen", sa.DateTime(), nullable=True))
+    op.add_column(
+        "access_audit",
+        sa.Column("count", sa.Integer(), nullable=False, server_default="1"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("access_audit", "count")
+    op.drop_column("access_audit", "last_seen")
@@ -0,0 +1,23 @@
+from alembic import op
+
+
+revision = "0009_ip_geo_cache_network_index"
+down_revision = "0008_access_audit_coalesced_counts"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Cache rows are MaxMind networks looked up by containment (>>=), which the unique btree
+    # index on ip_address cannot serve.
+    op.create_index(
+        "ix_ip_geo_cache_ip_address_network",
+        "ip_geo_cache",
+        ["ip_address"],
+        postgresql_using="gist",
+        postgresql_ops={"ip_address": "inet_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ip_geo_cache_ip_address_network", table_name="ip_geo_cache")
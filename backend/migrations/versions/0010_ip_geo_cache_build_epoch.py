@@ -0,0 +1,17 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010_ip_geo_cache_build_epoch"
+down_revision = "0009_ip_geo_cache_network_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing rows have no build and are treated as stale once a database is loaded.
+    op.add_column("ip_geo_cache", sa.Column("build_epoch", sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("ip_geo_cache", "build_epoch")
@@ -0,0 +1,18 @@
+class RecordingSession:
+    def __init__(self, sink: list, fail: bool = False) -> None:
+        self._sink = sink
+        self._fail = fail
+
+    def execute(self, statement) -> None:
+        if self._fail:
+            raise RuntimeError("db down")
+        self._sink.append(statement)
+
+    def commit(self) -> None:
+        return None
+
+    def rollback(self) -> None:
+        return None
+
+    def close(self) -> None:
+        return None
@@ -0,0 +1,44 @@
+import pytest
+
+from app.access.decision import decide_access, decide_ip_stage
+from app.db.models.audit import AccessDecision
+from app.db.models.ip_rule import IPRuleAction
+from app.db.models.site import SiteFilterMode
+
+
+@pytest.mark.parametrize(
+    ("filter_mode", "ip_action", "expected"),
+    [
+        (SiteFilterMode.DISABLED, None, AccessDecision.ALLOWED),
+        (SiteFilterMode.IP, IPRuleAction.ALLOW, AccessDecision.ALLOWED),
+        (SiteFilterMode.IP, IPRuleAction.DENY, AccessDecision.BLOCKED),
+        (SiteFilterMode.IP, None, AccessDecision.BLOCKED),
+        (SiteFilterMode.IP_AND_GEO, IPRuleAction.DENY, AccessDecision.BLOCKED),
+        (SiteFilterMode.IP_AND_GEO, None, AccessDecision.BLOCKED),
+        (SiteFilterMode.IP_AND_GEO, IPRuleAction.ALLOW, None),
+        (SiteFilterMode.GEO, IPRuleAction.ALLOW, None),
+    ],
+)
+def test_decide_ip_stage_only_defers_when_geo_can_change_outcome(
+    filter_mode, ip_action, expected
+):
+    assert decide_ip_stage(filter_mode=filter_mode, ip_action=ip_action) == expected
+
+
+@pytest.mark.parametrize("filter_mode", list(SiteFilterMode))
+@pytest.mark.parametrize("ip_action", [None, IPRuleAction.ALLOW, IPRuleAction.DENY, "allow"])
+@pytest.mark.parametrize("geo_allowed", [None, False, True])
+def test_decide_access_matrix(filter_mode, ip_action, geo_allowed):
+    ip_allows = ip_action in (IPRuleAction.ALLOW, "allow")
+    allowed = {
+        SiteFilterMode.DISABLED: True,
+        SiteFilterMode.IP: ip_allows,
+        SiteFilterMode.GEO: bool(geo_allowed),
+        SiteFilterMode.IP_AND_GEO: ip_allows and bool(geo_allowed),
+    }[filter_mode]
+
+    assert decide_access(
+        filter_mode=filter_mode,
+        ip_action=ip_action,
+        geo_allowed=geo_allowed,
+    ) == (AccessDecision.ALLOWED if allowed else AccessDecision.BLOCKED)
@@ -1,14 +1,27 @@
 import os
+import threading
+from types import SimpleNamespace
 
 import pytest
 
+from fastapi import FastAPI, WebSocket
 from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
 
 os.environ.setdefault("JWT_SECRET", "test-secret-should-be-at-least-32-characters")
 
 from app.db.models.site import SiteFilterMode
 from app.main import app
-from app.middleware.access_gate import SiteAccessConfig, clear_site_configs, register_site_config
+from app.middleware import access_gate
+from app.middleware.access_gate import (
+    AccessGateMiddleware,
+    SiteAccessConfig,
+    SiteConfigRegistry,
+    clear_site_configs,
+    refresh_site_configs,
+    register_site_config,
+    update_site_countries,
+)
 
 
 def _setup_site_config(hostname: str, config: SiteAccessConfig) -> None:
@@ -16,6 +29,12 @@ def _setup_site_config(hostname: str, config: SiteAccessConfig) -> None:
     register_site_config(app, hostname, config)
 
 
+def _drain_block_side_effects(target: FastAPI = app) -> None:
+    queue = getattr(target.state, "block_side_effects", None)
+    if queue is not None:
+        assert queue.join(timeout=5)
+
+
 def test_blocked_request_returns_403_and_records_artifact():
     class AuditSpy:
         def __init__(self) -> None:
@@ -61,6 +80,7 @@ def test_blocked_request_returns_403_and_records_artifact():
 
     client = TestClient(app, client=("10.1.2.3", 50000))
     resp = client.get("/", headers={"Host": "blocked.local"})
+    _drain_block_side_effects()
 
     assert resp.status_code == 403
     assert capture_spy.calls == [site_id]
@@ -224,6 +244,7 @@ def test_blocked_request_handles_capture_failure():
 
     client = TestClient(app, client=("10.9.9.9", 50000))
     resp = client.get("/", headers={"Host": "blocked-failure.local"})
+    _drain_block_side_effects()
 
     assert resp.status_code == 403
     assert audit_spy.calls == [
@@ -235,3 +256,370 @@ def test_blocked_request_handles_capture_failure():
             "artifact_path": None,
         }
     ]
+
+
+def _websocket_app() -> FastAPI:
+    ws_app = FastAPI()
+    ws_app.add_middleware(AccessGateMiddleware)
+
+    @ws_app.websocket("/ws")
+    async def echo(websocket: WebSocket) -> None:
+        await websocket.accept()
+        await websocket.send_text("hello")
+        await websocket.close()
+
+    return ws_app
+
+
+def test_websocket_blocked_is_rejected_and_logged():
+    class AuditSpy:
+        def __init__(self) -> None:
+            self.calls = []
+
+        def log_block(self, **kwargs) -> None:
+            self.calls.append(kwargs)
+
+    ws_app = _websocket_app()
+    audit_spy = AuditSpy()
+    ws_app.state.audit_service = audit_spy
+    site_id = "88888888-8888-8888-8888-888888888888"
+    register_site_config(
+        ws_app,
+        "ws-blocked.local",
+        SiteAccessConfig(site_id=site_id, filter_mode=SiteFilterMode.IP, ip_rules=[]),
+    )
+
+    client = TestClient(ws_app, client=("10.4.4.4", 50000))
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with client.websocket_connect("/ws", headers={"Host": "ws-blocked.local"}):
+            pass
+    _drain_block_side_effects(ws_app)
+
+    assert exc_info.value.code == 1008
+    assert [call["client_ip"] for call in audit_spy.calls] == ["10.4.4.4"]
+
+
+def test_websocket_allowed_passes_through():
+    ws_app = _websocket_app()
+    register_site_config(
+        ws_app,
+        "ws-allowed.local",
+        SiteAccessConfig(
+            site_id="99999999-9999-9999-9999-999999999999",
+            filter_mode=SiteFilterMode.IP,
+            ip_rules=[{"cidr": "10.4.4.0/24", "action": "allow"}],
+        ),
+    )
+
+    client = TestClient(ws_app, client=("10.4.4.5", 50000))
+    with client.websocket_connect("/ws", headers={"Host": "ws-allowed.local"}) as websocket:
+        assert websocket.receive_text() == "hello"
+
+
+def test_blocked_response_does_not_wait_for_side_effects(monkeypatch):
+    release = threading.Event()
+
+    class SlowCapture:
+        def capture(self, site_id) -> str:
+            release.wait(timeout=5)
+            return f"s3://bucket/{site_id}/artifact"
+
+    class AuditSpy:
+        def __init__(self) -> None:
+            self.calls = []
+
+        def log_block(self, **kwargs) -> None:
+            self.calls.append(kwargs)
+
+    audit_spy = AuditSpy()
+    monkeypatch.setattr(app.state, "audit_service", audit_spy, raising=False)
+    monkeypatch.setattr(app.state, "capture_service", SlowCapture(), raising=False)
+    _setup_site_config(
+        "blocked-slow.local",
+        SiteAccessConfig(
+            site_id="12121212-1212-1212-1212-121212121212",
+            filter_mode=SiteFilterMode.IP,
+            ip_rules=[],
+        ),
+    )
+
+    client = TestClient(app, client=("10.7.7.7", 50000))
+    resp = client.get("/", headers={"Host": "blocked-slow.local"})
+
+    assert resp.status_code == 403
+    assert audit_spy.calls == []
+    release.set()
+    _drain_block_side_effects()
+    assert [call["client_ip"] for call in audit_spy.calls] == ["10.7.7.7"]
+
+
+def test_geo_lookup_skipped_when_ip_stage_is_final(monkeypatch):
+    class GeoService:
+        def __init__(self) -> None:
+            self.calls = []
+
+        def lookup(self, ip: str):
+            self.calls.append(ip)
+            return {"country_code": "US"}
+
+    geo_service = GeoService()
+    monkeypatch.setattr(app.state, "geoip_service", geo_service, raising=False)
+    monkeypatch.setattr(app.state, "access_decision_counters", None, raising=False)
+    _setup_site_config(
+        "ipgeo-denied.local",
+        SiteAccessConfig(
+            site_id="13131313-1313-1313-1313-131313131313",
+            filter_mode=SiteFilterMode.IP_AND_GEO,
+            ip_rules=[{"cidr": "10.2.3.0/24", "action": "deny"}],
+        ),
+    )
+    register_site_config(
+        app,
+        "ip-only.local",
+        SiteAccessConfig(
+            site_id="14141414-1414-1414-1414-141414141414",
+            filter_mode=SiteFilterMode.IP,
+            ip_rules=[{"cidr": "10.2.3.0/24", "action": "allow"}],
+        ),
+    )
+
+    client = TestClient(app, client=("10.2.3.9", 50000))
+    assert client.get("/health", headers={"Host": "ipgeo-denied.local"}).status_code == 403
+    assert client.get("/health", headers={"Host": "ip-only.local"}).status_code == 200
+    _drain_block_side_effects()
+
+    assert geo_service.calls == []
+    assert app.state.access_decision_counters.as_dict() == {
+        "ip_stage_final": 2,
+        "geo_stage": 0,
+        "geo_lookups_avoided": 2,
+    }
+
+
+def test_geo_gate_prefers_async_lookup(monkeypatch):
+    class GeoService:
+        def __init__(self) -> None:
+            self.async_calls = []
+
+        def lookup(self, ip: str):
+            raise AssertionError("sync lookup must not run on the event loop")
+
+        async def lookup_async(self, ip: str):
+            self.async_calls.append(ip)
+            return {"country_code": "US"}
+
+    geo_service = GeoService()
+    _setup_site_config(
+        "geo-async.local",
+        SiteAccessConfig(
+            site_id="15151515-1515-1515-1515-151515151515",
+            filter_mode=SiteFilterMode.GEO,
+            ip_rules=[],
+        ),
+    )
+
+    client = TestClient(app, client=("203.0.113.12", 50000))
+    monkeypatch.setattr(app.state, "geoip_service", geo_service, raising=False)
+    resp = client.get("/health", headers={"Host": "geo-async.local"})
+
+    assert resp.status_code == 200
+    assert geo_service.async_calls == ["203.0.113.12"]
+
+
+@pytest.mark.parametrize(
+    ("location", "expected_status"),
+    [
+        ({"latitude": 0.5, "longitude": 0.5}, 200),
+        ({"latitude": 5.0, "longitude": 5.0}, 403),
+        ({"country_code": "US"}, 403),
+    ],
+)
+def test_geo_gate_enforces_site_geofences(location, expected_status, monkeypatch):
+    class GeoService:
+        def lookup(self, ip: str):
+            return location
+
+    _setup_site_config(
+        "geofenced.local",
+        SiteAccessConfig(
+            site_id="16161616-1616-1616-1616-161616161616",
+            filter_mode=SiteFilterMode.GEO,
+            geofences=[
+                {"polygon": [[-1.0, -1.0], [1.0, -1.0], [1.0, 1.0], [-1.0, 1.0]]},
+                {"center": [30.0, 30.0], "radius_meters": 1000},
+            ],
+        ),
+    )
+
+    client = TestClient(app, client=("203.0.113.13", 50000))
+    monkeypatch.setattr(app.state, "geoip_service", GeoService(), raising=False)
+    resp = client.get("/health", headers={"Host": "geofenced.local"})
+    _drain_block_side_effects()
+
+    assert resp.status_code == expected_status
+
+
+def test_geofence_memo_resets_when_site_is_reregistered(monkeypatch):
+    class GeoService:
+        def lookup(self, ip: str):
+            return {"latitude": 0.5, "longitude": 0.5}
+
+    def config(polygon):
+        return SiteAccessConfig(
+            site_id="17171717-1717-1717-1717-171717171717",
+            filter_mode=SiteFilterMode.GEO,
+            geofences=[{"polygon": polygon}],
+        )
+
+    _setup_site_config("memo.local", config([[-1.0, -1.0], [1.0, -1.0], [1.0, 1.0], [-1.0, 1.0]]))
+    client = TestClient(app, client=("203.0.113.14", 50000))
+    monkeypatch.setattr(app.state, "geoip_service", GeoService(), raising=False)
+
+    assert client.get("/health", headers={"Host": "memo.local"}).status_code == 200
+    assert client.get("/health", headers={"Host": "memo.local"}).status_code == 200
+
+    register_site_config(
+        app, "memo.local", config([[2.0, 2.0], [3.0, 2.0], [3.0, 3.0], [2.0, 3.0]])
+    )
+    resp = client.get("/health", headers={"Host": "memo.local"})
+    _drain_block_side_effects()
+
+    assert resp.status_code == 403
+
+
+@pytest.mark.parametrize(
+    ("location", "expected_status"),
+    [
+        ({"country_code": "SE", "latitude": 59.3, "longitude": 18.0}, 200),
+        ({"country_code": "us"}, 200),
+        ({"country_code": "DE", "latitude": 0.5, "longitude": 0.5}, 200),
+        ({"country_code": "DE", "latitude": 52.5, "longitude": 13.4}, 403),
+        ({"latitude": 52.5, "longitude": 13.4}, 403),
+    ],
+)
+def test_geo_gate_checks_country_allowlist_before_geofences(location, expected_status, monkeypatch):
+    class GeoService:
+        def lookup(self, ip: str):
+            return location
+
+    _setup_site_config(
+        "countries.local",
+        SiteAccessConfig(
+            site_id="18181818-1818-1818-1818-181818181818",
+            filter_mode=SiteFilterMode.GEO,
+            allowed_countries=["se", "US", "bogus"],
+            geofences=[{"polygon": [[-1.0, -1.0], [1.0, -1.0], [1.0, 1.0], [-1.0, 1.0]]}],
+        ),
+    )
+
+    client = TestClient(app, client=("203.0.113.15", 50000))
+    monkeypatch.setattr(app.state, "geoip_service", GeoService(), raising=False)
+    resp = client.get("/health", headers={"Host": "countries.local"})
+    _drain_block_side_effects()
+
+    assert resp.status_code == expected_status
+
+
+def test_update_site_countries_recompiles_registered_site(monkeypatch):
+    class GeoService:
+        def lookup(self, ip: str):
+            return {"country_code": "NO"}
+
+    _setup_site_config(
+        "countries-update.local",
+        SiteAccessConfig(
+            site_id="19191919-1919-1919-1919-191919191919",
+            filter_mode=SiteFilterMode.GEO,
+            allowed_countries=["SE"],
+        ),
+    )
+    client = TestClient(app, client=("203.0.113.16", 50000))
+    monkeypatch.setattr(app.state, "geoip_service", GeoService(), raising=False)
+
+    assert client.get("/health", headers={"Host": "countries-update.local"}).status_code == 403
+    _drain_block_side_effects()
+
+    assert update_site_countries(app, "Countries-Update.local", ["SE", "NO"]) is True
+    assert update_site_countries(app, "unknown.local", ["NO"]) is False
+    assert client.get("/health", headers={"Host": "countries-update.local"}).status_code == 200
+
+
+def test_geo_block_audit_carries_the_looked_up_country(monkeypatch):
+    class GeoService:
+        def lookup(self, ip: str):
+            return {"country_code": "de"}
+
+    class AuditSpy:
+        def __init__(self) -> None:
+            self.calls = []
+
+        def log_block(self, **kwargs) -> None:
+            self.calls.append(kwargs)
+
+    audit_spy = AuditSpy()
+    monkeypatch.setattr(app.state, "audit_service", audit_spy, raising=False)
+    monkeypatch.setattr(app.state, "geoip_service", GeoService(), raising=False)
+    _setup_site_config(
+        "country-audit.local",
+        SiteAccessConfig(
+            site_id="21212121-2121-2121-2121-212121212121",
+            filter_mode=SiteFilterMode.GEO,
+            allowed_countries=["SE"],
+        ),
+    )
+
+    client = TestClient(app, client=("203.0.113.17", 50000))
+    assert client.get("/health", headers={"Host": "country-audit.local"}).status_code == 403
+    _drain_block_side_effects()
+
+    assert [call["ip_geo_country"] for call in audit_spy.calls] == ["DE"]
+
+
+def test_refresh_site_configs_picks_up_country_rules_written_by_other_workers(monkeypatch):
+    site_id = "22222222-3333-4444-5555-666666666666"
+    countries = ["SE"]
+
+    class SitesDB:
+        def get(self, model, key):
+            if str(key) != site_id:
+                return None
+            return SimpleNamespace(id=key, filter_mode=SiteFilterMode.GEO)
+
+    class Geofences:
+        def __init__(self, db) -> None:
+            return None
+
+        def list_for_site(self, site_id: str) -> list:
+            return []
+
+        def list_countries(self, site_id: str) -> list[str]:
+            return list(countries)
+
+    class IPRules:
+        def __init__(self, db) -> None:
+            return None
+
+        def list_for_site(self, site_id: str) -> list:
+            return []
+
+    monkeypatch.setattr(access_gate, "GeofenceRepository", Geofences)
+    monkeypatch.setattr(access_gate, "IPRuleRepository", IPRules)
+    registry = SiteConfigRegistry()
+    monkeypatch.setattr(app.state, "site_access_registry", registry, raising=False)
+    register_site_config(
+        app,
+        "refresh.local",
+        SiteAccessConfig(site_id=site_id, filter_mode=SiteFilterMode.GEO, allowed_countries=["SE"]),
+    )
+    register_site_config(
+        app, "legacy.local", SiteAccessConfig(site_id="legacy", filter_mode=SiteFilterMode.IP)
+    )
+    memo = registry.get("refresh.local").geofence_memo
+
+    assert refresh_site_configs(app, SitesDB()) == 0
+    assert registry.get("refresh.local").geofence_memo is memo
+
+    countries.append("NO")
+    assert refresh_site_configs(app, SitesDB()) == 1
+    assert registry.get("refresh.local").compiled_countries == frozenset({"SE", "NO"})
+    assert registry.get("legacy.local").site_id == "legacy"
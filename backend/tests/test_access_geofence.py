@@ -1,4 +1,20 @@
-from app.access.geofence import within_geofence
+import math
+import random
+
+import pytest
+
+from app.access.geofence import (
+    BoundingBox,
+    EdgeBands,
+    GeofenceDecisionMemo,
+    _point_in_polygon,
+    compile_geofence,
+    compile_geofences,
+    within_geofence,
+    within_geofence_batch,
+    within_geofences_batch,
+)
+from benchmarks.geofence_data import store_fences
 
 
 def test_within_geofence_polygon_match():
@@ -61,3 +77,323 @@ def test_within_geofence_radius_miss():
         center=(0.0, 0.0),
         radius_meters=1200,
     )
+
+
+def test_compiled_geofences_match_scalar_checks():
+    rng = random.Random(7)
+    polygon = [(-1.0, -1.0), (1.0, -1.0), (1.5, 0.5), (0.0, 1.2), (-1.0, 1.0)]
+    fences = [
+        {"polygon": [list(point) for point in polygon]},
+        {"center": [10.0, 50.0], "radius_meters": 25_000},
+        {"center": [179.95, 0.0], "radius": 20_000},
+        {"center": [0.0, 89.9], "radius_meters": 50_000},
+    ]
+    compiled = compile_geofences(fences)
+
+    assert len(compiled) == 4
+    for _ in range(4000):
+        point = (rng.uniform(-2.0, 2.0), rng.uniform(-2.0, 2.0))
+        if rng.random() < 0.25:
+            point = (rng.uniform(9.5, 10.5), rng.uniform(49.7, 50.3))
+        elif rng.random() < 0.1:
+            point = (rng.uniform(179.5, 180.0), rng.uniform(-0.5, 0.5))
+        elif rng.random() < 0.1:
+            point = (rng.uniform(-180.0, 180.0), rng.uniform(89.0, 90.0))
+        expected = any(
+            within_geofence(
+                point=point,
+                polygon=fence.get("polygon"),
+                center=tuple(fence["center"]) if "center" in fence else None,
+                radius_meters=fence.get("radius_meters", fence.get("radius")),
+            )
+            for fence in fences
+        )
+        assert compiled.contains(point) == expected, point
+
+
+def test_compiled_circle_bbox_rejects_far_points_without_haversine(monkeypatch):
+    import app.access.geofence as geofence_module
+
+    shape = compile_geofence({"center": [0.0, 0.0], "radius_meters": 1200})
+    calls = []
+    original = geofence_module._haversine_meters
+    monkeypatch.setattr(
+        geofence_module,
+        "_haversine_meters",
+        lambda *args: calls.append(args) or original(*args),
+    )
+
+    assert not shape.contains((5.0, 5.0))
+    assert calls == []
+    assert shape.contains((0.0, 0.009))
+
+
+def test_compile_geofence_accepts_geojson_polygon_rings():
+    shape = compile_geofence(
+        {"polygon": [[[-1.0, -1.0], [1.0, -1.0], [1.0, 1.0], [-1.0, 1.0], [-1.0, -1.0]]]}
+    )
+
+    assert shape.bbox == BoundingBox(-1.0, -1.0, 1.0, 1.0)
+    assert shape.contains((1.0, 0.0))
+    assert not shape.contains((1.1, 0.0))
+
+
+def test_compile_geofences_skips_invalid_entries():
+    compiled = compile_geofences(
+        [{"polygon": [[0.0, 0.0], [1.0, 1.0]]}, {"center": ["x", 1.0], "radius": 5}, {}]
+    )
+
+    assert len(compiled) == 0
+    assert not compiled.contains((0.0, 0.0))
+
+
+def _store_fences(rng: random.Random, count: int) -> list[dict]:
+    # Plus a long sliver whose box spans many grid cells.
+    return store_fences(rng, count) + [{"polygon": [[-20.0, 30.0], [20.0, 30.0], [0.0, 31.0]]}]
+
+
+def test_indexed_geofences_match_linear_scan():
+    rng = random.Random(11)
+    fences = _store_fences(rng, 500)
+    indexed = compile_geofences(fences)
+    linear = compile_geofences(fences, index_threshold=None)
+
+    assert indexed.index is not None
+    assert linear.index is None
+    probes = [tuple(fence["center"]) for fence in fences if "center" in fence]
+    probes += [(rng.uniform(-11.0, 11.0), rng.uniform(29.0, 56.0)) for _ in range(3000)]
+    for point in probes:
+        assert indexed.contains(point) == linear.contains(point), point
+
+
+def test_grid_index_only_returns_nearby_candidates():
+    rng = random.Random(5)
+    compiled = compile_geofences(_store_fences(rng, 2000))
+
+    assert len(compiled.index.candidates((0.0, 47.5))) < 50
+
+
+def _jagged_ring(rng: random.Random, vertices: int) -> list[tuple[float, float]]:
+    ring = []
+    for idx in range(vertices):
+        angle = 2 * math.pi * idx / vertices
+        radius = 8.0 + rng.uniform(-0.05, 0.05)
+        ring.append((round(radius * math.cos(angle), 3), round(radius * math.sin(angle), 3)))
+    return ring
+
+
+def test_edge_bands_match_point_in_polygon():
+    rng = random.Random(3)
+    ring = _jagged_ring(rng, 2000)
+    bands = EdgeBands(ring)
+
+    assert bands.band_count > 100
+    probes = ring[::5]
+    probes += [
+        ((x1 + x2) / 2, (y1 + y2) / 2) for (x1, y1), (x2, y2) in zip(ring, ring[1:])
+    ][::5]
+    probes += [(rng.uniform(-9.0, 9.0), rng.uniform(-9.0, 9.0)) for _ in range(1000)]
+    probes += [(0.0, bands.min_lat), (0.0, bands.max_lat), (0.0, 10.5)]
+    for point in probes:
+        assert bands.contains(point) == _point_in_polygon(point, list(ring)), point
+
+
+def test_large_compiled_polygon_uses_edge_bands():
+    rng = random.Random(9)
+    ring = _jagged_ring(rng, 1000)
+    closed = [*ring, ring[0]]
+    shape = compile_geofence({"polygon": [list(point) for point in closed]})
+
+    assert shape.edge_bands is not None
+    for _ in range(1000):
+        point = (rng.uniform(-11.0, 11.0), rng.uniform(-11.0, 11.0))
+        assert shape.contains(point) == _point_in_polygon(point, closed)
+    assert compile_geofence({"polygon": [[0, 0], [1, 0], [1, 1]]}).edge_bands is None
+
+
+def test_batch_geofence_matches_scalar_functions():
+    np = pytest.importorskip("numpy")
+    rng = random.Random(21)
+    polygon = [(-1.0, -1.0), (1.0, -1.0), (1.5, 0.5), (0.0, 1.2), (-1.0, 1.0), (-1.0, -1.0)]
+    points = [(rng.uniform(-2.0, 2.0), rng.uniform(-2.0, 2.0)) for _ in range(5000)]
+    points += polygon + [(1.25, -0.25), (0.0, -1.0), (-1.0, 0.0)]
+    lons = np.array([lon for lon, _ in points])
+    lats = np.array([lat for _, lat in points])
+
+    batch = within_geofence_batch(
+        lons=lons, lats=lats, polygon=polygon, center=None, radius_meters=None
+    )
+    expected = [
+        within_geofence(point=point, polygon=polygon, center=None, radius_meters=None)
+        for point in points
+    ]
+    assert batch.tolist() == expected
+
+    radius = 150_000.0
+    offset = math.degrees(radius / 6_371_000)
+    ring_points = [(0.3 - offset, 0.2), (0.3 + offset, 0.2), (0.3, 0.2 + offset)]
+    lons = np.concatenate([lons, [lon for lon, _ in ring_points]])
+    lats = np.concatenate([lats, [lat for _, lat in ring_points]])
+    batch = within_geofence_batch(
+        lons=lons, lats=lats, polygon=None, center=(0.3, 0.2), radius_meters=radius
+    )
+    expected = [
+        within_geofence(
+            point=(float(lon), float(lat)),
+            polygon=None,
+            center=(0.3, 0.2),
+            radius_meters=radius,
+        )
+        for lon, lat in zip(lons, lats)
+    ]
+    assert batch.tolist() == expected
+
+
+def test_batch_geofences_match_compiled_set():
+    np = pytest.importorskip("numpy")
+    rng = random.Random(13)
+    fences = _store_fences(rng, 200)
+    fences.append({"polygon": [list(point) for point in _jagged_ring(rng, 600)]})
+    compiled = compile_geofences(fences)
+    lons = np.array([rng.uniform(-11.0, 11.0) for _ in range(4000)])
+    lats = np.array([rng.uniform(-9.0, 56.0) for _ in range(4000)])
+
+    batch = within_geofences_batch(lons, lats, fences)
+
+    assert batch.shape == (4000,)
+    assert batch.tolist() == [
+        compiled.contains((float(lon), float(lat))) for lon, lat in zip(lons, lats)
+    ]
+
+
+def test_batch_geofence_rejects_mismatched_shapes():
+    np = pytest.importorskip("numpy")
+
+    with pytest.raises(ValueError):
+        within_geofences_batch(np.zeros(3), np.zeros(2), [])
+
+
+def test_geofence_memo_reuses_decisions_per_coordinate_cell():
+    geofences = compile_geofences(
+        [{"polygon": [[-1.0, -1.0], [1.0, -1.0], [1.0, 1.0], [-1.0, 1.0]]}]
+    )
+    memo = GeofenceDecisionMemo(geofences, max_entries=8)
+
+    assert memo.contains((0.5, 0.5)) is True
+    assert memo.contains((0.5, 0.5)) is True
+    assert memo.contains((5.0, 5.0)) is False
+    assert (memo.hits, memo.misses) == (1, 2)
+    assert len(memo) == 2
+
+
+def test_geofence_memo_evaluates_off_grid_points_exactly():
+    geofences = compile_geofences(
+        [{"polygon": [[-1.0, -1.0], [1.0, -1.0], [1.0, 1.0], [-1.0, 1.0]]}]
+    )
+    memo = GeofenceDecisionMemo(geofences, max_entries=8)
+
+    # Rounds onto the fence edge, but the point itself is outside.
+    assert memo.contains((1.00004, 0.0)) is False
+    assert memo.contains((0.99996, 0.0)) is True
+    assert (memo.bypassed, len(memo)) == (2, 0)
+
+    with pytest.raises(ValueError):
+        GeofenceDecisionMemo(geofences, precision=0)
+
+
+def test_geofence_memo_is_bounded_lru():
+    geofences = compile_geofences([{"center": [0.0, 0.0], "radius_meters": 500_000}])
+    memo = GeofenceDecisionMemo(geofences, max_entries=2)
+
+    memo.contains((0.1, 0.1))
+    memo.contains((0.2, 0.2))
+    memo.contains((0.1, 0.1))
+    memo.contains((0.3, 0.3))
+
+    assert len(memo) == 2
+    memo.contains((0.1, 0.1))
+    assert memo.hits == 2
+    memo.contains((0.2, 0.2))
+    assert memo.misses == 4
+
+
+def test_geofence_memo_matches_compiled_set_at_its_precision():
+    rng = random.Random(15)
+    fences = _store_fences(rng, 40)
+    geofences = compile_geofences(fences)
+    memo = GeofenceDecisionMemo(geofences, max_entries=64)
+    for _ in range(500):
+        point = (round(rng.uniform(-180, 180), 4), round(rng.uniform(-80, 80), 4))
+        assert memo.contains(point) == geofences.contains(point)
+        raw = (rng.uniform(-180, 180), rng.uniform(-80, 80))
+        assert memo.contains(raw) == geofences.contains(raw)
+
+
+_SQUARE_WITH_HOLE = [
+    [[0.0, 0.0], [4.0, 0.0], [4.0, 4.0], [0.0, 4.0]],
+    [[1.0, 1.0], [2.0, 1.0], [2.0, 2.0], [1.0, 2.0]],
+]
+_ISLANDS = [
+    _SQUARE_WITH_HOLE,
+    [[[10.0, 10.0], [11.0, 10.0], [11.0, 11.0], [10.0, 11.0]]],
+]
+
+
+_ISLAND_CASES = [
+    ((0.5, 0.5), True),
+    ((1.5, 1.5), False),
+    ((1.0, 1.5), True),
+    ((3.5, 3.5), True),
+    ((10.5, 10.5), True),
+    ((7.0, 7.0), False),
+    ((-1.0, 0.5), False),
+]
+
+
+@pytest.mark.parametrize(("point", "expected"), _ISLAND_CASES)
+def test_multipolygon_with_holes_matches_across_evaluators(point, expected):
+    fence = {"polygon": _ISLANDS}
+    compiled = compile_geofence(fence)
+
+    assert compiled is not None and compiled.contains(point) is expected
+    assert (
+        within_geofence(point=point, polygon=_ISLANDS, center=None, radius_meters=None)
+        is expected
+    )
+    assert compile_geofences([fence], index_threshold=1).contains(point) is expected
+
+
+@pytest.mark.parametrize(("point", "expected"), _ISLAND_CASES)
+def test_multipolygon_with_holes_matches_batch_evaluators(point, expected):
+    pytest.importorskip("numpy")
+    fence = {"polygon": _ISLANDS}
+
+    assert bool(within_geofences_batch([point[0]], [point[1]], [fence])[0]) is expected
+    batch = within_geofence_batch(
+        lons=[point[0]], lats=[point[1]], polygon=_ISLANDS, center=None, radius_meters=None
+    )
+    assert bool(batch[0]) is expected
+
+
+def test_compiled_multipolygon_keeps_per_ring_boxes():
+    shape = compile_geofence({"polygon": _ISLANDS})
+
+    assert [part.bbox for part in shape.polygons] == [
+        BoundingBox(0.0, 0.0, 4.0, 4.0),
+        BoundingBox(10.0, 10.0, 11.0, 11.0),
+    ]
+    assert shape.polygons[0].holes[0].bbox == BoundingBox(1.0, 1.0, 2.0, 2.0)
+    assert shape.bbox == BoundingBox(0.0, 0.0, 11.0, 11.0)
+    assert len(compile_geofences([{"polygon": _ISLANDS}])) == 2
+
+
+def test_large_hole_uses_edge_bands():
+    rng = random.Random(17)
+    hole = _jagged_ring(rng, 1000)
+    outer = [(-50.0, -50.0), (50.0, -50.0), (50.0, 50.0), (-50.0, 50.0)]
+    shape = compile_geofence({"polygon": [outer, hole]})
+
+    assert shape.holes[0].edge_bands is not None
+    for _ in range(300):
+        point = (rng.uniform(-50, 50), rng.uniform(-50, 50))
+        assert shape.contains(point) is not _point_in_polygon(point, hole)
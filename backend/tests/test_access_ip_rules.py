@@ -1,4 +1,7 @@
-from app.access.ip_rules import evaluate_ip_rules
+import random
+from ipaddress import IPv4Address, IPv6Address, IPv4Network, IPv6Network
+
+from app.access.ip_rules import compile_ip_rules, evaluate_ip_rules
 from app.db.models.ip_rule import IPRuleAction
 
 
@@ -43,3 +46,70 @@ def test_evaluate_ip_rules_returns_none_when_no_match():
     ]
 
     assert evaluate_ip_rules("192.168.0.1", rules) is None
+
+
+def _random_rules(rng: random.Random, count: int) -> list[dict[str, object]]:
+    rules: list[dict[str, object]] = []
+    for _ in range(count):
+        action = rng.choice([IPRuleAction.ALLOW, IPRuleAction.DENY, "allow", "DENY", "bogus"])
+        if rng.random() < 0.7:
+            prefix = rng.randint(0, 32)
+            network = IPv4Network((rng.getrandbits(32), prefix), strict=False)
+        else:
+            prefix = rng.randint(0, 128)
+            network = IPv6Network((rng.getrandbits(128), prefix), strict=False)
+        rules.append({"cidr": str(network), "action": action})
+    rules.append({"cidr": "not-a-cidr", "action": IPRuleAction.ALLOW})
+    rules.append({"action": IPRuleAction.DENY})
+    return rules
+
+
+def _random_ip_near(rng: random.Random, rules: list[dict[str, object]]) -> str:
+    rule = rng.choice(rules)
+    cidr = str(rule.get("cidr", ""))
+    if "/" not in cidr or rng.random() < 0.2:
+        if rng.random() < 0.5:
+            return str(IPv4Address(rng.getrandbits(32)))
+        return str(IPv6Address(rng.getrandbits(128)))
+    base, prefix = cidr.split("/")
+    bits = 32 if ":" not in base else 128
+    host_bits = bits - int(prefix)
+    address_cls = IPv4Address if bits == 32 else IPv6Address
+    address = int(address_cls(base)) | (rng.getrandbits(host_bits) if host_bits else 0)
+    return str(address_cls(address))
+
+
+def test_compiled_ip_rules_matches_evaluate_ip_rules():
+    rng = random.Random(1234)
+    for _ in range(50):
+        rules = _random_rules(rng, rng.randint(1, 60))
+        compiled = compile_ip_rules(rules)
+        for _ in range(100):
+            client_ip = _random_ip_near(rng, rules)
+            assert compiled.lookup(client_ip) == evaluate_ip_rules(client_ip, rules), (
+                client_ip,
+                rules,
+            )
+
+
+def test_compiled_ip_rules_first_rule_wins_on_equal_prefix():
+    rules = [
+        {"cidr": "10.0.0.0/8", "action": IPRuleAction.DENY},
+        {"cidr": "10.0.0.0/8", "action": IPRuleAction.ALLOW},
+    ]
+
+    assert compile_ip_rules(rules).lookup("10.1.2.3") == evaluate_ip_rules("10.1.2.3", rules)
+    assert compile_ip_rules(rules).lookup("10.1.2.3") == IPRuleAction.DENY
+
+
+def test_compiled_ip_rules_keeps_address_families_apart():
+    rules = [
+        {"cidr": "0.0.0.0/0", "action": IPRuleAction.ALLOW},
+        {"cidr": "2001:db8::/32", "action": IPRuleAction.DENY},
+    ]
+    compiled = compile_ip_rules(rules)
+
+    assert compiled.lookup("::ffff:10.0.0.1") is None
+    assert compiled.lookup("2001:db8::1") == IPRuleAction.DENY
+    assert compiled.lookup("192.0.2.1") == IPRuleAction.ALLOW
+    assert compiled.lookup("not-an-ip") is None
@@ -0,0 +1,142 @@
+import os
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("JWT_SECRET", "test-secret-should-be-at-least-32-characters")
+
+from app.auth.security import hash_password
+from app.auth.store import add_user, clear_users
+from app.db.models.site import SiteFilterMode
+from app.db.session import get_db
+from app.main import app
+from app.middleware.access_gate import SiteAccessConfig, SiteConfigRegistry
+from app.routers import geofences as geofences_router
+
+_SITE_ID = "16161616-1616-1616-1616-161616161616"
+_HOSTNAME = "allowlist.local"
+
+
+class _CountriesDB:
+    def __init__(self, registry: SiteConfigRegistry) -> None:
+        self.countries = {_SITE_ID: ["SE"]}
+        self.geofences = []
+        self.committed_while_registry_had = []
+        self._registry = registry
+
+    def get(self, model, key):
+        if str(key) != _SITE_ID:
+            return None
+        return SimpleNamespace(id=key, hostname=_HOSTNAME)
+
+    def commit(self) -> None:
+        config = self._registry.get(_HOSTNAME)
+        self.committed_while_registry_had.append(list(config.allowed_countries))
+        self.committed_geofences = len(config.geofences)
+
+    def rollback(self) -> None:
+        return None
+
+
+class _CountriesRepository:
+    def __init__(self, db: _CountriesDB) -> None:
+        self._db = db
+
+    def list_countries(self, site_id: str) -> list[str]:
+        return list(self._db.countries.get(site_id, []))
+
+    def replace_countries(self, site_id: str, countries: list[str]) -> list[str]:
+        self._db.countries[site_id] = sorted(set(countries))
+        return self._db.countries[site_id]
+
+    def create(self, site_id: str, payload) -> SimpleNamespace:
+        geofence = {
+            "id": f"fence-{len(self._db.geofences)}",
+            "site_id": site_id,
+            "name": payload.name,
+            "polygon": payload.polygon,
+            "center": payload.center,
+            "radius": payload.radius_meters,
+        }
+        self._db.geofences.append(geofence)
+        return SimpleNamespace(**geofence)
+
+    def list_for_site(self, site_id: str) -> list[dict]:
+        return list(self._db.geofences)
+
+
+def _client(monkeypatch) -> tuple[TestClient, dict, _CountriesDB, SiteConfigRegistry]:
+    registry = SiteConfigRegistry()
+    registry.set(
+        _HOSTNAME,
+        SiteAccessConfig(
+            site_id=_SITE_ID, filter_mode=SiteFilterMode.GEO, allowed_countries=["SE"]
+        ),
+    )
+    db = _CountriesDB(registry)
+
+    def fake_db():
+        yield db
+
+    monkeypatch.setattr(app.state, "site_access_registry", registry, raising=False)
+    monkeypatch.setattr(geofences_router, "GeofenceRepository", _CountriesRepository)
+    monkeypatch.setitem(app.dependency_overrides, get_db, fake_db)
+    clear_users()
+    add_user("admin@example.com", hash_password("secret"), role="owner")
+    client = TestClient(app)
+    token = client.post(
+        "/api/auth/login", json={"email": "admin@example.com", "password": "secret"}
+    ).json()["access_token"]
+    return client, {"Authorization": f"Bearer {token}"}, db, registry
+
+
+def test_country_allowlist_put_normalizes_commits_and_refreshes_gate(monkeypatch):
+    client, headers, db, registry = _client(monkeypatch)
+    path = f"/api/admin/sites/{_SITE_ID}/geofences/countries"
+
+    resp = client.put(path, json={"countries": [" no", "SE", "se"]}, headers=headers)
+
+    assert resp.status_code == 200
+    assert resp.json() == {"site_id": _SITE_ID, "countries": ["NO", "SE"]}
+    assert db.committed_while_registry_had == [["SE"]]
+    config = registry.get(_HOSTNAME)
+    assert config.allowed_countries == ["NO", "SE"]
+    assert config.compiled_countries == frozenset({"NO", "SE"})
+    assert client.get(path, headers=headers).json() == resp.json()
+
+
+def test_country_allowlist_put_rejects_unknown_codes(monkeypatch):
+    client, headers, db, registry = _client(monkeypatch)
+    path = f"/api/admin/sites/{_SITE_ID}/geofences/countries"
+
+    resp = client.put(path, json={"countries": ["SE", "bogus"]}, headers=headers)
+
+    assert resp.status_code == 422
+    assert resp.json()["detail"] == "Invalid country code: bogus"
+    assert db.countries[_SITE_ID] == ["SE"]
+    assert db.committed_while_registry_had == []
+    assert registry.get(_HOSTNAME).allowed_countries == ["SE"]
+
+
+def test_country_allowlist_endpoints_return_404_for_unknown_sites(monkeypatch):
+    client, headers, _, _ = _client(monkeypatch)
+    path = "/api/admin/sites/17171717-1717-1717-1717-171717171717/geofences/countries"
+
+    assert client.get(path, headers=headers).status_code == 404
+    assert client.put(path, json={"countries": ["SE"]}, headers=headers).status_code == 404
+
+
+def test_geofence_create_refreshes_the_gate_after_commit(monkeypatch):
+    client, headers, db, registry = _client(monkeypatch)
+    square = [[-1.0, -1.0], [1.0, -1.0], [1.0, 1.0], [-1.0, 1.0]]
+
+    resp = client.post(
+        f"/api/admin/sites/{_SITE_ID}/geofences", json={"polygon": square}, headers=headers
+    )
+
+    assert resp.status_code == 201
+    assert db.committed_geofences == 0
+    config = registry.get(_HOSTNAME)
+    assert config.geofences == db.geofences
+    assert config.compiled_geofences.contains((0.5, 0.5)) is True
+    assert config.geofence_memo.contains((0.5, 0.5)) is True
@@ -1,11 +1,22 @@
+import gzip
+import json
 import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+from ipaddress import ip_address
+from uuid import UUID
 
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
 
 os.environ.setdefault("JWT_SECRET", "test-secret-should-be-at-least-32-characters")
 
+from app.audit import export as audit_export
 from app.audit import service as audit_service
+from app.audit.export import AuditExportFilter, iter_csv, iter_db_events
 from app.main import app
+from app.routers import audit as audit_router
 
 
 def test_log_block_records_and_exports_csv():
@@ -22,7 +33,9 @@ def test_log_block_records_and_exports_csv():
     csv_data = audit_service.export_csv()
     lines = csv_data.strip().splitlines()
 
-    assert lines[0] == "timestamp,site_id,client_ip,ip_geo_country,decision,reason,artifact_path"
+    assert lines[0] == (
+        "timestamp,site_id,client_ip,ip_geo_country,decision,reason,artifact_path,last_seen,count"
+    )
     assert len(lines) == 2
     assert "site-123" in lines[1]
     assert "203.0.113.5" in lines[1]
@@ -65,3 +78,155 @@ def test_audit_retention_is_bounded():
 
     assert len(lines) == audit_service.MAX_EVENTS + 1
     assert "site-0" not in csv_data
+
+
+def test_audit_export_endpoint_filters_events():
+    audit_service.clear()
+    audit_service.log_block(site_id="site-a", client_ip="203.0.113.5", reason="blocked")
+    audit_service.log_block(site_id="site-b", client_ip="203.0.113.6", reason="blocked")
+
+    client = TestClient(app)
+    resp = client.get("/audit/export", params={"site_id": "site-a", "decision": "blocked"})
+    lines = resp.text.strip().splitlines()
+
+    assert resp.status_code == 200
+    assert len(lines) == 2
+    assert "site-a" in lines[1]
+
+    resp = client.get("/audit/export", params={"start": "2999-01-01T00:00:00Z"})
+    assert resp.text.strip().splitlines() == [lines[0]]
+
+
+def test_db_export_pages_with_keyset_cursor():
+    Row = namedtuple(
+        "Row",
+        "id timestamp site_id client_ip ip_geo_country decision reason artifact_path "
+        "last_seen count",
+    )
+    site_id = UUID("21212121-2121-2121-2121-212121212121")
+    stored = [
+        Row(
+            UUID(int=idx),
+            datetime(2026, 1, 1) + timedelta(seconds=idx),
+            site_id,
+            f"203.0.113.{idx}",
+            "US",
+            "blocked",
+            "blocked",
+            None,
+            datetime(2026, 1, 1, 0, 5) + timedelta(seconds=idx),
+            idx + 1,
+        )
+        for idx in range(5)
+    ]
+
+    class Result:
+        def __init__(self, rows) -> None:
+            self._rows = rows
+
+        def all(self):
+            return self._rows
+
+    class Session:
+        def __init__(self) -> None:
+            self.statements = []
+            self.closed = False
+
+        def execute(self, statement):
+            self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+            page = len(self.statements) - 1
+            return Result(stored[page * 2 : page * 2 + 2])
+
+        def close(self) -> None:
+            self.closed = True
+
+    session = Session()
+    events = iter_db_events(
+        lambda: session, AuditExportFilter(site_id=str(site_id)), page_size=2
+    )
+    lines = "".join(iter_csv(events)).strip().splitlines()
+
+    assert len(lines) == 6
+    assert lines[1].startswith("2026-01-01T00:00:00+00:00,21212121-")
+    assert lines[1].endswith(",2026-01-01T00:05:00+00:00,1")
+    assert lines[5].endswith(",5")
+    assert len(session.statements) == 3
+    assert "(access_audit.timestamp, access_audit.id) >" not in session.statements[0]
+    assert "(access_audit.timestamp, access_audit.id) >" in session.statements[1]
+    assert session.closed
+
+
+def _log_export_events(count: int) -> None:
+    audit_service.clear()
+    for idx in range(count):
+        audit_service.log_block(
+            site_id="site-a",
+            client_ip="203.0.113.5" if idx % 2 else "2001:db8::1",
+            ip_geo_country="US",
+            reason="blocked",
+        )
+
+
+def test_audit_export_streams_gzip_ndjson():
+    _log_export_events(3)
+
+    client = TestClient(app)
+    resp = client.get("/audit/export", params={"format": "ndjson.gz"})
+    records = [json.loads(line) for line in gzip.decompress(resp.content).splitlines()]
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    assert [record["client_ip"] for record in records] == [
+        "2001:db8::1",
+        "203.0.113.5",
+        "2001:db8::1",
+    ]
+    assert records[0]["decision"] == "blocked"
+
+
+@pytest.mark.parametrize("export_format", ["arrow", "parquet"])
+def test_audit_export_writes_typed_columnar_formats(export_format):
+    pa = pytest.importorskip("pyarrow")
+    _log_export_events(2)
+
+    client = TestClient(app)
+    resp = client.get("/audit/export", params={"format": export_format})
+    if export_format == "arrow":
+        table = pa.ipc.open_stream(resp.content).read_all()
+    else:
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(pa.BufferReader(resp.content))
+
+    assert resp.status_code == 200
+    assert table.num_rows == 2
+    assert table.schema.field("timestamp").type == pa.timestamp("us", tz="UTC")
+    assert table.schema.field("client_ip").type == pa.binary(16)
+    assert pa.types.is_dictionary(table.schema.field("decision").type)
+    ips = table.column("client_ip").to_pylist()
+    assert ip_address(ips[0]) == ip_address("2001:db8::1")
+    assert ip_address(ips[1]).ipv4_mapped == ip_address("203.0.113.5")
+    assert table.column("decision").to_pylist() == ["blocked", "blocked"]
+
+
+def test_arrow_export_yields_one_chunk_per_batch(monkeypatch):
+    pa = pytest.importorskip("pyarrow")
+    monkeypatch.setattr(audit_export, "_ARROW_ROWS_PER_BATCH", 2)
+    _log_export_events(5)
+
+    chunks = list(audit_export.iter_arrow(audit_service.snapshot()))
+
+    assert len(chunks) == 3
+    assert pa.ipc.open_stream(b"".join(chunks)).read_all().num_rows == 5
+
+
+def test_columnar_export_returns_501_without_pyarrow(monkeypatch):
+    def missing():
+        raise RuntimeError("pyarrow is required for Arrow and Parquet audit exports")
+
+    monkeypatch.setattr(audit_router, "require_pyarrow", missing)
+
+    client = TestClient(app)
+    resp = client.get("/audit/export", params={"format": "parquet"})
+
+    assert resp.status_code == 501
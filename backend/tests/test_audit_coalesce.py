@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.audit import service as audit_service
+from app.audit.coalesce import AuditCoalescer
+from app.audit.ring import SharedAuditRing
+from app.audit.service import AuditEvent, MemoryAuditStore
+from app.db.models.audit import AccessDecision
+
+_START = datetime(2026, 5, 1, 8, 0, tzinfo=timezone.utc)
+
+
+def _event(seconds: float = 0, client_ip: str = "203.0.113.5", reason: str = "ip_denied"):
+    return AuditEvent(
+        timestamp=_START + timedelta(seconds=seconds),
+        site_id="site-1",
+        client_ip=client_ip,
+        ip_geo_country="US",
+        decision=AccessDecision.BLOCKED,
+        reason=reason,
+        artifact_path=None,
+    )
+
+
+def test_coalescer_merges_hits_for_the_same_key_into_one_record():
+    store = MemoryAuditStore()
+    closed = []
+    coalescer = AuditCoalescer(window_seconds=10, on_close=closed.append)
+
+    for seconds in (0, 1, 2.5):
+        coalescer.add(_event(seconds), store)
+    coalescer.add(_event(3, client_ip="198.51.100.9"), store)
+    coalescer.add(_event(4, reason="geo_blocked"), store)
+
+    events = store.snapshot()
+    assert len(events) == 3
+    assert events[0].count == 3
+    assert events[0].timestamp == _START
+    assert events[0].last_seen == _START + timedelta(seconds=2.5)
+    assert [event.count for event in events[1:]] == [1, 1]
+    assert closed == []
+    assert coalescer.merged == 2
+
+
+def test_coalescer_closes_windows_and_hands_records_off():
+    store = MemoryAuditStore()
+    closed = []
+    coalescer = AuditCoalescer(window_seconds=10, on_close=closed.append)
+
+    coalescer.add(_event(0), store)
+    coalescer.add(_event(5), store)
+    coalescer.add(_event(12), store)
+
+    assert [(event.count, event.last_seen) for event in closed] == [
+        (2, _START + timedelta(seconds=5))
+    ]
+    assert [event.count for event in store.snapshot()] == [2, 1]
+
+    assert coalescer.flush_expired(_START + timedelta(seconds=21)) == 0
+    assert coalescer.flush_expired(_START + timedelta(seconds=22)) == 1
+    assert len(coalescer) == 0
+    assert coalescer.closed == 2
+
+
+def test_coalescer_closes_the_oldest_window_when_full():
+    store = MemoryAuditStore()
+    closed = []
+    coalescer = AuditCoalescer(window_seconds=60, max_open=2, on_close=closed.append)
+
+    coalescer.add(_event(0, client_ip="203.0.113.0"), store)
+    coalescer.add(_event(1, client_ip="203.0.113.0"), store)
+    coalescer.add(_event(2, client_ip="203.0.113.1"), store)
+    coalescer.add(_event(3, client_ip="203.0.113.2"), store)
+
+    assert [event.client_ip for event in closed] == ["203.0.113.0"]
+    coalescer.add(_event(4, client_ip="203.0.113.2"), store)
+    coalescer.close()
+    # Single-hit windows were already stored when they opened, so only merged ones go out.
+    assert [(event.client_ip, event.count) for event in closed] == [
+        ("203.0.113.0", 2),
+        ("203.0.113.2", 2),
+    ]
+    assert coalescer.closed == 3
+
+
+def test_closed_coalescer_lets_late_hits_through_uncoalesced():
+    store = MemoryAuditStore()
+    coalescer = AuditCoalescer(window_seconds=60)
+    coalescer.close()
+
+    assert coalescer.add(_event(0), store) is None
+    assert store.snapshot() == []
+
+
+def test_coalescer_rejects_invalid_configuration():
+    with pytest.raises(ValueError):
+        AuditCoalescer(window_seconds=0)
+    with pytest.raises(ValueError):
+        AuditCoalescer(max_open=0)
+
+
+def test_memory_store_ignores_updates_for_evicted_records():
+    store = MemoryAuditStore(max_events=2)
+    first = store.append(_event(0))
+    second = store.append(_event(1))
+    store.append(_event(2))
+
+    assert store.update(first, _event(9)) is False
+    assert store.update(second, _event(5)) is True
+    assert store.snapshot()[0].timestamp == _START + timedelta(seconds=5)
+
+
+def test_shared_ring_updates_coalesced_records_in_place(tmp_path):
+    ring = SharedAuditRing(str(tmp_path / "audit.ring"), capacity=4)
+    coalescer = AuditCoalescer(window_seconds=10)
+
+    for seconds in range(4):
+        coalescer.add(_event(seconds), ring)
+    events = ring.snapshot()
+    ring.close()
+
+    assert len(events) == 1
+    assert events[0].count == 4
+    assert events[0].last_seen == _START + timedelta(seconds=3)
+
+
+def test_log_block_coalesces_and_persists_on_window_close():
+    class Writer:
+        def __init__(self) -> None:
+            self.events = []
+
+        def submit(self, event) -> bool:
+            self.events.append(event)
+            return True
+
+    writer = Writer()
+    coalescer = AuditCoalescer(window_seconds=60, on_close=audit_service.submit)
+    audit_service.clear()
+    audit_service.set_writer(writer)
+    audit_service.set_coalescer(coalescer)
+    try:
+        for _ in range(5):
+            record = audit_service.log_block(site_id="site-1", client_ip="203.0.113.5")
+        snapshot = audit_service.snapshot()
+        assert [event.count for event in writer.events] == [1]
+        coalescer.close()
+        late = audit_service.log_block(site_id="site-1", client_ip="203.0.113.5")
+    finally:
+        audit_service.set_coalescer(None)
+        audit_service.set_writer(None)
+
+    assert record.count == 5
+    assert [event.count for event in snapshot] == [5]
+    assert [event.count for event in writer.events] == [1, 5, 1]
+    assert writer.events[0].event_id == writer.events[1].event_id
+    assert writer.events[2] == late
+    assert audit_service.export_csv().strip().splitlines()[1].endswith(",5")
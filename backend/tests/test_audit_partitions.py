@@ -0,0 +1,105 @@
+from datetime import date
+
+from app.audit.partitions import (
+    create_partition_sql,
+    partition_day,
+    partition_name,
+    run_partition_maintenance,
+)
+
+
+class _Result(list):
+    def scalar(self):
+        return self[0][0]
+
+
+class _PartitionSession:
+    def __init__(
+        self,
+        partitions: list[str],
+        *,
+        pending: tuple[str, ...] = (),
+        locked: bool = True,
+    ) -> None:
+        self.partitions = list(partitions)
+        self.pending = set(pending)
+        self.locked = locked
+        self.statements: list[str] = []
+        self.execution_options = None
+        self.closed = False
+
+    def connection(self, execution_options=None):
+        self.execution_options = execution_options
+        return self
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        if sql.startswith("SELECT child.relname"):
+            names = self.pending if "inhdetachpending" in sql else self.partitions
+            return _Result((name,) for name in names)
+        self.statements.append(sql)
+        if sql.startswith("SELECT pg_try_advisory_lock"):
+            return _Result([(self.locked,)])
+        return None
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_partition_names_round_trip():
+    assert partition_name(date(2026, 3, 9)) == "access_audit_p20260309"
+    assert partition_day("access_audit_p20260309") == date(2026, 3, 9)
+    assert partition_day("access_audit_default") is None
+    assert partition_day("access_audit_p20261399") is None
+
+
+def test_create_partition_sql_covers_one_day():
+    assert create_partition_sql(date(2026, 12, 31)) == (
+        "CREATE TABLE IF NOT EXISTS access_audit_p20261231 PARTITION OF access_audit "
+        "FOR VALUES FROM ('2026-12-31') TO ('2027-01-01')"
+    )
+
+
+def test_maintenance_premakes_and_drops_expired_partitions():
+    session = _PartitionSession(
+        [
+            "access_audit_p20260101",
+            "access_audit_p20260109",
+            "access_audit_p20260110",
+            "access_audit_p20260111",
+        ],
+        pending=("access_audit_p20260101",),
+    )
+
+    result = run_partition_maintenance(
+        lambda: session, retention_days=1, premake_days=2, today=date(2026, 1, 11)
+    )
+
+    assert result.created == ["access_audit_p20260112", "access_audit_p20260113"]
+    assert result.dropped == ["access_audit_p20260101", "access_audit_p20260109"]
+    assert session.execution_options == {"isolation_level": "AUTOCOMMIT"}
+    assert session.statements[0].startswith("SELECT pg_try_advisory_lock")
+    assert session.statements[-1].startswith("SELECT pg_advisory_unlock")
+    assert (
+        "ALTER TABLE access_audit DETACH PARTITION access_audit_p20260101 FINALIZE"
+        in session.statements
+    )
+    assert (
+        "ALTER TABLE access_audit DETACH PARTITION access_audit_p20260109 CONCURRENTLY"
+        in session.statements
+    )
+    assert "DROP TABLE access_audit_p20260109" in session.statements
+    assert session.closed
+
+
+def test_maintenance_skips_when_another_worker_holds_the_lock():
+    session = _PartitionSession(["access_audit_p20260101"], locked=False)
+
+    result = run_partition_maintenance(
+        lambda: session, retention_days=1, premake_days=2, today=date(2026, 1, 11)
+    )
+
+    assert result.skipped
+    assert result.created == [] and result.dropped == []
+    assert len(session.statements) == 1
+    assert session.closed
@@ -0,0 +1,190 @@
+import multiprocessing
+import os
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("JWT_SECRET", "test-secret-should-be-at-least-32-characters")
+
+from app.audit import service as audit_service
+from app.audit.ring import SLOT_SIZE, SharedAuditRing
+from app.audit.service import AuditEvent
+from app.db.models.audit import AccessDecision
+from app.main import app
+
+
+def _event(site_id="site-1", client_ip="203.0.113.5", **overrides):
+    values = {
+        "timestamp": datetime(2026, 3, 1, 12, 30, 15, 250000, tzinfo=timezone.utc),
+        "site_id": site_id,
+        "client_ip": client_ip,
+        "ip_geo_country": "US",
+        "decision": AccessDecision.BLOCKED,
+        "reason": "ip_denied",
+        "artifact_path": "artifacts/site-1/shot.png",
+    }
+    values.update(overrides)
+    return AuditEvent(**values)
+
+
+def _append_many(path, worker, count):
+    ring = SharedAuditRing(path, capacity=1)
+    for idx in range(count):
+        ring.append(_event(site_id=f"w{worker}-{idx}"))
+    ring.close()
+
+
+def test_ring_round_trips_events(tmp_path):
+    ring = SharedAuditRing(str(tmp_path / "audit.ring"), capacity=8)
+
+    tokens = [
+        ring.append(_event()),
+        ring.append(_event(client_ip="2001:db8::1", ip_geo_country=None, artifact_path=None)),
+        ring.append(_event(client_ip="not-an-ip", reason=None)),
+    ]
+    events = ring.snapshot()
+    ring.close()
+
+    assert tokens == [0, 1, 2]
+    assert events[0] == _event()
+    assert events[1].client_ip == "2001:db8::1"
+    assert events[1].ip_geo_country is None
+    assert events[1].artifact_path is None
+    assert events[2].client_ip is None
+    assert events[2].reason is None
+
+
+def test_ring_keeps_only_the_newest_capacity_records(tmp_path):
+    ring = SharedAuditRing(str(tmp_path / "audit.ring"), capacity=4)
+
+    for idx in range(10):
+        ring.append(_event(site_id=f"site-{idx}"))
+
+    assert len(ring) == 4
+    assert [event.site_id for event in ring.snapshot()] == [
+        "site-6",
+        "site-7",
+        "site-8",
+        "site-9",
+    ]
+    ring.close()
+
+
+def test_ring_truncates_long_fields_on_character_boundaries(tmp_path):
+    ring = SharedAuditRing(str(tmp_path / "audit.ring"), capacity=2)
+
+    ring.append(_event(reason="é" * 100, artifact_path="a" * 600))
+    event = ring.snapshot()[0]
+    ring.close()
+
+    assert event.reason == "é" * 48
+    assert event.artifact_path == "a" * 288
+
+
+def test_ring_is_shared_between_handles_and_clear_hides_old_records(tmp_path):
+    path = str(tmp_path / "audit.ring")
+    first = SharedAuditRing(path, capacity=4)
+    second = SharedAuditRing(path, capacity=99)
+
+    first.append(_event(site_id="from-first"))
+    second.append(_event(site_id="from-second"))
+
+    assert second.capacity == 4
+    assert [event.site_id for event in first.snapshot()] == ["from-first", "from-second"]
+
+    second.clear()
+    first.append(_event(site_id="after-clear"))
+
+    assert [event.site_id for event in second.snapshot()] == ["after-clear"]
+    assert os.path.getsize(path) == 64 + 4 * SLOT_SIZE
+    first.close()
+    second.close()
+
+
+def test_ring_reinitializes_incompatible_files(tmp_path):
+    path = tmp_path / "audit.ring"
+    path.write_bytes(b"x" * 128)
+
+    ring = SharedAuditRing(str(path), capacity=2)
+    assert ring.snapshot() == []
+    ring.append(_event(site_id="fresh"))
+
+    assert [event.site_id for event in ring.snapshot()] == ["fresh"]
+    assert os.path.getsize(path) == 64 + 2 * SLOT_SIZE
+    ring.close()
+
+
+def test_ring_skips_slots_with_a_write_in_progress(tmp_path):
+    ring = SharedAuditRing(str(tmp_path / "audit.ring"), capacity=4)
+    ring.append(_event(site_id="done"))
+    ring.append(_event(site_id="torn"))
+
+    # Simulate a worker that died between marking the slot busy and finishing the write.
+    offset = 64 + SLOT_SIZE
+    ring._map[offset] |= 1
+
+    assert [event.site_id for event in ring.snapshot()] == ["done"]
+    ring.close()
+
+
+def test_ring_accepts_appends_from_several_processes(tmp_path):
+    path = str(tmp_path / "audit.ring")
+    ring = SharedAuditRing(path, capacity=1000)
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=_append_many, args=(path, worker, 50)) for worker in range(4)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(10)
+
+    site_ids = {event.site_id for event in ring.snapshot()}
+    count = len(ring)
+    ring.close()
+
+    assert count == 200
+    assert site_ids == {f"w{worker}-{idx}" for worker in range(4) for idx in range(50)}
+
+
+def test_service_routes_events_through_the_configured_store(tmp_path):
+    ring = SharedAuditRing(str(tmp_path / "audit.ring"), capacity=8)
+    previous = audit_service.get_store()
+    audit_service.set_store(ring)
+    try:
+        audit_service.clear()
+        audit_service.log_block(site_id="site-ring", client_ip="198.51.100.7", reason="geo")
+        csv_data = audit_service.export_csv()
+    finally:
+        audit_service.set_store(previous)
+
+    assert "site-ring" in csv_data
+    assert "198.51.100.7" in csv_data
+    assert [event.site_id for event in ring.snapshot()] == ["site-ring"]
+    ring.close()
+
+
+def test_export_reads_the_shared_ring_when_asked_for_recent_events(tmp_path, monkeypatch):
+    def session_factory():
+        raise AssertionError("recent exports must not touch the database")
+
+    writer_ring = SharedAuditRing(str(tmp_path / "audit.ring"), capacity=8)
+    reader_ring = SharedAuditRing(str(tmp_path / "audit.ring"), capacity=8)
+    writer_ring.append(_event(site_id="other-worker"))
+    monkeypatch.setattr(app.state, "audit_session_factory", session_factory, raising=False)
+    monkeypatch.setattr(audit_service, "_STORE", reader_ring)
+
+    resp = TestClient(app).get("/audit/export", params={"source": "recent"})
+    writer_ring.close()
+    reader_ring.close()
+
+    assert resp.status_code == 200
+    assert "other-worker" in resp.text
+
+
+def test_database_export_without_a_session_factory_is_unavailable(monkeypatch):
+    monkeypatch.setattr(app.state, "audit_session_factory", None, raising=False)
+
+    resp = TestClient(app).get("/audit/export", params={"source": "database"})
+
+    assert resp.status_code == 503
@@ -0,0 +1,148 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+
+os.environ.setdefault("JWT_SECRET", "test-secret-should-be-at-least-32-characters")
+
+from app.audit import service as audit_service
+from app.audit.rollups import AuditRollups, summarize_rollups
+from app.audit.service import AuditEvent
+from app.auth.security import hash_password
+from app.auth.store import add_user, clear_users
+from app.db.models.audit import AccessDecision
+from app.db.session import get_db
+from app.main import app
+from conftest import RecordingSession
+
+_SITE_ID = "22222222-2222-2222-2222-222222222222"
+
+
+def _event(second: int, country: str | None = "US", site_id: str = _SITE_ID) -> AuditEvent:
+    return AuditEvent(
+        timestamp=datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc) + timedelta(seconds=second),
+        site_id=site_id,
+        client_ip="203.0.113.5",
+        ip_geo_country=country,
+        decision=AccessDecision.BLOCKED,
+        reason="blocked",
+        artifact_path=None,
+    )
+
+
+def test_rollups_aggregate_by_minute_decision_and_country():
+    rollups = AuditRollups()
+    for second, country in [(1, "US"), (30, "us"), (59, "SE"), (61, "US"), (62, None)]:
+        rollups.record(_event(second, country))
+    rollups.record(_event(5, site_id="other-site"))
+
+    counts = rollups.pending_counts(_SITE_ID, datetime(2026, 1, 1))
+    summary = summarize_rollups(counts)
+
+    assert summary["totals"] == {"blocked": 5}
+    assert summary["per_minute"] == [
+        {"minute": "2026-01-01T12:00:00+00:00", "blocked": 3},
+        {"minute": "2026-01-01T12:01:00+00:00", "blocked": 2},
+    ]
+    assert summary["top_countries"] == [
+        {"country": "US", "count": 3},
+        {"country": "SE", "count": 1},
+    ]
+
+
+def test_rollup_flush_upserts_additive_counts():
+    executed = []
+    rollups = AuditRollups(lambda: RecordingSession(executed))
+    rollups.record(_event(1))
+    rollups.record(_event(2))
+    rollups.record(_event(3, site_id="not-a-uuid"))
+
+    assert rollups.flush() == 1
+
+    sql = str(executed[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (site_id, minute, decision, country_code) DO UPDATE" in sql
+    assert "count = (access_audit_rollups.count + excluded.count)" in sql
+    assert "WHERE EXISTS (SELECT *" in sql
+    assert "WHERE sites.id = incoming.site_id)" in sql
+    params = executed[0].compile(dialect=postgresql.dialect()).params
+    assert list(params.values())[-1] == 2
+    assert rollups.skipped == 1
+    assert rollups.pending_counts(_SITE_ID, datetime(2026, 1, 1)) == {}
+
+
+def test_failed_rollup_flush_folds_counts_back():
+    rollups = AuditRollups(lambda: RecordingSession([], fail=True))
+    rollups.record(_event(1))
+    assert rollups.flush() == 0
+    rollups.record(_event(2))
+
+    counts = rollups.pending_counts(_SITE_ID, datetime(2026, 1, 1))
+    assert sum(counts.values()) == 2
+    assert rollups.failed_flushes == 1
+
+
+def test_rollup_counts_stay_visible_while_a_flush_is_in_flight():
+    seen = []
+
+    class Session(RecordingSession):
+        def execute(self, statement) -> None:
+            seen.append(sum(rollups.pending_counts(_SITE_ID, datetime(2026, 1, 1)).values()))
+
+    rollups = AuditRollups(lambda: Session([]))
+    rollups.record(_event(1))
+    rollups.record(_event(2))
+
+    assert rollups.flush() == 1
+    assert seen == [2]
+    assert rollups.pending_counts(_SITE_ID, datetime(2026, 1, 1)) == {}
+
+
+def test_rollups_evict_oldest_minute_when_full():
+    rollups = AuditRollups(max_keys=2)
+    rollups.record(_event(1))
+    rollups.record(_event(61))
+    rollups.record(_event(121))
+
+    counts = rollups.pending_counts(_SITE_ID, datetime(2026, 1, 1))
+    assert sorted(key[1].minute for key in counts) == [1, 2]
+    assert rollups.skipped == 1
+
+
+def test_site_stats_endpoint_merges_table_and_pending_rollups():
+    now = datetime.now(timezone.utc).replace(tzinfo=None, second=0, microsecond=0)
+
+    class StatsDB:
+        def get(self, model, key):
+            return object()
+
+        def execute(self, statement):
+            return [(now - timedelta(minutes=1), "blocked", "SE", 4)]
+
+    def fake_db():
+        yield StatsDB()
+
+    clear_users()
+    add_user("admin@example.com", hash_password("secret"), role="owner")
+    client = TestClient(app)
+    token = client.post(
+        "/api/auth/login", json={"email": "admin@example.com", "password": "secret"}
+    ).json()["access_token"]
+    audit_service.clear()
+    audit_service.log_block(site_id=_SITE_ID, client_ip="203.0.113.5", ip_geo_country="US")
+    app.dependency_overrides[get_db] = fake_db
+    try:
+        resp = client.get(
+            f"/api/admin/sites/{_SITE_ID}/stats",
+            params={"minutes": 5},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        audit_service.clear()
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["totals"] == {"blocked": 5}
+    assert body["top_countries"][0] == {"country": "SE", "count": 4}
+    assert len(body["per_minute"]) in (1, 2)
@@ -0,0 +1,179 @@
+import os
+import random
+
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("JWT_SECRET", "test-secret-should-be-at-least-32-characters")
+
+from app.audit.sketches import BlockSketches, HyperLogLog, SpaceSaving
+from app.auth.security import hash_password
+from app.auth.store import add_user, clear_users
+from app.db.models.site import SiteFilterMode
+from app.db.session import get_db
+from app.main import app
+from app.middleware.access_gate import SiteAccessConfig, clear_site_configs, register_site_config
+
+
+def _stream(rng: random.Random) -> list[str]:
+    heavy = [f"198.51.100.{idx}" for idx in range(5)]
+    items = [ip for ip in heavy for _ in range(200)]
+    for _ in range(3000):
+        items.append(f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}")
+    rng.shuffle(items)
+    return items
+
+
+def test_space_saving_finds_heavy_hitters_within_error_bound():
+    rng = random.Random(23)
+    items = _stream(rng)
+    sketch = SpaceSaving(64)
+    for item in items:
+        sketch.add(item)
+
+    top = sketch.top(5)
+    assert {item for item, _, _ in top} == {f"198.51.100.{idx}" for idx in range(5)}
+    for _, count, error in top:
+        assert count - error <= 200 <= count
+
+
+def test_space_saving_evicts_the_smallest_counter_under_unique_storms():
+    rng = random.Random(7)
+    sketch = SpaceSaving(16)
+    for idx in range(5000):
+        sketch.add("heavy" if idx % 4 == 0 else f"10.0.{rng.randrange(256)}.{idx % 256}")
+        if idx % 500 == 0:
+            counts = [count for _, count, _ in sketch.top(16)]
+            assert sketch._floor() == (min(counts) if len(counts) == 16 else 0)
+
+    assert sketch.top(1)[0][0] == "heavy"
+    assert len(sketch) == 16
+    assert len(sketch._count_heap) <= 2 * len(sketch._buckets) + 64
+
+
+def test_space_saving_merge_and_round_trip():
+    left = SpaceSaving(8)
+    right = SpaceSaving(8)
+    for _ in range(30):
+        left.add("203.0.113.1")
+        right.add("203.0.113.1")
+    right.add("203.0.113.2", 5)
+
+    merged = SpaceSaving.from_dict(left.merge(right).to_dict())
+
+    assert merged.top(2) == [("203.0.113.1", 60, 0), ("203.0.113.2", 5, 0)]
+
+
+def test_hyperloglog_estimates_and_merges_cardinality():
+    left = HyperLogLog(12)
+    right = HyperLogLog(12)
+    for idx in range(20_000):
+        (left if idx % 2 else right).add(f"client-{idx}")
+        left.add(f"client-{idx % 100}")
+
+    merged = HyperLogLog.from_dict(left.merge(right).to_dict())
+
+    assert abs(merged.count() - 20_000) / 20_000 < 0.05
+    small = HyperLogLog(12)
+    for idx in range(50):
+        small.add(f"client-{idx}")
+    assert abs(small.count() - 50) <= 2
+
+
+def test_block_sketches_are_windowed_and_mergeable():
+    sketches = BlockSketches(window_seconds=60, windows=3)
+    sketches.record("site-a", "203.0.113.1", now=0)
+    sketches.record("site-a", "203.0.113.2", now=70)
+    sketches.record("site-a", "203.0.113.2", now=130)
+    sketches.record("site-b", "203.0.113.9", now=130)
+
+    recent = sketches.site_sketch("site-a", span_seconds=120, now=130)
+    assert recent.top.top(5) == [("203.0.113.2", 2, 0)]
+    assert sketches.site_sketch("site-a", now=130).unique.count() == 2
+
+    sketches.record("site-a", "203.0.113.3", now=190)
+    window = sketches.site_sketch("site-a", now=190).top.top(5)
+    assert "203.0.113.1" not in [item for item, _, _ in window]
+
+    other = BlockSketches(window_seconds=60, windows=3)
+    other.record("site-a", "203.0.113.2", now=190)
+    sketches.merge_dict(other.to_dict())
+    assert sketches.site_sketch("site-a", now=190).top.top(1) == [("203.0.113.2", 3, 0)]
+
+
+def test_block_sketches_export_one_site_from_a_stable_snapshot():
+    sketches = BlockSketches(window_seconds=60, windows=3)
+    sketches.record("site-a", "203.0.113.1", now=70)
+    sketches.record("site-a", "203.0.113.2", now=130)
+    sketches.record("site-b", "203.0.113.9", now=130)
+
+    exported = sketches.to_dict("site-a", now=130)
+    live = sketches.site_sketch("site-a", now=130)
+    sketches.record("site-a", "203.0.113.3", now=130)
+
+    assert [list(sites) for sites in exported["buckets"].values()] == [["site-a"], ["site-a"]]
+    assert live.unique.count() == 2
+    merged = BlockSketches(window_seconds=60, windows=3)
+    merged.merge_dict(exported)
+    assert merged.site_sketch("site-a", now=130).unique.count() == 2
+
+
+class _SitesDB:
+    def __init__(self, *site_ids: str) -> None:
+        self._site_ids = {site_id.lower() for site_id in site_ids}
+
+    def get(self, model, key):
+        return object() if str(key) in self._site_ids else None
+
+
+class _DroppingQueue:
+    def __init__(self) -> None:
+        self.dropped = 0
+
+    def submit(self, job) -> bool:
+        self.dropped += 1
+        return False
+
+
+def test_blocked_clients_endpoint_reports_gate_blocks(monkeypatch):
+    site_id = "23232323-2323-2323-2323-232323232323"
+    monkeypatch.setattr(app.state, "block_sketches", BlockSketches(), raising=False)
+    # Side effects are shed under load; the sketch must still see every block.
+    queue = _DroppingQueue()
+    monkeypatch.setattr(app.state, "block_side_effects", queue, raising=False)
+    clear_site_configs(app)
+    register_site_config(
+        app,
+        "sketch.local",
+        SiteAccessConfig(site_id=site_id, filter_mode=SiteFilterMode.IP, ip_rules=[]),
+    )
+    for client_ip in ["10.9.9.1", "10.9.9.1", "10.9.9.2"]:
+        client = TestClient(app, client=(client_ip, 50000))
+        assert client.get("/", headers={"Host": "sketch.local"}).status_code == 403
+    assert queue.dropped == 3
+
+    def fake_db():
+        yield _SitesDB(site_id)
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, fake_db)
+    clear_users()
+    add_user("admin@example.com", hash_password("secret"), role="owner")
+    client = TestClient(app)
+    token = client.post(
+        "/api/auth/login", json={"email": "admin@example.com", "password": "secret"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    resp = client.get(f"/api/admin/sites/{site_id}/stats/blocked-clients", headers=headers)
+
+    assert resp.status_code == 200
+    assert resp.json()["unique_clients"] == 2
+    assert resp.json()["top"][0] == {"client_ip": "10.9.9.1", "count": 2, "error": 0}
+
+    exported = client.get(f"/api/admin/sites/{site_id}/stats/sketches", headers=headers).json()
+    merged = BlockSketches()
+    merged.merge_dict(exported)
+    assert merged.site_sketch(site_id).unique.count() == 2
+
+    missing = "24242424-2424-2424-2424-242424242424"
+    for path in ("blocked-clients", "sketches"):
+        resp = client.get(f"/api/admin/sites/{missing}/stats/{path}", headers=headers)
+        assert resp.status_code == 404
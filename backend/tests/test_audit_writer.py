@@ -0,0 +1,261 @@
+import json
+import os
+import threading
+from dataclasses import replace
+from datetime import datetime, timezone
+from uuid import UUID
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+os.environ.setdefault("JWT_SECRET", "test-secret-should-be-at-least-32-characters")
+
+from app.audit import service as audit_service
+from app.audit.service import AuditEvent
+from app.audit.writer import AuditWriter, audit_row, build_audit_insert
+from app.db.models.audit import AccessDecision
+from conftest import RecordingSession
+
+_SITE_ID = "20202020-2020-2020-2020-202020202020"
+
+
+def _event(site_id: str = _SITE_ID, client_ip: str = "203.0.113.5") -> AuditEvent:
+    return AuditEvent(
+        timestamp=datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        site_id=site_id,
+        client_ip=client_ip,
+        ip_geo_country="US",
+        decision=AccessDecision.BLOCKED,
+        reason="blocked",
+        artifact_path=None,
+    )
+
+
+def _rows(statement) -> dict:
+    return statement.compile(dialect=postgresql.dialect()).params
+
+
+class _PoisonSession(RecordingSession):
+    def __init__(self, sink: list, poison: str) -> None:
+        super().__init__(sink)
+        self._poison = poison
+
+    def execute(self, statement) -> None:
+        if self._poison in _rows(statement).values():
+            raise IntegrityError("INSERT", {}, Exception("violates foreign key constraint"))
+        super().execute(statement)
+
+
+def test_audit_row_coerces_site_and_timestamp():
+    row = audit_row(_event())
+
+    assert row["site_id"] == UUID(_SITE_ID)
+    assert row["timestamp"] == datetime(2026, 1, 2, 3, 4, 5)
+    assert row["decision"] == "blocked"
+    assert row["last_seen"] is None
+    assert row["count"] == 1
+    assert audit_row(_event(site_id="site-123")) is None
+
+
+def test_audit_insert_upserts_coalesced_counts_onto_the_first_hit():
+    first = _event()
+    closed = replace(first, last_seen=datetime(2026, 1, 2, 3, 4, 9, tzinfo=timezone.utc), count=4)
+
+    statement = build_audit_insert([audit_row(first), audit_row(closed)])
+    compiled = statement.compile(dialect=postgresql.dialect())
+
+    assert "ON CONFLICT (id, timestamp) DO UPDATE" in str(compiled)
+    assert compiled.params["count_m0"] == 4
+    assert "count_m1" not in compiled.params
+    assert compiled.params["id_m0"] == first.event_id
+
+
+def test_audit_writer_flushes_in_batches():
+    executed = []
+    writer = AuditWriter(lambda: RecordingSession(executed), batch_size=2)
+
+    for idx in range(5):
+        assert writer.submit(_event(client_ip=f"203.0.113.{idx}"))
+    assert writer.submit(_event(site_id="not-a-uuid")) is False
+
+    assert writer.flush() == 5
+    assert len(executed) == 3
+    assert _rows(executed[0])["client_ip_m0"] == "203.0.113.0"
+    stats = writer.stats()
+    assert stats.queue_depth == 0
+    assert stats.flushed_rows == 5
+    assert stats.invalid == 1
+    assert stats.flushes == 3
+
+
+def test_audit_writer_drops_when_full_without_spill():
+    writer = AuditWriter(lambda: RecordingSession([]), batch_size=2, max_pending=2)
+
+    assert writer.submit(_event())
+    assert writer.submit(_event())
+    assert writer.submit(_event()) is False
+
+    stats = writer.stats()
+    assert stats.queue_depth == 2
+    assert stats.dropped == 1
+
+
+def test_audit_writer_spills_and_replays_after_recovery(tmp_path):
+    spill_path = tmp_path / "audit.ndjson"
+    executed = []
+    healthy = {"value": False}
+    writer = AuditWriter(
+        lambda: RecordingSession(executed, fail=not healthy["value"]),
+        batch_size=2,
+        max_pending=2,
+        spill_path=str(spill_path),
+    )
+
+    for idx in range(4):
+        assert writer.submit(_event(client_ip=f"203.0.113.{idx}"))
+    assert writer.flush() == 0
+    assert writer.stats().queue_depth == 2
+    spilled = [json.loads(line) for line in spill_path.read_text().splitlines()]
+    assert [row["client_ip"] for row in spilled] == ["203.0.113.2", "203.0.113.3"]
+
+    healthy["value"] = True
+    assert writer.flush() == 4
+
+    assert not spill_path.exists()
+    stats = writer.stats()
+    assert stats.spilled == 2
+    assert stats.replayed == 2
+    assert stats.failed_flushes == 1
+    assert stats.flushed_rows == 4
+
+
+def test_audit_writer_dead_letters_rows_that_can_never_insert(tmp_path):
+    dead_letter_path = tmp_path / "audit.dead.ndjson"
+    executed = []
+    writer = AuditWriter(
+        lambda: _PoisonSession(executed, poison="203.0.113.2"),
+        batch_size=4,
+        dead_letter_path=str(dead_letter_path),
+        max_batch_attempts=2,
+    )
+
+    for idx in range(6):
+        writer.submit(_event(client_ip=f"203.0.113.{idx}"))
+    assert writer.flush() == 0
+    assert writer.stats().queue_depth == 6
+
+    assert writer.flush() == 5
+    stats = writer.stats()
+    assert stats.queue_depth == 0
+    assert stats.dead_lettered == 1
+    assert stats.flushed_rows == 5
+    dead = [json.loads(line) for line in dead_letter_path.read_text().splitlines()]
+    assert [row["client_ip"] for row in dead] == ["203.0.113.2"]
+
+
+def test_audit_writer_keeps_retrying_while_the_database_is_down():
+    writer = AuditWriter(
+        lambda: RecordingSession([], fail=True), batch_size=4, max_batch_attempts=1
+    )
+
+    for idx in range(4):
+        writer.submit(_event(client_ip=f"203.0.113.{idx}"))
+    writer.flush()
+    writer.flush()
+
+    stats = writer.stats()
+    assert stats.queue_depth == 4
+    assert stats.dead_lettered == 0
+
+
+def test_audit_writer_replays_a_leftover_replay_file_in_batches(tmp_path):
+    spill_path = tmp_path / "audit.ndjson"
+    executed = []
+    writer = AuditWriter(
+        lambda: RecordingSession(executed), batch_size=2, spill_path=str(spill_path)
+    )
+    rows = [audit_row(_event(client_ip=f"198.51.100.{idx}")) for idx in range(5)]
+    lines = [json.dumps(row, default=str) for row in rows]
+    # A crash between taking the spill file and finishing the replay leaves this behind.
+    (tmp_path / "audit.ndjson.replay").write_text("\n".join(lines[:3]) + "\n")
+    spill_path.write_text("\n".join(lines[3:]) + "\n")
+
+    assert writer.flush() == 5
+
+    assert not (tmp_path / "audit.ndjson.replay").exists()
+    assert not spill_path.exists()
+    batch_sizes = [
+        sum(key.startswith("client_ip_m") for key in _rows(statement)) for statement in executed
+    ]
+    assert batch_sizes == [2, 1, 2]
+    assert writer.stats().replayed == 5
+
+
+def test_audit_writer_dead_letters_torn_spill_lines(tmp_path):
+    spill_path = tmp_path / "audit.ndjson"
+    dead_letter_path = tmp_path / "audit.dead.ndjson"
+    executed = []
+    writer = AuditWriter(
+        lambda: RecordingSession(executed),
+        batch_size=2,
+        max_pending=2,
+        spill_path=str(spill_path),
+        dead_letter_path=str(dead_letter_path),
+    )
+    row = json.dumps(audit_row(_event(client_ip="198.51.100.1")), default=str)
+    # A crash in the middle of an append leaves a torn last line behind.
+    (tmp_path / "audit.ndjson.replay").write_text(row + '\n{"id": "7b0c\n' + row + "\n")
+    spill_path.write_text('{"id": "7b0c')
+    for idx in range(3):
+        writer.submit(_event(client_ip=f"203.0.113.{idx}"))
+
+    assert writer.flush() == 5
+
+    assert not (tmp_path / "audit.ndjson.replay").exists()
+    assert not spill_path.exists()
+    assert dead_letter_path.read_text().splitlines() == ['{"id": "7b0c', '{"id": "7b0c']
+    stats = writer.stats()
+    assert stats.dead_lettered == 2
+    assert stats.replayed == 3
+
+
+def test_audit_writer_thread_survives_a_failing_flush():
+    writer = AuditWriter(lambda: RecordingSession([]), flush_interval_seconds=0.01)
+    calls = []
+    flushed = threading.Event()
+
+    def flush() -> int:
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("unexpected")
+        flushed.set()
+        return 0
+
+    writer.flush = flush
+    writer.start()
+    try:
+        assert flushed.wait(5)
+    finally:
+        writer._stopping.set()
+        writer._wakeup.set()
+        writer._thread.join(5)
+
+
+def test_log_block_enqueues_on_installed_writer():
+    class Writer:
+        def __init__(self) -> None:
+            self.events = []
+
+        def submit(self, event) -> bool:
+            self.events.append(event)
+            return True
+
+    writer = Writer()
+    audit_service.clear()
+    audit_service.set_writer(writer)
+    try:
+        event = audit_service.log_block(site_id=_SITE_ID, client_ip="203.0.113.5")
+    finally:
+        audit_service.set_writer(None)
+
+    assert writer.events == [event]
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.middleware.side_effects import BlockSideEffectQueue
+
+
+def test_side_effect_queue_runs_sync_and_async_jobs():
+    queue = BlockSideEffectQueue(maxsize=10, workers=2)
+    results = []
+
+    async def async_job() -> None:
+        await asyncio.sleep(0)
+        results.append("async")
+
+    assert queue.submit(lambda: results.append("sync"))
+    assert queue.submit(async_job)
+    assert queue.join(timeout=5)
+
+    assert sorted(results) == ["async", "sync"]
+    assert queue.stats() == {
+        "submitted": 2,
+        "completed": 2,
+        "failed": 0,
+        "dropped": 0,
+        "depth": 0,
+    }
+    queue.close(timeout=5)
+
+
+def test_side_effect_queue_drops_when_full():
+    queue = BlockSideEffectQueue(maxsize=2, workers=1)
+    release = threading.Event()
+
+    assert queue.submit(lambda: release.wait(timeout=5))
+    assert queue.submit(lambda: None)
+    assert not queue.submit(lambda: None)
+
+    stats = queue.stats()
+    assert stats["dropped"] == 1
+    assert stats["depth"] == 2
+
+    release.set()
+    assert queue.join(timeout=5)
+    assert queue.submit(lambda: None)
+    queue.close(timeout=5)
+
+
+def test_side_effect_queue_counts_failures():
+    queue = BlockSideEffectQueue(maxsize=4, workers=1)
+
+    def failing_job() -> None:
+        raise RuntimeError("upload failed")
+
+    assert queue.submit(failing_job)
+    assert queue.join(timeout=5)
+
+    assert queue.stats()["failed"] == 1
+    queue.close(timeout=5)
+
+
+def test_side_effect_queue_rejects_after_close():
+    queue = BlockSideEffectQueue(maxsize=4, workers=1)
+    queue.close()
+
+    assert not queue.submit(lambda: None)
+    assert queue.stats()["dropped"] == 1
+
+
+def test_side_effect_queue_validates_bounds():
+    with pytest.raises(ValueError):
+        BlockSideEffectQueue(maxsize=0, workers=1)
+    with pytest.raises(ValueError):
+        BlockSideEffectQueue(maxsize=1, workers=0)
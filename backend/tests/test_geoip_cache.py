@@ -1,10 +1,17 @@
+import asyncio
 import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import ip_network
 
 import pytest
 from pydantic import ValidationError
+from sqlalchemy.dialects import postgresql
 
 from app.geoip.cache import GeoIPCache
 from app.geoip.service import GeoIPService
+from app.geoip.singleflight import AsyncSingleFlight, SingleFlight
 
 
 def test_geoip_cache_hit():
@@ -18,7 +25,7 @@ def test_geoip_cache_expired_entry_returns_none(monkeypatch):
     import app.geoip.cache as cache_module
 
     now = 1000.0
-    monkeypatch.setattr(cache_module.time, "time", lambda: now)
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now)
     cache = GeoIPCache(ttl_seconds=60)
     cache.set("1.2.3.4", {"country_code": "US"})
 
@@ -26,6 +33,74 @@ def test_geoip_cache_expired_entry_returns_none(monkeypatch):
     assert cache.get("1.2.3.4") is None
 
 
+def test_geoip_cache_ignores_wall_clock_jumps(monkeypatch):
+    import app.geoip.cache as cache_module
+
+    cache = GeoIPCache(ttl_seconds=60)
+    cache.set("1.2.3.4", {"country_code": "US"})
+    monkeypatch.setattr(cache_module.time, "time", lambda: 10**12)
+
+    assert cache.get("1.2.3.4") == {"country_code": "US"}
+
+
+def test_geoip_cache_evicts_least_recently_used():
+    cache = GeoIPCache(ttl_seconds=60, max_entries=2)
+    cache.set("1.1.1.1", {"country_code": "AU"})
+    cache.set("2.2.2.2", {"country_code": "US"})
+    assert cache.get("1.1.1.1") == {"country_code": "AU"}
+
+    cache.set("3.3.3.3", {"country_code": "NL"})
+
+    assert cache.get("2.2.2.2") is None
+    assert cache.get("1.1.1.1") == {"country_code": "AU"}
+    assert cache.get("3.3.3.3") == {"country_code": "NL"}
+    stats = cache.stats()
+    assert stats.size == 2
+    assert stats.evictions == 1
+    assert stats.hits == 3
+    assert stats.misses == 1
+
+
+def test_geoip_cache_periodic_sweep_drops_expired_entries(monkeypatch):
+    import app.geoip.cache as cache_module
+
+    now = 1000.0
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now)
+    cache = GeoIPCache(ttl_seconds=60, sweep_interval_seconds=30)
+    for idx in range(10):
+        cache.set(f"10.0.0.{idx}", {"country_code": "US"})
+
+    now = 1061.0
+    cache.set("10.0.1.1", {"country_code": "US"})
+
+    assert len(cache) == 1
+    assert cache.stats().expirations == 10
+
+
+def test_geoip_cache_periodic_sweep_runs_in_bounded_slices(monkeypatch):
+    import app.geoip.cache as cache_module
+
+    now = 1000.0
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now)
+    cache = GeoIPCache(ttl_seconds=60, sweep_interval_seconds=30, sweep_batch_size=4)
+    for idx in range(10):
+        cache.set(f"10.0.0.{idx}", {"country_code": "US"})
+
+    now = 1061.0
+    cache.get("10.0.1.1")
+    assert cache.stats().expirations == 4
+    cache.get("10.0.1.1")
+    cache.get("10.0.1.1")
+
+    assert len(cache) == 0
+    assert cache.stats().expirations == 10
+
+
+def test_geoip_cache_rejects_non_positive_max_entries():
+    with pytest.raises(ValueError):
+        GeoIPCache(ttl_seconds=60, max_entries=0)
+
+
 def test_geoip_cache_rejects_non_positive_ttl():
     with pytest.raises(ValueError):
         GeoIPCache(ttl_seconds=0)
@@ -62,6 +137,51 @@ def test_geoip_service_db_cache_hit_populates_memory_cache():
     assert cache.get("1.2.3.4") == {"country_code": "US"}
 
 
+def test_geoip_service_db_lookup_matches_persisted_networks():
+    class Row:
+        ip_address = "203.0.113.0/24"
+        raw = {"country_code": "SE"}
+
+    class Result:
+        def first(self):
+            return Row()
+
+    class Session:
+        statements = []
+
+        def execute(self, statement):
+            self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+            return Result()
+
+        def close(self) -> None:
+            return None
+
+    cache = GeoIPCache(ttl_seconds=60)
+    service = GeoIPService(cache=cache, reader=None, session_factory=Session)
+
+    assert service.lookup("203.0.113.7") == {"country_code": "SE"}
+    # The whole network is cached, so neighbours never reach the database.
+    assert service.lookup("203.0.113.200") == {"country_code": "SE"}
+    assert len(Session.statements) == 1
+    assert "ip_geo_cache.ip_address >>= CAST(" in Session.statements[0]
+    assert "ORDER BY masklen(ip_geo_cache.ip_address) DESC" in Session.statements[0]
+
+
+def test_geoip_service_db_read_failure_falls_back_to_reader():
+    def session_factory():
+        raise RuntimeError("db down")
+
+    class DummyReader:
+        def city(self, ip: str):
+            return {"country_code": "US"}
+
+    service = GeoIPService(
+        cache=GeoIPCache(ttl_seconds=60), reader=DummyReader(), session_factory=session_factory
+    )
+
+    assert service.lookup("1.2.3.4") == {"country_code": "US"}
+
+
 def test_geoip_service_db_write_failure_does_not_break_lookup():
     class DummySession:
         def add(self, record) -> None:
@@ -81,6 +201,60 @@ def test_geoip_service_db_write_failure_does_not_break_lookup():
     assert service.lookup("1.2.3.4") == {"country_code": "US"}
 
 
+def test_geoip_cache_network_entry_answers_covered_addresses():
+    cache = GeoIPCache(ttl_seconds=60)
+    cache.set_network("203.0.113.0/24", {"country_code": "US"})
+    cache.set_network(ip_network("203.0.113.128/25"), {"country_code": "CA"})
+
+    assert cache.get("203.0.113.7") == {"country_code": "US"}
+    assert cache.get("203.0.113.200") == {"country_code": "CA"}
+    assert cache.get("::ffff:203.0.113.7") == {"country_code": "US"}
+    assert cache.get("::FFFF:cb00:7101") == {"country_code": "US"}
+    assert cache.get("203.0.114.1") is None
+    assert cache.stats().size == 2
+
+
+def test_geoip_cache_expired_network_falls_back_to_wider_entry(monkeypatch):
+    import app.geoip.cache as cache_module
+
+    now = 1000.0
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now)
+    cache = GeoIPCache(ttl_seconds=60)
+    cache.set_network("198.51.100.0/24", {"country_code": "NL"})
+    now = 1030.0
+    cache.set_network("198.51.0.0/16", {"country_code": "DE"})
+
+    now = 1065.0
+    assert cache.get("198.51.100.1") == {"country_code": "DE"}
+    assert cache.stats().size == 1
+
+
+def test_geoip_service_caches_by_reader_network():
+    class Traits:
+        network = ip_network("192.0.2.0/24")
+
+    class Response:
+        traits = Traits()
+        country = type("Country", (), {"iso_code": "US"})()
+        location = None
+
+    class CountingReader:
+        def __init__(self) -> None:
+            self.calls = 0
+
+        def city(self, ip: str):
+            self.calls += 1
+            return Response()
+
+    reader = CountingReader()
+    service = GeoIPService(cache=GeoIPCache(ttl_seconds=60), reader=reader)
+
+    for host in range(256):
+        assert service.lookup(f"192.0.2.{host}") == {"country_code": "US"}
+
+    assert reader.calls == 1
+
+
 def test_settings_rejects_non_positive_geoip_ttl(monkeypatch):
     monkeypatch.setenv("JWT_SECRET", "x" * 32)
     settings_module = importlib.import_module("app.settings")
@@ -90,3 +264,125 @@ def test_settings_rejects_non_positive_geoip_ttl(monkeypatch):
         settings_module.Settings(jwt_secret="x" * 32, geoip_cache_ttl_seconds=0)
     with pytest.raises(ValidationError):
         settings_module.Settings(jwt_secret="x" * 32, geoip_cache_ttl_seconds=-5)
+
+
+class _SlowCountingReader:
+    def __init__(self) -> None:
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def city(self, ip: str):
+        with self._lock:
+            self.calls += 1
+        time.sleep(0.05)
+        return {"country_code": "US"}
+
+
+class _RecordingSession:
+    def __init__(self) -> None:
+        self.added = []
+
+    def add(self, record) -> None:
+        self.added.append(record)
+
+    def commit(self) -> None:
+        return None
+
+
+def test_geoip_service_coalesces_concurrent_thread_misses():
+    reader = _SlowCountingReader()
+    session = _RecordingSession()
+    service = GeoIPService(cache=GeoIPCache(ttl_seconds=60), reader=reader, db_session=session)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(service.lookup, ["198.51.100.7"] * 16))
+
+    assert results == [{"country_code": "US"}] * 16
+    assert reader.calls == 1
+    assert len(session.added) == 1
+
+
+def test_geoip_service_coalesces_concurrent_async_misses():
+    reader = _SlowCountingReader()
+    service = GeoIPService(cache=GeoIPCache(ttl_seconds=60), reader=reader)
+
+    async def burst():
+        return await asyncio.gather(
+            *(service.lookup_async("198.51.100.8") for _ in range(16)),
+            *(service.lookup_async("::ffff:198.51.100.8") for _ in range(4)),
+        )
+
+    results = asyncio.run(burst())
+
+    assert results == [{"country_code": "US"}] * 20
+    assert reader.calls == 1
+
+
+def test_single_flight_shares_errors_and_resets():
+    flight = SingleFlight()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise RuntimeError("reader down")
+
+    with pytest.raises(RuntimeError):
+        flight.do("key", failing)
+
+    assert flight.do("key", lambda: "ok") == "ok"
+    assert flight.in_flight() == 0
+    assert calls == [1]
+
+
+def test_async_single_flight_survives_cancelled_caller():
+    flight = AsyncSingleFlight()
+    started = []
+
+    async def work():
+        started.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == "result"
+    assert started == [1]
+    assert flight.in_flight() == 0
+
+
+def test_geoip_service_async_lookup_offloads_reader_and_serves_hits_inline():
+    class ThreadRecordingReader:
+        def __init__(self) -> None:
+            self.threads = []
+
+        def city(self, ip: str):
+            self.threads.append(threading.current_thread().name)
+            return {"country_code": "US"}
+
+    class CountingExecutor(ThreadPoolExecutor):
+        def __init__(self) -> None:
+            super().__init__(max_workers=1, thread_name_prefix="geoip-test")
+            self.submitted = 0
+
+        def submit(self, fn, /, *args, **kwargs):
+            self.submitted += 1
+            return super().submit(fn, *args, **kwargs)
+
+    reader = ThreadRecordingReader()
+    executor = CountingExecutor()
+    service = GeoIPService(cache=GeoIPCache(ttl_seconds=60), reader=reader, executor=executor)
+
+    async def scenario():
+        first = await service.lookup_async("192.0.2.44")
+        second = await service.lookup_async("192.0.2.44")
+        return first, second
+
+    assert asyncio.run(scenario()) == ({"country_code": "US"}, {"country_code": "US"})
+    assert executor.submitted == 1
+    assert reader.threads[0].startswith("geoip-test")
+    executor.shutdown()
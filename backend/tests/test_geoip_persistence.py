@@ -0,0 +1,126 @@
+import threading
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.geoip.cache import GeoIPCache
+from app.geoip.persistence import (
+    GeoCacheWriteBehind,
+    build_geo_cache_upsert,
+    geo_cache_columns,
+)
+from app.geoip.service import GeoIPService
+from conftest import RecordingSession
+
+
+def _rows(statement) -> list[dict]:
+    return statement.compile(dialect=postgresql.dialect()).params
+
+
+def test_geo_cache_columns_fill_country_and_location():
+    columns = geo_cache_columns({"country_code": "US", "latitude": 40.5, "longitude": -74.25})
+
+    assert columns["country_code"] == "US"
+    assert columns["location"].desc == "POINT(-74.25 40.5)"
+    assert columns["raw"] == {"country_code": "US", "latitude": 40.5, "longitude": -74.25}
+    assert geo_cache_columns({})["location"] is None
+
+
+def test_geo_cache_upsert_uses_on_conflict_update():
+    statement = build_geo_cache_upsert(
+        [{"ip_address": "192.0.2.0/24", **geo_cache_columns({"country_code": "US"})}]
+    )
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert "ON CONFLICT (ip_address) DO UPDATE" in sql
+    assert "country_code = excluded.country_code" in sql
+
+
+def test_write_behind_batches_and_deduplicates():
+    executed = []
+    writer = GeoCacheWriteBehind(lambda: RecordingSession(executed), batch_size=3)
+
+    writer.submit("192.0.2.0/24", {"country_code": "US"})
+    writer.submit("198.51.100.0/24", {"country_code": "CA"})
+    writer.submit("192.0.2.0/24", {"country_code": "MX"})
+    writer.submit("203.0.113.0/24", {"country_code": "NL"})
+    writer.submit("2001:db8::/32", {"country_code": "DE"})
+
+    assert writer.stats().queue_depth == 4
+    assert writer.flush() == 4
+
+    assert len(executed) == 2
+    first_batch = _rows(executed[0])
+    assert first_batch["ip_address_m0"] == "192.0.2.0/24"
+    assert first_batch["country_code_m0"] == "MX"
+    stats = writer.stats()
+    assert stats.queue_depth == 0
+    assert stats.flushes == 2
+    assert stats.flushed_rows == 4
+    assert stats.max_flush_seconds >= stats.last_flush_seconds >= 0
+
+
+def test_write_behind_flushes_on_size_trigger():
+    executed = []
+    flushed = threading.Event()
+
+    class SignallingSession(RecordingSession):
+        def commit(self) -> None:
+            flushed.set()
+
+    writer = GeoCacheWriteBehind(
+        lambda: SignallingSession(executed),
+        batch_size=2,
+        flush_interval_seconds=60,
+    )
+    writer.start()
+    writer.submit("192.0.2.1", {"country_code": "US"})
+    writer.submit("192.0.2.2", {"country_code": "US"})
+
+    assert flushed.wait(timeout=5)
+    writer.close(timeout=5)
+    assert writer.stats().flushed_rows == 2
+
+
+def test_write_behind_requeues_failed_batch_and_bounds_pending():
+    executed = []
+    failing = {"value": True}
+    writer = GeoCacheWriteBehind(
+        lambda: RecordingSession(executed, fail=failing["value"]),
+        batch_size=2,
+        max_pending=2,
+    )
+    assert writer.submit("192.0.2.1", {"country_code": "US"})
+    assert writer.submit("192.0.2.2", {"country_code": "US"})
+    assert not writer.submit("192.0.2.3", {"country_code": "US"})
+
+    assert writer.flush() == 0
+    stats = writer.stats()
+    assert stats.failed_flushes == 1
+    assert stats.queue_depth == 2
+    assert stats.dropped == 1
+
+    failing["value"] = False
+    assert writer.flush() == 2
+
+
+def test_write_behind_validates_bounds():
+    with pytest.raises(ValueError):
+        GeoCacheWriteBehind(lambda: None, batch_size=0)
+    with pytest.raises(ValueError):
+        GeoCacheWriteBehind(lambda: None, batch_size=10, max_pending=5)
+
+
+def test_geoip_service_hands_new_results_to_writer():
+    class Reader:
+        def city(self, ip: str):
+            return {"country_code": "US", "latitude": 1.0, "longitude": 2.0}
+
+    writer = GeoCacheWriteBehind(lambda: RecordingSession([]), batch_size=10)
+    service = GeoIPService(cache=GeoIPCache(ttl_seconds=60), reader=Reader(), writer=writer)
+
+    service.lookup("192.0.2.10")
+    service.lookup("192.0.2.10")
+
+    assert writer.stats().queue_depth == 1
+    assert writer.stats().submitted == 1
@@ -0,0 +1,146 @@
+import os
+
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("JWT_SECRET", "test-secret-should-be-at-least-32-characters")
+
+import pytest
+
+from app.geoip.cache import GeoIPCache
+from app.geoip.reader import ManagedGeoIPReader
+from app.geoip.service import GeoIPService
+from app.main import app
+
+
+class _FakeMetadata:
+    def __init__(self, build_epoch: int) -> None:
+        self.database_type = "GeoLite2-City"
+        self.build_epoch = build_epoch
+
+
+class _FakeReader:
+    def __init__(self, path: str) -> None:
+        with open(path) as handle:
+            self.build = int(handle.read())
+        self.closed = False
+
+    def city(self, ip: str):
+        return {"country_code": "US", "build": self.build}
+
+    def metadata(self):
+        return _FakeMetadata(self.build)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def _write_build(path, build: int, mtime: int) -> None:
+    path.write_text(str(build))
+    os.utime(path, (mtime, mtime))
+
+
+def test_managed_reader_without_database_reports_unavailable(tmp_path):
+    reader = ManagedGeoIPReader(str(tmp_path / "missing.mmdb"), opener=_FakeReader)
+
+    assert reader.open() is False
+    assert reader.info is None
+    with pytest.raises(RuntimeError, match="reader"):
+        reader.city("1.2.3.4")
+
+
+def test_managed_reader_swaps_in_new_release(tmp_path):
+    db_path = tmp_path / "GeoLite2-City.mmdb"
+    _write_build(db_path, 1, 1_700_000_000)
+    reader = ManagedGeoIPReader(str(db_path), poll_interval_seconds=0.0, opener=_FakeReader)
+
+    assert reader.open() is True
+    first = reader._reader
+    assert reader.city("1.2.3.4")["build"] == 1
+    assert reader.info.build_epoch == 1
+    assert reader.check_for_update() is False
+
+    _write_build(db_path, 2, 1_700_086_400)
+    assert reader.check_for_update() is True
+
+    assert reader.city("1.2.3.4")["build"] == 2
+    assert reader.info.as_dict()["build_epoch"] == 2
+    assert reader.info.database_type == "GeoLite2-City"
+    reader.check_for_update()
+    assert first.closed is True
+    reader.close()
+
+
+def test_managed_reader_keeps_serving_when_new_file_is_unreadable(tmp_path):
+    db_path = tmp_path / "GeoLite2-City.mmdb"
+    _write_build(db_path, 1, 1_700_000_000)
+    reader = ManagedGeoIPReader(str(db_path), opener=_FakeReader)
+    reader.open()
+
+    db_path.write_text("partial")
+    os.utime(db_path, (1_700_086_400, 1_700_086_400))
+
+    assert reader.check_for_update() is False
+    assert reader.city("1.2.3.4")["build"] == 1
+    reader.close()
+
+
+def test_reader_swap_invalidates_cached_answers_from_the_old_build(tmp_path):
+    class Result:
+        def first(self):
+            return None
+
+    class Session:
+        epochs = []
+
+        def execute(self, statement):
+            self.epochs.append(statement.compile().params.get("build_epoch_1"))
+            return Result()
+
+        def close(self) -> None:
+            return None
+
+    class Writer:
+        def __init__(self) -> None:
+            self.epochs = []
+
+        def submit(self, ip: str, data: dict, build_epoch: int | None = None) -> bool:
+            self.epochs.append(build_epoch)
+            return True
+
+    db_path = tmp_path / "GeoLite2-City.mmdb"
+    _write_build(db_path, 1, 1_700_000_000)
+    reader = ManagedGeoIPReader(str(db_path), poll_interval_seconds=0.0, opener=_FakeReader)
+    reader.open()
+    writer = Writer()
+    service = GeoIPService(
+        cache=GeoIPCache(ttl_seconds=3600), reader=reader, session_factory=Session, writer=writer
+    )
+
+    assert service.lookup("1.2.3.4")["build"] == 1
+    assert service.lookup("1.2.3.4")["build"] == 1
+    _write_build(db_path, 2, 1_700_086_400)
+    assert reader.check_for_update() is True
+
+    assert service.lookup("1.2.3.4")["build"] == 2
+    assert Session.epochs == [1, 2]
+    assert writer.epochs == [1, 2]
+    service.close()
+    reader.close()
+
+
+def test_geoip_health_reports_active_build(tmp_path, monkeypatch):
+    db_path = tmp_path / "GeoLite2-City.mmdb"
+    _write_build(db_path, 7, 1_700_000_000)
+    reader = ManagedGeoIPReader(str(db_path), opener=_FakeReader)
+    reader.open()
+    monkeypatch.setattr(app.state, "geoip_reader", reader, raising=False)
+    try:
+        resp = TestClient(app).get("/health/geoip")
+    finally:
+        reader.close()
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["loaded"] is True
+    assert body["build_epoch"] == 7
+    assert body["path"] == str(db_path)